@@ -1,14 +1,12 @@
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, jsonify, request, before_render_template, template_rendered
 
 app = Flask(__name__)
 
 # A simple in-memory structure to store tasks
 tasks = []
 
-@app.route('/', methods=['GET'])
-def home():
-    # Display existing tasks and a form to add a new task
-    html = '''
+# The page template is compiled once at import instead of on every request
+HOME_HTML = '''
 <!DOCTYPE html>
 <html>
 <head>
@@ -28,7 +26,20 @@ def home():
 </body>
 </html>
 '''
-    return render_template_string(html, tasks=tasks)
+home_template = app.jinja_env.from_string(HOME_HTML)
+
+def render(template, **context):
+    # Render a precompiled template with the same context and signals as render_template_string
+    app.update_template_context(context)
+    before_render_template.send(app, template=template, context=context)
+    rv = template.render(context)
+    template_rendered.send(app, template=template, context=context)
+    return rv
+
+@app.route('/', methods=['GET'])
+def home():
+    # Display existing tasks and a form to add a new task
+    return render(home_template, tasks=tasks)
 
 @app.route('/add', methods=['POST'])
 def add_task():
@@ -1,8 +1,16 @@
 # app.py
-from flask import Flask, request, redirect, url_for, render_template_string, send_file, flash
-import sqlite3, os, io
-from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
+from flask import Flask, request, redirect, url_for, send_file, flash, g, has_app_context, jsonify, Response, stream_with_context
+from flask import before_render_template, template_rendered
+from werkzeug.wsgi import ClosingIterator
+import sqlite3, os, sys, io, re, queue, threading, csv, json, time, base64, uuid, random, hmac, multiprocessing, zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from bisect import bisect_left
+from itertools import islice
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 # Image / PDF libs
 try:
@@ -14,7 +22,7 @@ except Exception:
 try:
     from reportlab.lib.pagesizes import A4
     from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image as RLImage
     from reportlab.lib.styles import getSampleStyleSheet
     REPORTLAB_AVAILABLE = True
 except Exception:
@@ -26,25 +34,552 @@ try:
 except Exception:
     QRCODE_AVAILABLE = False
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
 # ---------- Config ----------
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_FILE = os.path.join(APP_DIR, "bank_flask_singlefile.db")
+DB_FILE = os.environ.get("GMS_DB_FILE", os.path.join(APP_DIR, "bank_flask_singlefile.db"))
 LOGO_FILE = os.path.join(APP_DIR, "sbi_logo.png")   # place file here to include in PDF & header
 UPI_ID = "9817179377"   # user-provided UPI
 
+# product rates; FD_COMPOUNDING is one of COMPOUNDING_PERIODS. Tenures are 1..MAX_TENURE_MONTHS
+# (past a few thousand months the EMI's (1+r)**n overflows to inf)
+FD_RATE = 0.055
+FD_COMPOUNDING = "simple"
+LOAN_RATE = 0.1
+MAX_TENURE_MONTHS = 600
+REVALUE_CHUNK_SIZE = 100000
+
+# end-of-day accrual: instruments per transaction, loan day count, and when the
+# in-process scheduler runs it (local HH:MM; GMS_SCHEDULER=0 leaves it to cron + CLI)
+ACCRUAL_CHUNK_SIZE = 50000
+ACCRUAL_DAY_COUNT = 365
+ACCRUAL_RUN_AT = os.environ.get("GMS_ACCRUAL_RUN_AT", "00:05")
+SCHEDULER_ENABLED = os.environ.get("GMS_SCHEDULER", "1") != "0"
+
+# balance snapshots: accounts per transaction, when yesterday's snapshot is taken, and
+# how long daily snapshots are kept (month-end snapshots are kept for good)
+SNAPSHOT_CHUNK_SIZE = 20000
+SNAPSHOT_RUN_AT = os.environ.get("GMS_SNAPSHOT_RUN_AT", "00:15")
+SNAPSHOT_DAILY_RETENTION_DAYS = 90
+
+# transaction archive: one SQLite file per closed month under ARCHIVE_DIR; the current
+# month and the ARCHIVE_HOT_MONTHS before it stay in the main DB. GMS_ARCHIVE_AUTO=1
+# lets the scheduler archive months as they fall out of the hot window.
+ARCHIVE_DIR = os.environ.get("GMS_ARCHIVE_DIR", os.path.join(APP_DIR, "archive"))
+ARCHIVE_HOT_MONTHS = int(os.environ.get("GMS_ARCHIVE_HOT_MONTHS", "3"))
+ARCHIVE_AUTO = os.environ.get("GMS_ARCHIVE_AUTO", "0") == "1"
+ARCHIVE_RUN_AT = "01:00"
+SCHEDULER_POLL = 30  # seconds
+
+# notification outbox: which sender drains it (see SENDERS), messages per flush, how often
+# the dispatcher polls, and retry backoff (doubling from BASE up to MAX seconds) before a
+# message is given up as failed. Sent messages are pruned after NOTIFY_RETENTION_DAYS.
+NOTIFY_ENABLED = os.environ.get("GMS_NOTIFY", "1") != "0"
+NOTIFY_SENDER = os.environ.get("GMS_NOTIFY_SENDER", "stub")
+NOTIFY_BATCH_SIZE = 100
+NOTIFY_POLL = 1.0  # seconds
+NOTIFY_MAX_ATTEMPTS = 8
+NOTIFY_BACKOFF_BASE = 5
+NOTIFY_BACKOFF_MAX = 3600
+NOTIFY_RETENTION_DAYS = 30
+NOTIFY_PRUNE_AT = "02:00"
+
+# PDF colours (same as the page's --primary / --dark-primary)
+PRIMARY = "#1A73E8"
+DARK_PRIMARY = "#0B3D91"
+
 ADMIN_USER = "admin"
 ADMIN_PASS = "admin123"
+# the JSON admin API (bulk posting) answers only requests sending ADMIN_TOKEN_HEADER with
+# GMS_ADMIN_TOKEN; with no token configured it is off
+ADMIN_TOKEN_HEADER = "X-GMS-Admin-Token"
+ADMIN_TOKEN = os.environ.get("GMS_ADMIN_TOKEN", "")
+
+# SQLite tuning: WAL lets readers run alongside the single writer, NORMAL sync is
+# durable across app crashes in WAL mode, negative cache_size is in KiB.
+DB_POOL_SIZE = int(os.environ.get("GMS_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("GMS_DB_POOL_TIMEOUT", "5"))  # seconds a request waits for a connection
+DB_BUSY_TIMEOUT_MS = 5000
+DB_STATEMENT_CACHE = 256
+DB_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-32000"),
+    ("mmap_size", "268435456"),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", str(DB_BUSY_TIMEOUT_MS)),
+)
+
+# rendered dashboard cache: bounded by entry count and total HTML size
+FRAGMENT_CACHE_ENTRIES = 16
+FRAGMENT_CACHE_BYTES = 8 * 1024 * 1024
+FRAGMENT_CACHE_TTL = 300  # seconds
+
+# customer row cache (see Customer cache): rows kept, and seconds before one is re-read
+CUSTOMER_CACHE_ENTRIES = 50000
+CUSTOMER_CACHE_TTL = 60  # seconds
+
+# transaction history API page sizes
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+# admin loan queue page size, and the most loans one "approve all matching" may credit
+LOAN_QUEUE_PAGE_SIZE = 50
+LOAN_APPROVE_MAX = 50000
+
+# rows pulled from the cursor per chunk of a streamed CSV/NDJSON export
+EXPORT_FETCH_SIZE = 2000
+
+# background PDF export jobs: worker processes and how long finished results are kept
+EXPORT_WORKERS = int(os.environ.get("GMS_EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXPORT_JOB_TTL = int(os.environ.get("GMS_EXPORT_JOB_TTL", "900"))  # seconds
+
+# nightly batch statements: output root and accounts per work unit handed to a worker
+STATEMENT_DIR = os.path.join(APP_DIR, "statements")
+STATEMENT_SHARD_SIZE = 200
+
+# /metrics: GMS_METRICS=0 turns off request and SQL timing; distinct statement labels
+# are capped (later ones are counted as "other") and truncated to a readable length
+METRICS_ENABLED = os.environ.get("GMS_METRICS", "1") != "0"
+METRICS_MAX_STATEMENTS = 500
+STATEMENT_LABEL_MAX = 160
+
+# per-request profiling (see Profiling): a request sending PROFILE_HEADER with GMS_PROFILE_TOKEN
+# is profiled, as is a GMS_PROFILE_SAMPLE_RATE fraction of all requests (0 = none)
+PROFILE_DIR = os.environ.get("GMS_PROFILE_DIR", os.path.join(APP_DIR, "profiles"))
+PROFILE_HEADER = "X-GMS-Profile"
+PROFILE_TOKEN = os.environ.get("GMS_PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("GMS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = 0.001  # seconds between stack samples
+PROFILE_TOP_N = 30
+PROFILE_KEEP = 200
 
 # ---------- Flask setup ----------
 app = Flask(__name__)
 app.secret_key = "supersecret-om"  # change in production
 
+# ---------- Metrics ----------
+# In-process Prometheus-style metrics, scraped from /metrics. Requests are timed by a
+# WSGI wrapper until the response is closed, so a streamed body's queries and send time
+# count toward its route (after_request supplies the labels); SQL by a sqlite3.Connection subclass that times every
+# execute()/executemany() (statement prep and first step; rows fetched later count
+# toward the route, not the statement). Statements are labelled by their normalized
+# text. Recording is a perf_counter pair, a bisect and a short lock per observation.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+class Counter:
+    """Counter by label values; past max_series distinct series, new ones are counted as "other"."""
+    def __init__(self, name, doc, labels=(), max_series=None):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.max_series = max_series
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            if self.max_series is not None and labels not in self._values and len(self._values) >= self.max_series:
+                labels = ("other",) * len(labels)
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} counter"
+        for labels, v in items:
+            yield f"{self.name}{_label_str(self.labels, labels)} {v}"
+
+class Histogram:
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(labels, list(s)) for labels, s in self._series.items()]
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, s in items:
+            cumulative = 0
+            for le, n in zip(self.buckets + ("+Inf",), s):
+                cumulative += n
+                yield f"{self.name}_bucket{_label_str(self.labels + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_label_str(self.labels, labels)} {s[-1]:.6f}"
+            yield f"{self.name}_count{_label_str(self.labels, labels)} {cumulative}"
+
+REQUEST_SECONDS = Histogram("gms_http_request_duration_seconds", "Time from request to the last byte of the response, by endpoint.", ("endpoint", "method", "status"))
+REQUEST_QUERIES = Histogram("gms_http_request_queries", "SQL statements executed per request, by endpoint.", ("endpoint",), QUERY_COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram("gms_http_request_sql_seconds", "Time spent in SQL execute calls per request, by endpoint.", ("endpoint",))
+SQL_STATEMENTS = Counter("gms_sql_statements_total", "SQL execute calls, by normalized statement.", ("statement",), METRICS_MAX_STATEMENTS)
+SQL_SECONDS = Counter("gms_sql_statement_seconds_total", "Time spent in SQL execute calls, by normalized statement.", ("statement",), METRICS_MAX_STATEMENTS)
+PDF_BUILD_SECONDS = Histogram("gms_pdf_build_seconds", "Whole PDF build (queries and layout), by document kind.", ("kind",))
+PDF_RENDER_SECONDS = Histogram("gms_pdf_render_seconds", "ReportLab doc.build() time, by document kind.", ("kind",))
+METRICS = [REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, SQL_STATEMENTS, SQL_SECONDS, PDF_BUILD_SECONDS, PDF_RENDER_SECONDS]
+# scrape-time gauges: name -> (help, fn() -> {label tuple: value}, label names)
+GAUGES = {}
+
+@lru_cache(maxsize=2048)
+def statement_label(sql):
+    label = re.sub(r"\s+", " ", sql).strip()
+    label = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?,...)", label)  # VALUES / expanded IN lists
+    return label[:STATEMENT_LABEL_MAX]
+
+_request_stats = threading.local()
+
+def record_sql(sql, seconds):
+    label = statement_label(sql)
+    SQL_STATEMENTS.inc(1, label)
+    SQL_SECONDS.inc(seconds, label)
+    stats = getattr(_request_stats, "current", None)
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            record_sql(sql, time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose execute calls (direct or through a cursor) are recorded in the SQL metrics."""
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+@app.after_request
+def label_request_metrics(response):
+    if METRICS_ENABLED:
+        request.environ["gms.metrics_labels"] = (request.endpoint or "unmatched", request.method, str(response.status_code))
+    return response
+
+class MetricsMiddleware:
+    """WSGI wrapper recording the request metrics once the response is closed."""
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not METRICS_ENABLED:
+            return self.wsgi_app(environ, start_response)
+        start = time.perf_counter()
+        _request_stats.current = [0, 0.0]  # statements, seconds
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            _request_stats.current = None
+            raise
+        # servers iterate and close the body on the thread that called us
+        return ClosingIterator(body, lambda: self.record(environ, start))
+
+    @staticmethod
+    def record(environ, start):
+        stats, _request_stats.current = _request_stats.current, None
+        labels = environ.get("gms.metrics_labels")
+        if labels is None or stats is None:
+            return
+        endpoint = labels[0]
+        REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
+        REQUEST_QUERIES.observe(stats[0], endpoint)
+        REQUEST_SQL_SECONDS.observe(stats[1], endpoint)
+
+app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+
+def timed_pdf(kind):
+    """Decorator recording a pdf_bytes_* builder's total time in gms_pdf_build_seconds."""
+    def wrap(fn):
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                PDF_BUILD_SECONDS.observe(time.perf_counter() - start, kind)
+        return timed
+    return wrap
+
+def render_pdf(doc, flowables, kind):
+    start = time.perf_counter()
+    try:
+        doc.build(flowables)
+    finally:
+        PDF_RENDER_SECONDS.observe(time.perf_counter() - start, kind)
+
+def render_metrics():
+    lines = []
+    for m in METRICS:
+        lines.extend(m.render())
+    for name, (doc, fn, labels) in GAUGES.items():
+        lines.append(f"# HELP {name} {doc}")
+        lines.append(f"# TYPE {name} gauge")
+        for values, v in fn().items():
+            lines.append(f"{name}{_label_str(labels, values)} {v}")
+    return "\n".join(lines) + "\n"
+
+# ---------- Profiling ----------
+# Opt-in per-request profiling: a request carrying PROFILE_HEADER with the configured
+# token, or picked at random at PROFILE_SAMPLE_RATE, runs with a sampler thread that
+# records the request thread's stack every PROFILE_INTERVAL seconds. Sampling keeps the
+# overhead flat regardless of call count. The profiler wraps the WSGI app, so it runs
+# until the server closes the response and covers streamed bodies too. Each profile is
+# written to PROFILE_DIR as a collapsed stack file (flamegraph.pl / speedscope input) and
+# a top-N hot function report, named by the X-GMS-Profile-Id response header; only the
+# newest PROFILE_KEEP profiles are kept.
+class StackSampler:
+    """Samples one thread's Python stack on a timer; stacks maps root-first frame tuples to sample counts."""
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gms-profiler", daemon=True)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _frame_label(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{';'.join(stack)} {n}\n" for stack, n in sorted(self.stacks.items()))
+
+    def top(self, n=PROFILE_TOP_N):
+        """[(function, self samples, total samples)] for the n functions with the most self samples."""
+        own, total = {}, {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for fn in set(stack):
+                total[fn] = total.get(fn, 0) + count
+        return sorted(((fn, own.get(fn, 0), t) for fn, t in total.items()), key=lambda r: (-r[1], -r[2]))[:n]
+
+def wants_profile(environ):
+    if environ.get("PATH_INFO") == "/metrics":
+        return False
+    token = environ.get("HTTP_" + PROFILE_HEADER.upper().replace("-", "_"))
+    if token and PROFILE_TOKEN and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def profile_id(path):
+    name = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:40] or "index"
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+
+def save_profile(sampler, start, pid, title):
+    """Stop `sampler` and write its collapsed stacks and top-N report as profile `pid`."""
+    sampler.stop()
+    seconds = time.perf_counter() - start
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, pid)
+        with open(base + ".collapsed", "w") as f:
+            f.write(sampler.collapsed())
+        samples = sum(sampler.stacks.values())
+        with open(base + ".top.txt", "w") as f:
+            f.write(f"{title}\n{seconds * 1000:.1f} ms, {samples} samples every {sampler.interval * 1000:g} ms\n\n")
+            f.write(f"{'self':>7} {'total':>7}  function\n")
+            for fn, own, total in sampler.top():
+                f.write(f"{own / samples:7.1%} {total / samples:7.1%}  {fn}\n")
+        prune_profiles()
+    except OSError as e:
+        print(f"[profile] could not write {pid}: {e!r}")
+
+def prune_profiles(keep=PROFILE_KEEP):
+    # ids start with a timestamp, so name order is age order
+    names = sorted(n[:-len(".collapsed")] for n in os.listdir(PROFILE_DIR) if n.endswith(".collapsed"))
+    for pid in names[:-keep] if keep else names:
+        for ext in (".collapsed", ".top.txt"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, pid + ext))
+            except FileNotFoundError:
+                pass
+
+class ProfilerMiddleware:
+    """WSGI wrapper profiling the requests wants_profile() picks, from the first byte in to the last byte out."""
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not wants_profile(environ):
+            return self.wsgi_app(environ, start_response)
+        sampler, start = StackSampler(threading.get_ident()).start(), time.perf_counter()
+        pid = profile_id(environ.get("PATH_INFO", ""))
+        title = f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}?{environ.get('QUERY_STRING', '')}"
+
+        def tagged_start_response(status, headers, exc_info=None):
+            headers.append(("X-GMS-Profile-Id", pid))
+            return start_response(status, headers, exc_info)
+        try:
+            body = self.wsgi_app(environ, tagged_start_response)
+        except BaseException:
+            save_profile(sampler, start, pid, title)
+            raise
+        # the server iterates a streamed body after this returns; the profile is saved on close
+        return ClosingIterator(body, lambda: save_profile(sampler, start, pid, title))
+
+app.wsgi_app = ProfilerMiddleware(app.wsgi_app)
+
 # ---------- DB helpers ----------
-def get_conn():
-    c = sqlite3.connect(DB_FILE)
+def connect_db(path=None, readonly=False):
+    """Open a new tuned connection (WAL, pragmas, prepared statement cache)."""
+    path = path or DB_FILE
+    if readonly:
+        path = f"file:{path}?mode=ro"
+    c = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0, uri=readonly,
+                        cached_statements=DB_STATEMENT_CACHE, check_same_thread=False,
+                        factory=TimedConnection if METRICS_ENABLED else sqlite3.Connection)
     c.row_factory = sqlite3.Row
+    for name, value in DB_PRAGMAS:
+        if not (readonly and name == "journal_mode"):
+            c.execute(f"PRAGMA {name}={value}")
+    if readonly:
+        c.execute("PRAGMA query_only=1")
     return c
 
+class PoolExhausted(Exception):
+    pass
+
+class ConnectionPool:
+    """Bounded LIFO pool of tuned connections; one is checked out per request.
+    acquire() waits up to `timeout` seconds for one to be released, then raises PoolExhausted."""
+    def __init__(self, path, size, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return connect_db(self.path)
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"no database connection free after {self.timeout}s") from None
+
+    def release(self, c):
+        if c.in_transaction:
+            c.rollback()
+        self._idle.put_nowait(c)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
+
+pool = ConnectionPool(DB_FILE, DB_POOL_SIZE)
+
+def get_conn():
+    # inside a request: one pooled connection shared by everything the request does,
+    # returned to the pool on teardown. Outside a request (startup, CLI): a private one.
+    if not has_app_context():
+        return connect_db()
+    if "db" not in g:
+        g.db = pool.acquire()
+    return g.db
+
+def put_conn(c):
+    # counterpart of get_conn(): only private connections are actually closed
+    if not (has_app_context() and g.get("db") is c):
+        c.close()
+
+@app.teardown_appcontext
+def release_request_conn(exc):
+    # end the read transactions of cursors a view left open (e.g. it raised) now, not
+    # when they are collected after the connection has gone to another request
+    for cur in g.pop("tiered_cursors", ()):
+        cur.close()
+    c = g.pop("db", None)
+    if c is not None:
+        pool.release(c)
+
+@app.errorhandler(PoolExhausted)
+def pool_exhausted(exc):
+    # every connection is held by a slow request: shed this one instead of queueing forever
+    app.logger.warning("%s: %s %s", exc, request.method, request.path)
+    return jsonify(error="server busy, retry shortly"), 503, {"Retry-After": str(max(1, round(pool.timeout)))}
+
+def stream_response(body, mimetype, headers=None):
+    """Response streaming `body`, which keeps the request's connection: Flask tears the
+    app context down as soon as the view returns, so the connection (and any cursors
+    open on it) is released when the response is closed, whether sent or abandoned."""
+    c = g.pop("db", None)
+    cursors = g.pop("tiered_cursors", [])
+    rv = Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+    @rv.call_on_close
+    def release():
+        # runs after the body generator is closed
+        for cur in cursors:
+            cur.close()
+        if c is not None:
+            pool.release(c)
+    return rv
+
 def init_db():
     c = get_conn()
     cur = c.cursor()
@@ -92,21 +627,1398 @@ def init_db():
     )
     """)
     c.commit()
+    migrate(c)
     c.close()
 
 def now_str():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def record_tx(account_no, ttype, amount, note=""):
-    c = get_conn()
+def record_tx(c, account_no, ttype, amount, note=""):
+    # runs inside the caller's transaction; the ledger commits
     c.execute("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(?,?,?,?,?)",
-              (account_no, ttype, float(amount), now_str(), note))
+              (account_no, ttype, int(amount), now_str(), note))
+
+# ---------- Money ----------
+# Amounts are stored and computed as integer paise (see MONEY_COLUMNS), so balances,
+# sums and comparisons are exact integer arithmetic in Python and in SQLite. Rupees
+# only appear at the edges: parsing form/file input and formatting for display.
+class Money(int):
+    """An amount in paise; str() gives rupees with two decimals."""
+    __slots__ = ()
+    # largest amount parse() accepts (₹1 lakh crore): far inside SQLite's int64, with room
+    # for balances and bank_stats totals to add many of them up
+    MAX = 10 ** 14
+
+    @classmethod
+    def parse(cls, value):
+        # rupees as text or a number -> Money, rounded half-up to the paisa; None if not a
+        # number or larger than MAX
+        try:
+            d = Decimal(str(value).strip())
+        except InvalidOperation:
+            return None
+        if not d.is_finite() or abs(d.scaleb(2)) > cls.MAX:
+            return None
+        return cls(d.scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    @property
+    def rupees(self):
+        return self / 100  # float, for JSON
+
+    def __str__(self):
+        rupees, paise = divmod(abs(int(self)), 100)
+        return f"{'-' if self < 0 else ''}{rupees}.{paise:02d}"
+
+@app.template_filter("money")
+def money_filter(paise):
+    return str(Money(paise or 0))
+
+# ---------- Ledger ----------
+# Every money movement goes through apply_posting() inside one BEGIN IMMEDIATE
+# transaction: the balance change and its transactions row share a single commit,
+# and the balance is adjusted in SQL so parallel workers cannot lose updates.
+class LedgerError(Exception):
+    pass
+
+class AccountNotFound(LedgerError):
+    pass
+
+class InsufficientFunds(LedgerError):
+    pass
+
+# effect of each transaction type on customers.balance
+TX_SIGN = {"Deposit": 1, "Withdraw": -1, "FD_Create": -1, "LoanCredit": 1, "FD_Maturity": 1}
+# the same, as an SQL expression over a transactions row
+SIGNED_AMOUNT_SQL = "CASE type " + " ".join(f"WHEN '{t}' THEN {sign}*amount" for t, sign in TX_SIGN.items()) + " ELSE 0 END"
+
+@contextmanager
+def immediate(c):
+    # take the write lock up front so check-and-update cannot interleave
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        yield c
+    except BaseException:
+        c.rollback()
+        raise
     c.commit()
-    c.close()
 
-# rounding helper
-def fmt_amount(x):
-    return float(Decimal(x).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+def apply_posting(c, acc, ttype, amount, note=""):
+    """Apply one posting inside the caller's transaction and return the new balance."""
+    delta = TX_SIGN[ttype] * int(amount)
+    row = c.execute("UPDATE customers SET balance = balance + ? WHERE account_no=? AND balance + ? >= 0 RETURNING balance",
+                    (delta, acc, delta)).fetchone()
+    if row is None:
+        if c.execute("SELECT 1 FROM customers WHERE account_no=?", (acc,)).fetchone():
+            raise InsufficientFunds(acc)
+        raise AccountNotFound(acc)
+    record_tx(c, acc, ttype, amount, note)
+    return Money(row[0])
+
+def post_tx(acc, ttype, amount, note=""):
+    """Single-posting transaction, with its customer SMS queued in the same commit."""
+    c = get_conn()
+    try:
+        with immediate(c):
+            balance = apply_posting(c, acc, ttype, amount, note)
+            if ttype in SMS_TEMPLATES:
+                queue_sms(c, acc, SMS_TEMPLATES[ttype].format(name="{name}", amount=Money(amount), acc=acc, balance=balance))
+            return balance
+    finally:
+        put_conn(c)
+
+# ---------- Bulk posting ----------
+# End-of-day files (salary credits, standing instructions) are posted in chunks:
+# each chunk is one BEGIN IMMEDIATE transaction that reads the touched balances once,
+# applies the rows per account in file order, then writes balances and transactions
+# rows with executemany. Each posted row's SMS is queued in the outbox in the same
+# transaction, as post_tx() does.
+BULK_CHUNK_SIZE = 5000
+
+def read_postings(fileobj, fmt="csv"):
+    """Yield posting dicts from a CSV (account_no,type,amount,note) or JSON list."""
+    if fmt == "json":
+        data = json.load(fileobj)
+        yield from data.get("postings", []) if isinstance(data, dict) else data
+    else:
+        yield from csv.DictReader(fileobj)
+
+def _validate_posting(row):
+    if not isinstance(row, dict):
+        return None, "invalid row: expected an object with account_no, type, amount"
+    try:
+        acc = int(row.get("account_no") or row.get("acc"))
+    except (TypeError, ValueError):
+        return None, "invalid account_no"
+    ttype = str(row.get("type") or "").strip()
+    if ttype not in ("Deposit", "Withdraw"):
+        return None, "type must be Deposit or Withdraw"
+    amt = Money.parse(row.get("amount"))
+    if amt is None or amt <= 0:
+        return None, "invalid amount"
+    return (acc, ttype, amt, str(row.get("note") or "").strip()), None
+
+def _post_chunk(c, chunk, results):
+    # chunk: list of (line, (acc, type, amount, note)); fills results[line]
+    with immediate(c):
+        accs = sorted({p[0] for _, p in chunk})
+        balances = dict(c.execute("SELECT account_no,balance FROM customers WHERE account_no IN (SELECT value FROM json_each(?))",
+                                  (json.dumps(accs),)).fetchall())
+        by_acc = {}
+        for line, p in chunk:
+            by_acc.setdefault(p[0], []).append((line, p))
+        ts = now_str()
+        new_bal, tx_rows, sms = {}, [], []
+        for acc in accs:
+            if acc not in balances:
+                for line, _ in by_acc[acc]:
+                    results[line] = ("failed", "account not found")
+                continue
+            bal = balances[acc]
+            for line, (_, ttype, amt, note) in by_acc[acc]:
+                nb = bal + TX_SIGN[ttype] * amt
+                if nb < 0:
+                    results[line] = ("failed", "insufficient balance")
+                    continue
+                bal = nb
+                tx_rows.append((acc, ttype, amt, ts, note))
+                sms.append((acc, SMS_TEMPLATES[ttype].format(name="{name}", amount=Money(amt), acc=acc, balance=Money(bal))))
+                results[line] = ("ok", "")
+            if bal != balances[acc]:
+                new_bal[acc] = bal
+        c.executemany("UPDATE customers SET balance=? WHERE account_no=?", [(b, a) for a, b in new_bal.items()])
+        c.executemany("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(?,?,?,?,?)", tx_rows)
+        queue_sms_many(c, sms)
+
+def bulk_post(rows, chunk_size=BULK_CHUNK_SIZE):
+    """Validate and post an iterable of posting dicts; returns a per-row report."""
+    start = time.perf_counter()
+    results, chunk = {}, []
+    c = get_conn()
+    try:
+        for line, row in enumerate(rows, 1):
+            posting, err = _validate_posting(row)
+            if err:
+                results[line] = ("failed", err)
+                continue
+            chunk.append((line, posting))
+            if len(chunk) >= chunk_size:
+                _post_chunk(c, chunk, results)
+                chunk = []
+        if chunk:
+            _post_chunk(c, chunk, results)
+    finally:
+        put_conn(c)
+    elapsed = time.perf_counter() - start
+    posted = sum(1 for status, _ in results.values() if status == "ok")
+    return {
+        "total": len(results),
+        "posted": posted,
+        "failed": len(results) - posted,
+        "elapsed_sec": round(elapsed, 3),
+        "rows_per_sec": round(len(results) / elapsed, 1) if elapsed else None,
+        "results": [{"line": line, "status": status, "error": err} for line, (status, err) in sorted(results.items())],
+    }
+
+# ---------- Interest ----------
+# FD maturity, loan EMI and amortization written as array expressions: the same code
+# serves one instrument in a route (plain floats) and a whole portfolio in a batch
+# (NumPy arrays, one vectorized pass per chunk).
+COMPOUNDING_PERIODS = {"simple": 0, "annual": 1, "half-yearly": 2, "quarterly": 4, "monthly": 12}
+
+def fd_maturity(principal, rate, months, compounding=FD_COMPOUNDING):
+    """Maturity value of FDs; compounding is a COMPOUNDING_PERIODS key."""
+    n = COMPOUNDING_PERIODS[compounding]
+    years = months / 12.0
+    if n == 0:
+        return principal * (1 + rate * years)
+    return principal * (1 + rate / n) ** (n * years)
+
+def loan_emi(principal, rate, months):
+    """Monthly instalment of reducing-balance loans (annual `rate`); zero-rate loans repay principal/months."""
+    if not NUMPY_AVAILABLE:
+        r = rate / 12.0
+        if r == 0:
+            return principal / months
+        growth = (1 + r) ** months
+        return principal * r * growth / (growth - 1)
+    principal, months = np.asarray(principal, dtype=float), np.asarray(months, dtype=float)
+    r = np.asarray(rate, dtype=float) / 12.0
+    growth = (1 + r) ** months
+    return np.where(r > 0, principal * r * growth / np.where(r > 0, growth - 1, 1.0), principal / months)
+
+def amortization_schedule(principal, rate, months):
+    """Schedules for an array of loans: dict of (loans x max tenure) arrays for interest, principal
+    and closing balance per instalment; months past a loan's tenure are zero. Needs NumPy."""
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy is required for amortization schedules")
+    principal = np.atleast_1d(np.asarray(principal, dtype=float))[:, None]
+    months = np.atleast_1d(np.asarray(months))[:, None]
+    r = np.atleast_1d(np.asarray(rate, dtype=float))[:, None] / 12.0
+    emi = loan_emi(principal, r * 12.0, months)
+    t = np.arange(1, int(months.max()) + 1)[None, :]
+    growth = (1 + r) ** t
+    # closed form balance after t instalments; the zero-rate case is straight-line
+    safe_r = np.where(r > 0, r, 1.0)
+    balance = np.where(r > 0, principal * growth - emi * (growth - 1) / safe_r, principal - emi * t)
+    balance = np.where(t < months, np.maximum(balance, 0.0), 0.0)
+    opening = np.concatenate([principal, balance[:, :-1]], axis=1)
+    interest = np.where(t <= months, opening * r, 0.0)
+    return {"emi": emi[:, 0], "interest": interest, "principal": np.where(t <= months, opening - balance, 0.0), "balance": balance}
+
+def revalue_instruments(c, chunk_size=REVALUE_CHUNK_SIZE):
+    """Recompute every FD's maturity value and every loan's EMI / total interest (paise) in
+    vectorized chunks, one transaction per chunk; returns row counts."""
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy is required for portfolio revaluation")
+    counts = {"fds": 0, "loans": 0}
+    last = 0
+    while True:
+        rows = c.execute("SELECT fd_id,amount,interest_rate,tenure_months,compounding FROM fds WHERE fd_id > ? ORDER BY fd_id LIMIT ?",
+                         (last, chunk_size)).fetchall()
+        if not rows:
+            break
+        ids, amount, rate, months, comp = (np.array(col) for col in zip(*rows))
+        maturity = np.empty(len(rows))
+        for name in set(comp.tolist()):
+            m = comp == name
+            maturity[m] = fd_maturity(amount[m].astype(float), rate[m].astype(float), months[m].astype(float), name)
+        with immediate(c):
+            c.executemany("UPDATE fds SET maturity_amount=? WHERE fd_id=?", zip(np.rint(maturity).astype(np.int64).tolist(), ids.tolist()))
+        counts["fds"] += len(rows)
+        last = int(ids[-1])
+    last = 0
+    while True:
+        rows = c.execute("SELECT loan_id,loan_amount,interest_rate,tenure_months FROM loans WHERE loan_id > ? ORDER BY loan_id LIMIT ?",
+                         (last, chunk_size)).fetchall()
+        if not rows:
+            break
+        ids, amount, rate, months = (np.array(col, dtype=float) for col in zip(*rows))
+        emi = np.rint(loan_emi(amount, rate, months)).astype(np.int64)
+        total_interest = emi * months.astype(np.int64) - amount.astype(np.int64)
+        with immediate(c):
+            c.executemany("UPDATE loans SET emi=?, total_interest=? WHERE loan_id=?",
+                          zip(emi.tolist(), total_interest.tolist(), ids.astype(int).tolist()))
+        counts["loans"] += len(rows)
+        last = int(ids[-1])
+    return counts
+
+# ---------- Batch runs ----------
+# batch_runs has one row per (job, business date). A job registers its run, adds its
+# counters in the same transaction as each chunk of work, and marks the run done, so a
+# finished day is skipped and an interrupted one shows how far it got (forcing a
+# finished day again starts its counters afresh).
+def run_status(c, job, day):
+    row = c.execute("SELECT status FROM batch_runs WHERE job=? AND business_date=?", (job, day)).fetchone()
+    return row["status"] if row else None
+
+def start_run(c, job, day):
+    with immediate(c):
+        c.execute("""INSERT INTO batch_runs(job,business_date,status,started_at,stats) VALUES(?,?,'running',?,'{}')
+                     ON CONFLICT(job,business_date) DO UPDATE SET status='running', started_at=excluded.started_at, finished_at=NULL,
+                         stats = CASE WHEN batch_runs.status = 'done' THEN '{}' ELSE batch_runs.stats END""",
+                  (job, day, now_str()))
+
+def checkpoint(c, job, day, **counts):
+    # add counts to the run's stats inside the caller's transaction
+    sets = ", ".join(f"'$.{k}', COALESCE(json_extract(stats, '$.{k}'), 0) + ?" for k in counts)
+    c.execute(f"UPDATE batch_runs SET stats = json_set(stats, {sets}) WHERE job=? AND business_date=?", (*counts.values(), job, day))
+
+def finish_run(c, job, day):
+    with immediate(c):
+        c.execute("UPDATE batch_runs SET status='done', finished_at=? WHERE job=? AND business_date=?", (now_str(), job, day))
+    return json.loads(c.execute("SELECT stats FROM batch_runs WHERE job=? AND business_date=?", (job, day)).fetchone()[0])
+
+# ---------- End-of-day accrual ----------
+# For a business date: every FD with maturity_date on or before it is paid out
+# (maturity_amount credited, FD_Maturity transaction written), and every approved loan
+# accrues simple daily interest on its outstanding balance up to that date. Each chunk
+# is one set-based transaction that also moves the instruments' own state forward
+# (fds.matured_on, loans.accrued_through), so the due predicates only ever see work
+# that is left: a rerun for the same day is a no-op, a crashed run resumes where it
+# stopped, and a missed day is caught up by the next run.
+def _mature_fds(c, day, chunk_size):
+    with immediate(c):
+        c.execute("DELETE FROM temp.accrual_batch")
+        n = c.execute("INSERT INTO temp.accrual_batch(id) SELECT fd_id FROM fds WHERE matured_on IS NULL AND maturity_date <= ? LIMIT ?",
+                      (day, chunk_size)).rowcount
+        if not n:
+            return 0
+        paid = c.execute("SELECT COALESCE(SUM(maturity_amount),0) FROM fds WHERE fd_id IN temp.accrual_batch").fetchone()[0]
+        c.execute("""UPDATE customers SET balance = balance + due.total
+                     FROM (SELECT account_no, SUM(maturity_amount) AS total FROM fds WHERE fd_id IN temp.accrual_batch GROUP BY account_no) AS due
+                     WHERE customers.account_no = due.account_no""")
+        # dated the business day, not the wall clock: a catch-up run pays on the day it covers
+        c.execute("""INSERT INTO transactions(account_no,type,amount,date,note)
+                     SELECT account_no, 'FD_Maturity', maturity_amount, ?, 'FD ' || fd_id || ' matured' FROM fds
+                     WHERE fd_id IN temp.accrual_batch AND account_no IN (SELECT account_no FROM customers) ORDER BY fd_id""", (f"{day} 00:00:00",))
+        c.execute("UPDATE fds SET matured_on=? WHERE fd_id IN temp.accrual_batch", (day,))
+        checkpoint(c, "accrual", day, fds_matured=n, amount_paid=paid)
+    return n
+
+def _accrue_loans(c, day, chunk_size):
+    with immediate(c):
+        c.execute("DELETE FROM temp.accrual_batch")
+        n = c.execute("INSERT INTO temp.accrual_batch(id) SELECT loan_id FROM loans WHERE approved=1 AND accrued_through < ? LIMIT ?",
+                      (day, chunk_size)).rowcount
+        if not n:
+            return 0
+        interest = "CAST(ROUND(COALESCE(outstanding,0) * interest_rate * (julianday(?) - julianday(accrued_through)) / ?) AS INTEGER)"
+        accrued = c.execute(f"SELECT COALESCE(SUM({interest}),0) FROM loans WHERE loan_id IN temp.accrual_batch",
+                            (day, ACCRUAL_DAY_COUNT)).fetchone()[0]
+        c.execute(f"UPDATE loans SET accrued_interest = accrued_interest + {interest}, accrued_through = ? WHERE loan_id IN temp.accrual_batch",
+                  (day, ACCRUAL_DAY_COUNT, day))
+        checkpoint(c, "accrual", day, loans_accrued=n, interest_accrued=accrued)
+    return n
+
+def run_accrual(day=None, chunk_size=ACCRUAL_CHUNK_SIZE, force=False):
+    """Mature due FDs and accrue loan interest through `day` (YYYY-MM-DD, default today).
+    Returns the run's stats, or None if the day was already done (and not forced).
+    Maturities are posted on `day`, so a day that is already snapshotted or archived is
+    refused: the snapshots rolled forward from it and the archive would miss them."""
+    day = day or datetime.now().strftime("%Y-%m-%d")
+    c = get_conn()
+    try:
+        if run_status(c, "accrual", day) == "done" and not force:
+            return None
+        snapped, horizon = c.execute("SELECT (SELECT MAX(as_of) FROM balance_snapshots), (SELECT MAX(hi) FROM archive_periods)").fetchone()
+        if snapped and day <= snapped:
+            raise ValueError(f"{day} is already covered by the balance snapshot of {snapped}")
+        if horizon and day < horizon:
+            raise ValueError(f"{day} is in an archived month")
+        start = time.perf_counter()
+        start_run(c, "accrual", day)
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS accrual_batch(id INTEGER PRIMARY KEY)")
+        while _mature_fds(c, day, chunk_size):
+            pass
+        while _accrue_loans(c, day, chunk_size):
+            pass
+        stats = finish_run(c, "accrual", day)
+    finally:
+        put_conn(c)
+    stats["elapsed_sec"] = round(time.perf_counter() - start, 3)
+    return stats
+
+# ---------- Loan approval ----------
+# The admin queue pages through loans on idx_loans_queue, oldest application first,
+# keyset style on (created_at, loan_id) like transaction history. Approval is set-based:
+# one BEGIN IMMEDIATE transaction flips the selected pending loans, credits each
+# borrower once with the sum of their loans and writes the LoanCredit rows
+# and the borrowers' SMS outbox rows.
+def loan_queue(c, approved=0, acc=None, min_amount=None, max_amount=None, after=None, limit=LOAN_QUEUE_PAGE_SIZE):
+    """Up to `limit` loans with the given approved flag after `after` ((created_at, loan_id) or None), oldest first."""
+    where, params = ["approved=?"], [approved]
+    if acc is not None:
+        where.append("account_no=?"); params.append(acc)
+    if min_amount is not None:
+        where.append("loan_amount>=?"); params.append(int(min_amount))
+    if max_amount is not None:
+        where.append("loan_amount<=?"); params.append(int(max_amount))
+    if after is not None:
+        where.append("(created_at, loan_id) > (?, ?)"); params.extend(after)
+    return c.execute(f"""SELECT loan_id,account_no,loan_amount,interest_rate,tenure_months,emi,approved,created_at FROM loans
+                         WHERE {' AND '.join(where)} ORDER BY created_at, loan_id LIMIT ?""", (*params, limit)).fetchall()
+
+def approve_loans(c, loan_ids):
+    """Approve and credit the pending loans among `loan_ids` in one transaction.
+    Returns the approved (loan_id, account_no, loan_amount) rows; loans already approved
+    or whose account does not exist are left alone."""
+    ids = json.dumps(sorted({int(i) for i in loan_ids}))
+    with immediate(c):
+        # approved=0 guard: a loan is credited at most once
+        approved = c.execute("""UPDATE loans SET approved=1, outstanding=loan_amount, accrued_through=?
+                                WHERE loan_id IN (SELECT value FROM json_each(?)) AND approved=0
+                                  AND account_no IN (SELECT account_no FROM customers)
+                                RETURNING loan_id,account_no,loan_amount""",
+                             (datetime.now().strftime("%Y-%m-%d"), ids)).fetchall()
+        if approved:
+            done = json.dumps([r["loan_id"] for r in approved])
+            c.execute("""UPDATE customers SET balance = balance + cr.total
+                         FROM (SELECT account_no, SUM(loan_amount) AS total FROM loans
+                               WHERE loan_id IN (SELECT value FROM json_each(?)) GROUP BY account_no) AS cr
+                         WHERE customers.account_no = cr.account_no""", (done,))
+            c.execute("""INSERT INTO transactions(account_no,type,amount,date,note)
+                         SELECT account_no, 'LoanCredit', loan_amount, ?, 'LoanID:' || loan_id FROM loans
+                         WHERE loan_id IN (SELECT value FROM json_each(?)) ORDER BY loan_id""", (now_str(), done))
+            # the SMS text is filled in per row: {name} from customers, {amount} as rupees.paise
+            c.execute("""INSERT INTO outbox(channel,recipient,body,next_attempt_at,created_at)
+                         SELECT 'sms', cu.mobile, replace(replace(?, '{name}', cu.name), '{amount}', printf('%d.%02d', l.loan_amount / 100, l.loan_amount % 100)), ?, ?
+                         FROM loans l JOIN customers cu ON cu.account_no = l.account_no
+                         WHERE l.loan_id IN (SELECT value FROM json_each(?)) AND COALESCE(cu.mobile, '') != '' ORDER BY l.loan_id""",
+                      (SMS_TEMPLATES["LoanCredit"], now_str(), now_str(), done))
+    return approved
+
+# ---------- Balance snapshots ----------
+# balance_snapshots holds closing balances: (account_no, as_of) is the balance after every
+# posting dated on or before as_of. A daily job snapshots the accounts that posted that
+# day, and every account at month end, so a historical balance is the nearest snapshot
+# plus at most about a month of postings instead of a replay of the whole history.
+def next_day(day):
+    return (parse_day(day) + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def balance_before(c, acc, bound):
+    """Balance from the postings dated before `bound` (YYYY-MM-DD, exclusive)."""
+    with read_transaction(c):
+        snap = c.execute("SELECT date(as_of, '+1 day') AS start, balance FROM balance_snapshots WHERE account_no=? AND as_of < ? ORDER BY as_of DESC LIMIT 1",
+                         (acc, bound)).fetchone()
+        if snap:
+            since = TieredCursor(c, f"SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}),0) FROM {{tx}} WHERE account_no=? AND date >= ? AND date < ?",
+                                 (acc, snap["start"], bound), lo=snap["start"], hi=bound)
+            return Money(snap["balance"] + sum(r[0] for r in since))
+        # not snapshotted yet: work back from the live balance, in the same snapshot as
+        # the archive catalog so a month archived meanwhile is not subtracted twice
+        row = c.execute(f"""SELECT balance - (SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}),0) FROM transactions WHERE account_no=? AND date >= ?)
+                            FROM customers WHERE account_no=?""", (acc, bound, acc)).fetchone()
+        if row is None:
+            raise AccountNotFound(acc)
+        archived = TieredCursor(c, f"SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}),0) FROM {{tx}} WHERE account_no=? AND date >= ?",
+                                (acc, bound), lo=bound, include_main=False)
+        return Money(row[0] - sum(r[0] for r in archived))
+
+def balance_at(c, acc, day):
+    """Closing balance of `day` (YYYY-MM-DD)."""
+    return balance_before(c, acc, next_day(day))
+
+def _snapshot_chunk(c, day, accounts, floor):
+    # floor: oldest snapshot whose following postings are all still in the main DB
+    with immediate(c):
+        # closing balance = the account's previous snapshot plus the postings since, or
+        # for a first snapshot the live balance minus everything posted after the day
+        c.execute(f"""INSERT OR REPLACE INTO balance_snapshots(account_no,as_of,balance)
+                      SELECT account_no, ?, COALESCE(
+                          (SELECT s.balance + (SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}),0) FROM transactions t
+                                               WHERE t.account_no = s.account_no AND t.date >= date(s.as_of, '+1 day') AND t.date < ?)
+                           FROM balance_snapshots s WHERE s.account_no = customers.account_no AND s.as_of < ? AND s.as_of >= ?
+                           ORDER BY s.as_of DESC LIMIT 1),
+                          balance - (SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}),0) FROM transactions t
+                                     WHERE t.account_no = customers.account_no AND t.date >= ?))
+                      FROM customers WHERE account_no IN (SELECT value FROM json_each(?))""",
+                  (day, next_day(day), day, floor, next_day(day), json.dumps(accounts)))
+        checkpoint(c, "snapshot", day, accounts=len(accounts))
+
+def snapshot_balances(day, full=None, chunk_size=SNAPSHOT_CHUNK_SIZE, force=False, allow_open_day=False):
+    """Snapshot closing balances for `day`: accounts that posted that day, or every account
+    on a month end / when full=True. Prunes old daily snapshots. Returns the run's stats,
+    or None if the day was already done (and not forced). `day` must have closed (be before
+    today): a later posting dated that day would be missing from every snapshot rolled
+    forward from this one, unless allow_open_day=True says the caller knows it is final."""
+    if day >= datetime.now().strftime("%Y-%m-%d") and not allow_open_day:
+        raise ValueError(f"{day} has not closed yet")
+    if full is None:
+        full = next_day(day).endswith("-01")
+    c = get_conn()
+    try:
+        if run_status(c, "snapshot", day) == "done" and not force:
+            return None
+        horizon = c.execute("SELECT MAX(hi) FROM archive_periods").fetchone()[0]
+        if horizon and day < horizon:
+            raise ValueError(f"{day} is in an archived month")
+        floor = (parse_day(horizon) - timedelta(days=1)).strftime("%Y-%m-%d") if horizon else ""
+        start = time.perf_counter()
+        start_run(c, "snapshot", day)
+        if full:
+            last = 0
+            while True:
+                accounts = [r[0] for r in c.execute("SELECT account_no FROM customers WHERE account_no > ? ORDER BY account_no LIMIT ?",
+                                                    (last, chunk_size))]
+                if not accounts:
+                    break
+                _snapshot_chunk(c, day, accounts, floor)
+                last = accounts[-1]
+        else:
+            active = [r[0] for r in c.execute("SELECT DISTINCT account_no FROM transactions WHERE date >= ? AND date < ?", (day, next_day(day)))]
+            for i in range(0, len(active), chunk_size):
+                _snapshot_chunk(c, day, active[i:i + chunk_size], floor)
+        cutoff = (parse_day(day) - timedelta(days=SNAPSHOT_DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        with immediate(c):
+            pruned = c.execute("DELETE FROM balance_snapshots WHERE as_of < ? AND as_of != date(as_of, 'start of month', '+1 month', '-1 day')",
+                               (cutoff,)).rowcount
+            checkpoint(c, "snapshot", day, pruned=pruned)
+        stats = finish_run(c, "snapshot", day)
+    finally:
+        put_conn(c)
+    stats["elapsed_sec"] = round(time.perf_counter() - start, 3)
+    return stats
+
+# ---------- Scheduler ----------
+class DailyScheduler:
+    """Background thread running each registered job once per business date, at or after its HH:MM.
+    Jobs take the business date and must be idempotent for it; a failed job is retried on the next poll."""
+    def __init__(self, poll=SCHEDULER_POLL):
+        self.poll = poll
+        self.jobs = {}  # name -> (HH:MM, fn(day))
+        self._done = {}  # name -> last business date completed by this process
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name, at, fn):
+        self.jobs[name] = (at, fn)
+
+    def run_pending(self, now=None):
+        now = now or datetime.now()
+        day = now.strftime("%Y-%m-%d")
+        for name, (at, fn) in list(self.jobs.items()):
+            if self._done.get(name) == day or now.strftime("%H:%M") < at:
+                continue
+            try:
+                fn(day)
+                self._done[name] = day
+            except Exception:
+                app.logger.exception("scheduler: %s for %s failed", name, day)
+
+    def _loop(self):
+        while True:
+            self.run_pending()
+            if self._stop.wait(self.poll):
+                break
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="gms-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+scheduler = DailyScheduler()
+scheduler.add("accrual", ACCRUAL_RUN_AT, lambda day: run_accrual(day))
+# yesterday is complete once the clock passes midnight
+scheduler.add("snapshot", SNAPSHOT_RUN_AT, lambda day: snapshot_balances((parse_day(day) - timedelta(days=1)).strftime("%Y-%m-%d")))
+if ARCHIVE_AUTO:
+    scheduler.add("archive", ARCHIVE_RUN_AT, lambda day: archive_closed_months())
+
+# ---------- Notification outbox ----------
+# Customer messages are never sent on the request path. The posting's transaction also
+# inserts an outbox row, so a message exists exactly when its posting committed. The
+# dispatcher thread claims due rows in batches, hands each batch to the configured
+# sender outside any transaction and records the outcome. A failed message is retried
+# with exponential backoff; a batch lost mid-send (crash, restart) becomes due again
+# once its claim lease runs out, so delivery is at-least-once.
+SMS_TEMPLATES = {
+    "Deposit": "Dear {name}, ₹{amount} deposited to A/c {acc}. Balance ₹{balance}.",
+    "Withdraw": "Dear {name}, ₹{amount} withdrawn from A/c {acc}. Balance ₹{balance}.",
+    "LoanCredit": "Dear {name}, loan of ₹{amount} approved and credited.",
+}
+NOTIFY_LEASE = 120  # seconds a claimed batch has to be sent before it is due again
+
+def queue_sms(c, acc, text):
+    """Queue an SMS to the holder of `acc` inside the caller's transaction; {name} is filled in from customers."""
+    queue_sms_many(c, [(acc, text)])
+
+def queue_sms_many(c, messages):
+    # queue_sms() for a list of (acc, text), in one executemany
+    now = now_str()
+    c.executemany("""INSERT INTO outbox(channel,recipient,body,next_attempt_at,created_at)
+                     SELECT 'sms', mobile, replace(?, '{name}', name), ?, ? FROM customers
+                     WHERE account_no=? AND COALESCE(mobile, '') != ''""", [(text, now, now, acc) for acc, text in messages])
+
+class StubSender:
+    """Offline sender: keeps (and by default prints) what it is given; fail_every=n fails every nth message."""
+    def __init__(self, echo=True, fail_every=0):
+        self.echo = echo
+        self.fail_every = fail_every
+        self.sent = []
+        self._seen = 0
+
+    def send(self, messages):
+        # the sender contract: take a list of outbox dicts (msg_id, channel, recipient, body,
+        # attempts) and return {msg_id: None if sent, else an error string}; raising fails the batch
+        results = {}
+        for m in messages:
+            self._seen += 1
+            if self.fail_every and self._seen % self.fail_every == 0:
+                results[m["msg_id"]] = "stub: simulated failure"
+                continue
+            if self.echo:
+                print(f"[{m['channel'].upper()}]", m["recipient"], m["body"])
+            self.sent.append(m)
+            results[m["msg_id"]] = None
+        return results
+
+# NOTIFY_SENDER name -> factory; a gateway sender registers itself here
+SENDERS = {"stub": StubSender}
+
+def _at(seconds):
+    return (datetime.now() + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+class OutboxDispatcher:
+    """Background thread draining the outbox through `sender`, `batch_size` messages per flush."""
+    def __init__(self, sender, batch_size=NOTIFY_BATCH_SIZE, poll=NOTIFY_POLL, max_attempts=NOTIFY_MAX_ATTEMPTS):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.sent = self.retried = self.dead = self.batches = 0
+        self.send_seconds = 0.0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def backoff(self, attempts):
+        return min(NOTIFY_BACKOFF_BASE * 2 ** (attempts - 1), NOTIFY_BACKOFF_MAX)
+
+    def flush(self, c):
+        """Claim and send one batch of due messages; returns how many were claimed."""
+        with immediate(c):
+            batch = [dict(r) for r in c.execute("""UPDATE outbox SET next_attempt_at=? WHERE msg_id IN
+                                                       (SELECT msg_id FROM outbox WHERE status='pending' AND next_attempt_at <= ?
+                                                        ORDER BY next_attempt_at, msg_id LIMIT ?)
+                                                   RETURNING msg_id,channel,recipient,body,attempts""",
+                                                (_at(NOTIFY_LEASE), now_str(), self.batch_size))]
+        if not batch:
+            return 0
+        start = time.perf_counter()
+        try:
+            results = self.sender.send(batch)
+        except Exception as e:
+            results = {m["msg_id"]: repr(e) for m in batch}
+        elapsed = time.perf_counter() - start
+        ok, retry, dead = [], [], []
+        for m in batch:
+            err = results.get(m["msg_id"], "no result from sender")
+            attempts = m["attempts"] + 1
+            if err is None:
+                ok.append((attempts, now_str(), m["msg_id"]))
+            elif attempts >= self.max_attempts:
+                dead.append((attempts, str(err), m["msg_id"]))
+            else:
+                retry.append((attempts, str(err), _at(self.backoff(attempts)), m["msg_id"]))
+        with immediate(c):
+            c.executemany("UPDATE outbox SET status='sent', attempts=?, sent_at=?, last_error=NULL WHERE msg_id=?", ok)
+            c.executemany("UPDATE outbox SET attempts=?, last_error=?, next_attempt_at=? WHERE msg_id=?", retry)
+            c.executemany("UPDATE outbox SET status='failed', attempts=?, last_error=? WHERE msg_id=?", dead)
+        with self._lock:
+            self.batches += 1
+            self.sent += len(ok)
+            self.retried += len(retry)
+            self.dead += len(dead)
+            self.send_seconds += elapsed
+        return len(batch)
+
+    def drain(self):
+        """Flush until nothing is due; returns the number of messages claimed."""
+        c = get_conn()
+        try:
+            total = 0
+            while True:
+                n = self.flush(c)
+                total += n
+                if n < self.batch_size:
+                    return total
+        finally:
+            put_conn(c)
+
+    def stats(self):
+        with self._lock:
+            up = time.monotonic() - self.started
+            return {"sent": self.sent, "retried": self.retried, "failed": self.dead, "batches": self.batches,
+                    "sent_per_sec": round(self.sent / up, 2) if up else 0.0,
+                    "send_msgs_per_sec": round(self.sent / self.send_seconds, 1) if self.send_seconds else 0.0,
+                    "running": self._thread is not None and self._thread.is_alive()}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                app.logger.exception("outbox: flush failed")
+            self._stop.wait(self.poll)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="gms-outbox", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+def outbox_metrics(c):
+    """Queue depth from the outbox table: pending (and due now), failed, and the oldest pending message's age."""
+    row = c.execute("""SELECT
+        (SELECT COUNT(*) FROM outbox WHERE status='pending') AS pending,
+        (SELECT COUNT(*) FROM outbox WHERE status='pending' AND next_attempt_at <= ?) AS due,
+        (SELECT COUNT(*) FROM outbox WHERE status='failed') AS failed,
+        (SELECT MIN(created_at) FROM outbox WHERE status='pending') AS oldest""", (now_str(),)).fetchone()
+    m = dict(row)
+    oldest = m.pop("oldest")
+    m["oldest_pending_sec"] = round((datetime.now() - datetime.strptime(oldest, "%Y-%m-%d %H:%M:%S")).total_seconds()) if oldest else 0
+    return m
+
+def prune_outbox(days=NOTIFY_RETENTION_DAYS):
+    """Delete messages sent more than `days` ago; returns how many."""
+    c = get_conn()
+    try:
+        with immediate(c):
+            return c.execute("DELETE FROM outbox WHERE status='sent' AND sent_at < ?", (_at(-days * 86400),)).rowcount
+    finally:
+        put_conn(c)
+
+dispatcher = OutboxDispatcher(SENDERS[NOTIFY_SENDER]())
+scheduler.add("outbox-prune", NOTIFY_PRUNE_AT, lambda day: prune_outbox())
+
+# ---------- Background threads ----------
+# The scheduler and the outbox dispatcher run in every process that serves requests,
+# whatever the WSGI server: start_background() is called on the first request (and by
+# run_server before it starts listening). A server that should drain the outbox while
+# idle calls gms.start_background() from its post-fork/worker-init hook. Processes that
+# never serve (CLI commands, the debug reloader's watcher) never start them.
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background():
+    """Start the enabled background threads (GMS_SCHEDULER, GMS_NOTIFY) once per process."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+    if NOTIFY_ENABLED:
+        dispatcher.start()
+
+@app.before_request
+def ensure_background():
+    if not _background_started:
+        start_background()
+
+# ---------- Schema migrations ----------
+# init_db() creates the original tables; everything after that is a numbered step
+# recorded in schema_version and applied once, in order, at startup.
+# A step is an SQL string or a callable taking the connection.
+
+# money columns, INTEGER paise since migration 6 (REAL rupees before)
+MONEY_COLUMNS = {
+    "customers": ("balance",),
+    "transactions": ("amount",),
+    "fds": ("amount", "maturity_amount"),
+    "loans": ("loan_amount", "emi", "total_interest", "outstanding", "accrued_interest"),
+    "bank_stats": ("total_balance",),
+}
+
+def rebuild_money_tables(c):
+    # SQLite cannot change a column's type in place: copy each table into one declared
+    # with INTEGER money columns, then put back its indexes, triggers and id counter.
+    # Legacy rename skips re-checking the other tables' triggers, which point at
+    # bank_stats while it is being swapped.
+    c.execute("PRAGMA legacy_alter_table=ON")
+    for table, money in MONEY_COLUMNS.items():
+        ddl = c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()[0]
+        for col in money:
+            ddl = re.sub(rf"\b{col}\s+REAL\b", f"{col} INTEGER", ddl)
+        ddl = re.sub(rf"^CREATE TABLE (IF NOT EXISTS )?{table}\b", f"CREATE TABLE {table}_paise", ddl)
+        extras = [r[0] for r in c.execute("SELECT sql FROM sqlite_master WHERE tbl_name=? AND type IN ('index','trigger') AND sql IS NOT NULL",
+                                          (table,))]
+        seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()
+        cols = [r["name"] for r in c.execute(f"PRAGMA table_info({table})")]
+        select = ", ".join(f"CAST(ROUND({col} * 100) AS INTEGER)" if col in money else col for col in cols)
+        c.execute(ddl)
+        c.execute(f"INSERT INTO {table}_paise({','.join(cols)}) SELECT {select} FROM {table}")
+        c.execute(f"DROP TABLE {table}")
+        c.execute(f"ALTER TABLE {table}_paise RENAME TO {table}")
+        for sql in extras:
+            c.execute(sql)
+        if seq:
+            c.execute("DELETE FROM sqlite_sequence WHERE name=?", (table,))
+            c.execute("INSERT INTO sqlite_sequence(name,seq) VALUES(?,?)", (table, seq[0]))
+    c.execute("PRAGMA legacy_alter_table=OFF")
+
+MIGRATIONS = [
+    (1, "secondary indexes for history, reports and dashboard", [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account_no, date)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)",
+        "CREATE INDEX IF NOT EXISTS idx_fds_account_created ON fds(account_no, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_loans_account_created ON loans(account_no, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_loans_approved ON loans(approved)",
+    ]),
+    (2, "bank_stats dashboard totals maintained by triggers", [
+        """CREATE TABLE IF NOT EXISTS bank_stats(
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            customers INTEGER NOT NULL DEFAULT 0,
+            total_balance REAL NOT NULL DEFAULT 0,
+            fds INTEGER NOT NULL DEFAULT 0,
+            approved_loans INTEGER NOT NULL DEFAULT 0
+        )""",
+        "INSERT OR IGNORE INTO bank_stats(id) VALUES(1)",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_customer_ins AFTER INSERT ON customers BEGIN
+            UPDATE bank_stats SET customers = customers + 1, total_balance = total_balance + COALESCE(NEW.balance,0) WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_customer_del AFTER DELETE ON customers BEGIN
+            UPDATE bank_stats SET customers = customers - 1, total_balance = total_balance - COALESCE(OLD.balance,0) WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_customer_bal AFTER UPDATE OF balance ON customers BEGIN
+            UPDATE bank_stats SET total_balance = total_balance + COALESCE(NEW.balance,0) - COALESCE(OLD.balance,0) WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_fd_ins AFTER INSERT ON fds BEGIN
+            UPDATE bank_stats SET fds = fds + 1 WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_fd_del AFTER DELETE ON fds BEGIN
+            UPDATE bank_stats SET fds = fds - 1 WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_loan_ins AFTER INSERT ON loans BEGIN
+            UPDATE bank_stats SET approved_loans = approved_loans + (NEW.approved = 1) WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_loan_upd AFTER UPDATE OF approved ON loans BEGIN
+            UPDATE bank_stats SET approved_loans = approved_loans + (NEW.approved = 1) - (OLD.approved = 1) WHERE id = 1;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_stats_loan_del AFTER DELETE ON loans BEGIN
+            UPDATE bank_stats SET approved_loans = approved_loans - (OLD.approved = 1) WHERE id = 1;
+        END""",
+        lambda c: reconcile_stats(c),
+    ]),
+    (3, "bank_stats.data_version bumped by every write to the dashboard tables",
+        ["ALTER TABLE bank_stats ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"] + [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{op.lower()} AFTER {op} ON {table} BEGIN
+            UPDATE bank_stats SET data_version = data_version + 1 WHERE id = 1;
+        END"""
+        for table in ("customers", "transactions", "fds", "loans") for op in ("INSERT", "UPDATE", "DELETE")
+    ]),
+    (4, "FD compounding basis and loan EMI / total interest", [
+        "ALTER TABLE fds ADD COLUMN compounding TEXT NOT NULL DEFAULT 'simple'",
+        "ALTER TABLE loans ADD COLUMN emi REAL",
+        "ALTER TABLE loans ADD COLUMN total_interest REAL",
+    ]),
+    (5, "FD maturity / loan accrual state and batch_runs checkpoints", [
+        "ALTER TABLE fds ADD COLUMN maturity_date TEXT",
+        "ALTER TABLE fds ADD COLUMN matured_on TEXT",
+        "UPDATE fds SET maturity_date = date(created_at, '+' || tenure_months || ' months')",
+        "CREATE INDEX IF NOT EXISTS idx_fds_due ON fds(maturity_date) WHERE matured_on IS NULL",
+        "ALTER TABLE loans ADD COLUMN outstanding REAL",
+        "ALTER TABLE loans ADD COLUMN accrued_interest REAL NOT NULL DEFAULT 0",
+        "ALTER TABLE loans ADD COLUMN accrued_through TEXT",
+        "UPDATE loans SET outstanding = loan_amount, accrued_through = date(created_at) WHERE approved = 1",
+        "CREATE INDEX IF NOT EXISTS idx_loans_accrual ON loans(approved, accrued_through)",
+        """CREATE TABLE IF NOT EXISTS batch_runs(
+            job TEXT NOT NULL,
+            business_date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            stats TEXT NOT NULL DEFAULT '{}',
+            PRIMARY KEY (job, business_date)
+        )""",
+    ]),
+    (6, "money columns as integer paise", [
+        rebuild_money_tables,
+        "UPDATE batch_runs SET stats = json_set(stats, '$.amount_paid', CAST(ROUND(json_extract(stats, '$.amount_paid') * 100) AS INTEGER), "
+        "'$.interest_accrued', CAST(ROUND(json_extract(stats, '$.interest_accrued') * 100) AS INTEGER)) WHERE job = 'accrual'",
+    ]),
+    (7, "balance_snapshots closing balances", [
+        """CREATE TABLE IF NOT EXISTS balance_snapshots(
+            account_no INTEGER NOT NULL,
+            as_of TEXT NOT NULL,
+            balance INTEGER NOT NULL,
+            PRIMARY KEY (account_no, as_of)
+        ) WITHOUT ROWID""",
+    ]),
+    (8, "archive_periods catalog of archived transaction months", [
+        """CREATE TABLE IF NOT EXISTS archive_periods(
+            period TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            lo TEXT NOT NULL,
+            hi TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            archived_at TEXT
+        )""",
+    ]),
+    (9, "loan approval queue index", [
+        # loan_id is the rowid, so this also serves the (created_at, loan_id) keyset order;
+        # it makes the single-column approved index redundant
+        "CREATE INDEX IF NOT EXISTS idx_loans_queue ON loans(approved, created_at)",
+        "DROP INDEX IF EXISTS idx_loans_approved",
+    ]),
+    (10, "notification outbox", [
+        """CREATE TABLE IF NOT EXISTS outbox(
+            msg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL,
+            sent_at TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, next_attempt_at)",
+    ]),
+    (11, "export order indexes", [
+        # the bank-wide fds/loans exports stream in (created_at, pk) order; with the pk as
+        # the rowid these let them start at the first row instead of sorting the table
+        "CREATE INDEX IF NOT EXISTS idx_fds_created ON fds(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_loans_created ON loans(created_at)",
+    ]),
+]
+
+def schema_version(c):
+    return c.execute("SELECT COALESCE(MAX(version),0) FROM schema_version").fetchone()[0]
+
+def migrate(c):
+    """Apply pending migrations; returns the versions applied."""
+    c.execute("CREATE TABLE IF NOT EXISTS schema_version(version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)")
+    c.commit()
+    applied = []
+    for version, desc, steps in MIGRATIONS:
+        if version <= schema_version(c):
+            continue  # common case at startup: no write lock needed
+        with immediate(c):
+            # re-checked under the write lock in case another process got here first
+            if version <= schema_version(c):
+                continue
+            for step in steps:
+                if callable(step):
+                    step(c)
+                else:
+                    c.execute(step)
+            c.execute("INSERT INTO schema_version(version,description,applied_at) VALUES(?,?,?)", (version, desc, now_str()))
+        applied.append(version)
+    return applied
+
+# queries on the request path that must be served from an index
+HOT_QUERIES = {
+    "dashboard recent transactions": ("SELECT account_no,type,amount,date FROM transactions ORDER BY date DESC LIMIT 10", ()),
+    "dashboard all transactions": ("SELECT date,account_no,type,amount,note FROM transactions ORDER BY date DESC LIMIT 200", ()),
+    "history page (account)": ("SELECT trans_id,account_no,type,amount,date,note FROM transactions WHERE account_no=? AND (date, trans_id) < (?, ?) ORDER BY date DESC, trans_id DESC LIMIT ?",
+                               (1, "9999-12-31", 0, 100)),
+    "history page (bank)": ("SELECT trans_id,account_no,type,amount,date,note FROM transactions WHERE (date, trans_id) < (?, ?) ORDER BY date DESC, trans_id DESC LIMIT ?",
+                            ("9999-12-31", 0, 100)),
+    "ledger export by date": ("SELECT trans_id,account_no,type,amount,date,note FROM transactions WHERE date>=? AND date<? ORDER BY date, trans_id",
+                              ("2024-01-01", "2024-02-01")),
+    "ledger export": ("SELECT trans_id,account_no,type,amount,date,note FROM transactions ORDER BY date, trans_id", ()),
+    "fd export": ("SELECT fd_id,account_no,amount,interest_rate,tenure_months,maturity_amount,created_at FROM fds ORDER BY created_at, fd_id", ()),
+    "fd export by date": ("SELECT fd_id,account_no,amount,interest_rate,tenure_months,maturity_amount,created_at FROM fds WHERE created_at>=? AND created_at<? ORDER BY created_at, fd_id",
+                          ("2024-01-01", "2024-02-01")),
+    "loan export": ("SELECT loan_id,account_no,loan_amount,interest_rate,tenure_months,approved,created_at FROM loans ORDER BY created_at, loan_id", ()),
+    "statement transactions": ("SELECT trans_id,date,type,amount,note FROM transactions WHERE account_no=? AND date >= ? AND date < ? ORDER BY date, trans_id",
+                               (1, "", "9999")),
+    "fd report": ("SELECT fd_id,amount,interest_rate,tenure_months,maturity_amount,created_at FROM fds WHERE account_no=? ORDER BY created_at DESC", (1,)),
+    "loan report": ("SELECT loan_id,loan_amount,interest_rate,tenure_months,approved,created_at FROM loans WHERE account_no=? ORDER BY created_at DESC", (1,)),
+    "balance snapshot lookup": ("SELECT date(as_of, '+1 day') AS start, balance FROM balance_snapshots WHERE account_no=? AND as_of < ? ORDER BY as_of DESC LIMIT 1",
+                                (1, "2024-01-01")),
+    "accrual: due FDs": ("SELECT fd_id FROM fds WHERE matured_on IS NULL AND maturity_date <= ? LIMIT ?", ("2024-01-01", 50000)),
+    "loan approval queue": ("SELECT loan_id,account_no,loan_amount,interest_rate,tenure_months,emi,approved,created_at FROM loans WHERE approved=? AND (created_at, loan_id) > (?, ?) ORDER BY created_at, loan_id LIMIT ?",
+                            (0, "", 0, 50)),
+    "outbox: due messages": ("SELECT msg_id FROM outbox WHERE status='pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, msg_id LIMIT ?",
+                             ("2024-01-01 00:00:00", 100)),
+    "accrual: loans to accrue": ("SELECT loan_id FROM loans WHERE approved=1 AND accrued_through < ? LIMIT ?", ("2024-01-01", 50000)),
+}
+
+def check_query_plans(c):
+    """EXPLAIN QUERY PLAN each hot query; returns [(name, plan lines, uses_index)]."""
+    report = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = [r["detail"] for r in c.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        full_scan = any(d.startswith("SCAN") and "USING" not in d for d in plan)
+        temp_sort = any("TEMP B-TREE" in d for d in plan)
+        report.append((name, plan, not (full_scan or temp_sort)))
+    return report
+
+# ---------- Dashboard stats ----------
+# bank_stats is a single row kept current by the triggers from migration 2, so the
+# dashboard reads its totals in O(1). reconcile_stats() recomputes them from scratch.
+STATS_COLUMNS = ("customers", "total_balance", "fds", "approved_loans")
+
+def read_stats(c, columns=STATS_COLUMNS + ("data_version",)):
+    # reconcile_stats() asks for STATS_COLUMNS only: it runs in migration 2, before data_version exists
+    return dict(c.execute(f"SELECT {','.join(columns)} FROM bank_stats WHERE id=1").fetchone())
+
+def reconcile_stats(c, fix=True):
+    """Rebuild bank_stats from the base tables; returns {column: (stored, actual)} for drifted columns."""
+    actual = dict(c.execute("""SELECT
+        (SELECT COUNT(*) FROM customers) AS customers,
+        (SELECT COALESCE(SUM(balance),0) FROM customers) AS total_balance,
+        (SELECT COUNT(*) FROM fds) AS fds,
+        (SELECT COUNT(*) FROM loans WHERE approved=1) AS approved_loans""").fetchone())
+    stored = read_stats(c, STATS_COLUMNS)
+    drift = {k: (stored[k], actual[k]) for k in STATS_COLUMNS if stored[k] != actual[k]}
+    if fix and drift:
+        c.execute("UPDATE bank_stats SET customers=?, total_balance=?, fds=?, approved_loans=? WHERE id=1",
+                  tuple(actual[k] for k in STATS_COLUMNS))
+    return drift
+
+# ---------- Caching ----------
+class LRUCache:
+    """Thread-safe LRU map bounded by entry count and optional total weight, with TTL and hit/miss counters."""
+    def __init__(self, maxsize, ttl=None, maxweight=None, weigh=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self._data = OrderedDict()  # key -> (expires_at, weight, value)
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (item[0] is not None and item[0] < time.monotonic()):
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[2]
+
+    def put(self, key, value):
+        weight = self.weigh(value) if self.maxweight else 0
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires, weight, value)
+            self._weight += weight
+            while self._data and (len(self._data) > self.maxsize or (self.maxweight and self._weight > self.maxweight)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def _remove(self, key):
+        self._weight -= self._data.pop(key)[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._data), "maxsize": self.maxsize, "weight": self._weight,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_ratio": round(self.hits / lookups, 4) if lookups else None}
+
+# rendered dashboard HTML keyed on bank_stats.data_version: any write to customers,
+# transactions, fds or loans bumps the version, so stale entries are never served
+fragment_cache = LRUCache(FRAGMENT_CACHE_ENTRIES, ttl=FRAGMENT_CACHE_TTL, maxweight=FRAGMENT_CACHE_BYTES)
+
+# ---------- Customer cache ----------
+# Most routes start with a point lookup of the customer row: an existence check, the name
+# for a PDF header, the PIN for ATM login. An export repeats it in each document builder.
+# customer() serves the columns that never change after the account is opened from an
+# in-process LRU keyed by account_no, and reads balance live on every call: postings
+# commit from every web worker, the CLI batches and the export pools, so no process can
+# know when a cached balance went stale. A hit is a primary-key lookup of one column.
+class CustomerCache:
+    """customers rows without balance (as dicts) by account_no."""
+    def __init__(self, maxsize, ttl):
+        self.rows = LRUCache(maxsize, ttl=ttl)
+
+    def get(self, c, acc):
+        try:
+            acc = int(acc)
+        except (TypeError, ValueError):
+            return None
+        fixed = self.rows.get(acc)
+        if fixed is None:
+            row = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
+            if row is None:
+                return None  # not cached: the account may be created next
+            row = dict(row)
+            self.rows.put(acc, {k: v for k, v in row.items() if k != "balance"})
+            return row
+        row = c.execute("SELECT balance FROM customers WHERE account_no=?", (acc,)).fetchone()
+        if row is None:
+            self.rows.pop(acc)
+            return None
+        return dict(fixed, balance=row[0])
+
+    def stats(self):
+        return self.rows.stats()
+
+customer_cache = CustomerCache(CUSTOMER_CACHE_ENTRIES, CUSTOMER_CACHE_TTL)
+
+def customer(c, acc):
+    """The customers row for `acc` (a dict with the current balance), or None."""
+    return customer_cache.get(c, acc)
+
+# ---------- Transaction archive ----------
+# Closed months of transactions move out of the main DB into one archive database per
+# month (ARCHIVE_DIR/transactions_YYYY-MM.db), listed in archive_periods. Readers go
+# through TieredCursor, which runs the same query against each tier whose month overlaps
+# the requested dates. Tiers hold disjoint date ranges, so rows ordered by date within
+# each tier come out ordered overall. archive_month() delists a month from main in the
+# same commit that deletes its rows, so the catalog and the hot tier are read in one read
+# transaction; each archive is read over its own read-only connection (ATTACH is not
+# allowed inside a transaction, and a listed archive never changes).
+ARCHIVE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS transactions(trans_id INTEGER PRIMARY KEY, account_no INTEGER, type TEXT, amount INTEGER, date TEXT, note TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account_no, date)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)",
+)
+
+def month_bounds(period):
+    # "YYYY-MM" -> (first day, first day of the next month)
+    start = datetime.strptime(period, "%Y-%m")
+    return start.strftime("%Y-%m-%d"), (start + timedelta(days=32)).replace(day=1).strftime("%Y-%m-%d")
+
+def archive_horizon(now=None):
+    """First day of the oldest hot month; months before it may be archived."""
+    d = (now or datetime.now()).replace(day=1)
+    for _ in range(ARCHIVE_HOT_MONTHS):
+        d = (d - timedelta(days=1)).replace(day=1)
+    return d.strftime("%Y-%m-%d")
+
+def archived_periods(c, lo=None, hi=None):
+    """Catalog rows of archived months overlapping [lo, hi), oldest first."""
+    return c.execute("SELECT period,file,lo,hi FROM archive_periods WHERE hi > ? AND lo < ? ORDER BY period",
+                     (lo or "", hi or "9999")).fetchall()
+
+@contextmanager
+def read_transaction(c):
+    # one snapshot of the main database for the block; joins a transaction already open on c
+    if c.in_transaction:
+        yield
+        return
+    c.execute("BEGIN")
+    try:
+        yield
+    finally:
+        c.execute("COMMIT")  # nothing was written
+
+@contextmanager
+def attached(c, schema, file=None):
+    # the main DB, an archive the connection already has attached, or attach it for the block
+    if file is None or schema in {r[1] for r in c.execute("PRAGMA database_list")}:
+        yield schema
+        return
+    c.execute(f"ATTACH DATABASE ? AS {schema}", (os.path.join(ARCHIVE_DIR, file),))
+    try:
+        yield schema
+    finally:
+        c.execute(f"DETACH DATABASE {schema}")
+
+class TieredCursor:
+    """Cursor-like view (description, fetchmany, iteration) of `sql` run against every
+    transactions tier overlapping [lo, hi), with {tx} in `sql` standing for the table.
+    Tiers are visited oldest first, or newest first; `limit` caps the rows across tiers.
+    Unless `c` is already in a transaction, the cursor holds a read transaction on it
+    until it is exhausted or closed; a request's open cursors are closed on teardown."""
+    def __init__(self, c, sql, params=(), lo=None, hi=None, newest_first=False, limit=None, include_main=True):
+        self.c, self.sql, self.params, self.limit = c, sql, list(params), limit
+        self._own_txn = not c.in_transaction
+        if self._own_txn:
+            c.execute("BEGIN")
+        try:
+            self.tiers = [p["file"] for p in archived_periods(c, lo, hi)]
+            if include_main:
+                self.tiers.append(None)
+            if newest_first:
+                self.tiers.reverse()
+            self.description = c.execute(f"SELECT * FROM ({sql.format(tx='transactions')}) LIMIT 0", self.params).description
+        except BaseException:
+            self._end()
+            raise
+        if has_app_context() and g.get("db") is c:
+            g.setdefault("tiered_cursors", []).append(self)
+        self._rows = self._run()
+
+    def _run(self):
+        left = self.limit
+        try:
+            for file in self.tiers:
+                if left is not None and left <= 0:
+                    return
+                conn = self.c if file is None else connect_db(os.path.join(ARCHIVE_DIR, file), readonly=True)
+                sql, params = self.sql.format(tx="transactions"), self.params
+                if left is not None:
+                    sql, params = sql + " LIMIT ?", params + [left]
+                cur = conn.execute(sql, params)
+                try:
+                    for row in cur:
+                        if left is not None:
+                            left -= 1
+                        yield row
+                finally:
+                    cur.close()
+                    if conn is not self.c:
+                        conn.close()
+        finally:
+            self._end()
+
+    def _end(self):
+        if self._own_txn:
+            self._own_txn = False
+            self.c.execute("COMMIT")
+
+    def __iter__(self):
+        return self._rows
+
+    def fetchmany(self, size=1):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        self._rows.close()
+        self._end()  # a cursor closed before its first row never ran _run()
+
+def archive_month(c, period):
+    """Move one closed month ("YYYY-MM") of transactions into its archive database; returns rows moved."""
+    lo, hi = month_bounds(period)
+    if hi > archive_horizon():
+        raise ValueError(f"{period} is inside the hot window of {ARCHIVE_HOT_MONTHS} months")
+    file = f"transactions_{period}.db"
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    a = sqlite3.connect(os.path.join(ARCHIVE_DIR, file))
+    for ddl in ARCHIVE_SCHEMA:
+        a.execute(ddl)
+    a.commit(); a.close()
+    with attached(c, "arc_" + period.replace("-", "_"), file) as arc:
+        # copy and commit before deleting: in WAL mode a transaction over two database
+        # files is not atomic across them. A rerun after a crash re-copies (ignored) and
+        # finishes the delete; the month is only listed once its hot rows are gone.
+        with immediate(c):
+            c.execute(f"""INSERT OR IGNORE INTO {arc}.transactions SELECT trans_id,account_no,type,amount,date,note
+                          FROM main.transactions WHERE date >= ? AND date < ? ORDER BY trans_id""", (lo, hi))
+        with immediate(c):
+            missing = c.execute(f"""SELECT COUNT(*) FROM main.transactions m WHERE date >= ? AND date < ?
+                                    AND NOT EXISTS (SELECT 1 FROM {arc}.transactions a WHERE a.trans_id = m.trans_id)""", (lo, hi)).fetchone()[0]
+            if missing:
+                raise RuntimeError(f"{missing} rows of {period} missing from {file}; nothing deleted")
+            moved = c.execute("DELETE FROM main.transactions WHERE date >= ? AND date < ?", (lo, hi)).rowcount
+            rows = c.execute(f"SELECT COUNT(*) FROM {arc}.transactions").fetchone()[0]
+            c.execute("INSERT OR REPLACE INTO archive_periods(period,file,lo,hi,rows,archived_at) VALUES(?,?,?,?,?,?)",
+                      (period, file, lo, hi, rows, now_str()))
+    return moved
+
+def archive_closed_months(vacuum=False):
+    """Archive every month older than the hot window; returns {period: rows moved}."""
+    horizon = archive_horizon()
+    moved = {}
+    c = get_conn()
+    try:
+        while True:
+            first = c.execute("SELECT MIN(date) FROM transactions WHERE date < ?", (horizon,)).fetchone()[0]
+            if not first:
+                break
+            moved[first[:7]] = archive_month(c, first[:7])
+        if vacuum and moved:
+            c.execute("VACUUM")  # hand the freed pages back to the filesystem
+    finally:
+        put_conn(c)
+    return moved
+
+# ---------- Transaction history ----------
+# Keyset pagination on (date, trans_id), newest first: each page is an index range
+# seek from the previous page's last row, so page N costs the same as page 1.
+def encode_cursor(date, trans_id):
+    return base64.urlsafe_b64encode(f"{date}|{trans_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    # raises ValueError on a malformed cursor
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    date, trans_id = raw.rsplit("|", 1)
+    return date, int(trans_id)
+
+def history_rows(c, acc=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """Cursor over up to `limit` transactions older than `after` ((date, trans_id) or None), hot and archived."""
+    where, params = [], []
+    if acc is not None:
+        where.append("account_no=?"); params.append(acc)
+    if after is not None:
+        where.append("(date, trans_id) < (?, ?)"); params.extend(after)
+    sql = "SELECT trans_id,account_no,type,amount,date,note FROM {tx}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return TieredCursor(c, sql + " ORDER BY date DESC, trans_id DESC", params, hi=after[0] if after else None,
+                        newest_first=True, limit=limit)
+
+def stream_history(c, acc, after, limit):
+    # one extra row tells us whether there is a next page; rows are written as they
+    # come off the cursor, so memory does not grow with the page size
+    yield '{"account_no": %s, "transactions": [' % json.dumps(acc)
+    last, n, more = None, 0, False
+    cur = history_rows(c, acc, after, limit + 1)
+    try:
+        for r in cur:
+            if n == limit:
+                more = True
+                break
+            yield ("," if n else "") + json.dumps(dict(r, amount=Money(r["amount"]).rupees))
+            last, n = r, n + 1
+    finally:
+        cur.close()
+    yield '], "count": %d, "next_cursor": %s}' % (n, json.dumps(encode_cursor(last["date"], last["trans_id"]) if more else None))
+
+# ---------- Data export ----------
+# Streaming CSV / NDJSON dumps of the raw tables. Rows are read with fetchmany() and
+# each chunk is encoded and sent before the next is read, so the first bytes go out
+# immediately and memory is bounded by one chunk however large the export is.
+# table -> (exported columns, primary key, date column used for from/to filters)
+EXPORT_TABLES = {
+    "transactions": ("trans_id,account_no,type,amount,date,note", "trans_id", "date"),
+    "customers": ("account_no,name,age,mobile,balance,created_at", "account_no", "created_at"),  # never the PIN
+    "fds": ("fd_id,account_no,amount,interest_rate,tenure_months,maturity_amount,created_at", "fd_id", "created_at"),
+    "loans": ("loan_id,account_no,loan_amount,interest_rate,tenure_months,approved,created_at", "loan_id", "created_at"),
+}
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def parse_day(value):
+    # YYYY-MM-DD -> datetime; raises ValueError
+    return datetime.strptime(value, "%Y-%m-%d")
+
+def day_bounds(date_from=None, date_to=None):
+    # inclusive day range -> (lower bound, exclusive upper bound) as comparable strings
+    lo = date_from.strftime("%Y-%m-%d") if date_from else None
+    hi = (date_to + timedelta(days=1)).strftime("%Y-%m-%d") if date_to else None
+    return lo, hi
+
+def export_rows(c, table, acc=None, date_from=None, date_to=None):
+    """Cursor over `table` filtered by account and an inclusive [date_from, date_to] day range."""
+    columns, pk, date_col = EXPORT_TABLES[table]
+    # exports stay in rupees
+    columns = ",".join(f"{col} / 100.0 AS {col}" if col in MONEY_COLUMNS[table] else col for col in columns.split(","))
+    lo, hi = day_bounds(date_from, date_to)
+    where, params = [], []
+    if acc is not None:
+        where.append("account_no=?"); params.append(acc)
+    if lo:
+        where.append(f"{date_col}>=?"); params.append(lo)
+    if hi:
+        where.append(f"{date_col}<?"); params.append(hi)
+    sql = f"SELECT {columns} FROM {'{tx}' if table == 'transactions' else table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    order = pk if table == "customers" else f"{date_col}, {pk}"
+    if table == "transactions":
+        return TieredCursor(c, f"{sql} ORDER BY {order}", params, lo, hi)
+    return c.execute(f"{sql} ORDER BY {order}", params)
+
+def iter_chunks(cur, size=EXPORT_FETCH_SIZE):
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+# the stream closes its cursor however it ends, before teardown returns the connection
+def stream_csv(cur):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow([d[0] for d in cur.description])
+    try:
+        for rows in iter_chunks(cur):
+            w.writerows(rows)
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    finally:
+        cur.close()
+    yield buf.getvalue()
+
+def stream_ndjson(cur):
+    names = [d[0] for d in cur.description]
+    try:
+        for rows in iter_chunks(cur):
+            yield "".join(json.dumps(dict(zip(names, r))) + "\n" for r in rows)
+    finally:
+        cur.close()
 
 # initialize DB on start
 init_db()
@@ -258,7 +2170,7 @@ TEMPLATE = """
                   <thead><tr><th>Account</th><th>Type</th><th>Amount</th><th>Date</th></tr></thead>
                   <tbody>
                     {% for t in recent_txs %}
-                      <tr><td>{{ t.account_no }}</td><td>{{ t.type }}</td><td>₹{{ '%.2f'|format(t.amount) }}</td><td>{{ t.date }}</td></tr>
+                      <tr><td>{{ t.account_no }}</td><td>{{ t.type }}</td><td>₹{{ t.amount|money }}</td><td>{{ t.date }}</td></tr>
                     {% endfor %}
                   </tbody>
                 </table>
@@ -376,7 +2288,7 @@ TEMPLATE = """
                 <thead><tr><th>Date</th><th>Acc</th><th>Type</th><th>Amount</th><th>Note</th></tr></thead>
                 <tbody>
                   {% for t in all_txs %}
-                    <tr><td>{{ t.date }}</td><td>{{ t.account_no }}</td><td>{{ t.type }}</td><td>₹{{ '%.2f'|format(t.amount) }}</td><td>{{ t.note }}</td></tr>
+                    <tr><td>{{ t.date }}</td><td>{{ t.account_no }}</td><td>{{ t.type }}</td><td>₹{{ t.amount|money }}</td><td>{{ t.note }}</td></tr>
                   {% endfor %}
                 </tbody>
               </table>
@@ -391,7 +2303,7 @@ TEMPLATE = """
           <div class="card-body">
             <h5>PDF / Export</h5>
             <form method="post" action="/export" class="row g-2">
-              <div class="col-md-3"><input name="acc" class="form-control" placeholder="Account No" type="number" required></div>
+              <div class="col-md-2"><input name="acc" class="form-control" placeholder="Account No" type="number" required></div>
               <div class="col-md-3">
                 <select name="type" class="form-select">
                   <option value="account">Account Details (PDF)</option>
@@ -401,6 +2313,8 @@ TEMPLATE = """
                   <option value="all">All (zipped multiple)</option>
                 </select>
               </div>
+              <div class="col-md-2"><input name="from" class="form-control" type="date" title="Statement from (optional)"></div>
+              <div class="col-md-2"><input name="to" class="form-control" type="date" title="Statement to (optional)"></div>
               <div class="col-md-3"><button class="btn btn-primary btn-primary-custom w-100">Export</button></div>
             </form>
           </div>
@@ -452,23 +2366,79 @@ TEMPLATE = """
 </html>
 """
 
+# simple admin page single-file style
+ADMIN_LOANS_TEMPLATE = """
+    <h3>Admin - Loans</h3>
+    <p><a href="/">Back to dashboard</a></p>
+    {% for cat, msg in get_flashed_messages(with_categories=true) %}<div class="alert alert-{{ cat }}">{{ msg }}</div>{% endfor %}
+    <form method="get" class="mb-2">
+      <select name="status">
+        <option value="pending" {{ 'selected' if status == 'pending' }}>Pending ({{ pending }})</option>
+        <option value="approved" {{ 'selected' if status == 'approved' }}>Approved</option>
+      </select>
+      <input name="acc" value="{{ filters.acc or '' }}" placeholder="Account no">
+      <input name="min_amount" value="{{ filters.min_amount or '' }}" placeholder="Min amount">
+      <input name="max_amount" value="{{ filters.max_amount or '' }}" placeholder="Max amount">
+      <button class="btn btn-secondary">Filter</button>
+    </form>
+    <form method="post">
+      {% for k, v in filters.items() %}<input type="hidden" name="{{ k }}" value="{{ v }}">{% endfor %}
+      <table class="table table-sm">
+        <tr><th></th><th>Loan ID</th><th>A/c</th><th>Amount</th><th>EMI</th><th>Tenure</th><th>Applied</th></tr>
+        {% for r in loans %}
+        <tr>
+          <td>{% if not r.approved %}<input type="checkbox" name="loan_id" value="{{ r.loan_id }}">{% endif %}</td>
+          <td>{{ r.loan_id }}</td><td>{{ r.account_no }}</td><td>₹{{ r.loan_amount|money }}</td>
+          <td>₹{{ r.emi|money }}</td><td>{{ r.tenure_months }} mo</td><td>{{ r.created_at }}</td>
+        </tr>
+        {% else %}
+        <tr><td colspan="7">No loans match.</td></tr>
+        {% endfor %}
+      </table>
+      {% if next_cursor %}<p><a href="{{ url_for('admin_loans', cursor=next_cursor, status=status, **filters) }}">Next page</a></p>{% endif %}
+      {% if status == 'pending' %}
+      <div class="mb-2"><input name="loan_ids" class="form-control" placeholder="Loan IDs to approve (comma separated)"></div>
+      <button class="btn btn-primary">Approve selected</button>
+      <button class="btn btn-warning" name="all" value="1">Approve all matching (up to {{ approve_max }})</button>
+      {% endif %}
+    </form>
+    """
+
+# Templates are compiled once at import; render_template_string would re-parse and
+# re-compile the source on every request.
+index_template = app.jinja_env.from_string(TEMPLATE)
+admin_loans_template = app.jinja_env.from_string(ADMIN_LOANS_TEMPLATE)
+
+def render(template, **context):
+    # same context (request, session, g, config) and signals as render_template_string
+    app.update_template_context(context)
+    before_render_template.send(app, template=template, context=context)
+    rv = template.render(context)
+    template_rendered.send(app, template=template, context=context)
+    return rv
+
 # ---------- Flask routes & logic ----------
 @app.route("/", methods=["GET"])
 def index():
     # gather stats & recent data
     c = get_conn()
+    totals = read_stats(c)
+    logo_exists = os.path.exists(LOGO_FILE)
+    key = ("index", totals['data_version'], logo_exists)
+    html = fragment_cache.get(key)
+    if html is not None:
+        return html
     stats = {}
-    stats['customers'] = c.execute("SELECT COUNT(*) FROM customers").fetchone()[0]
-    td = c.execute("SELECT SUM(balance) FROM customers").fetchone()[0] or 0.0
-    stats['total_deposits'] = f"{td:.2f}"
-    stats['fds'] = c.execute("SELECT COUNT(*) FROM fds").fetchone()[0]
-    stats['loans'] = c.execute("SELECT COUNT(*) FROM loans WHERE approved=1").fetchone()[0]
+    stats['customers'] = totals['customers']
+    stats['total_deposits'] = str(Money(totals['total_balance']))
+    stats['fds'] = totals['fds']
+    stats['loans'] = totals['approved_loans']
     recent_txs = c.execute("SELECT account_no,type,amount,date FROM transactions ORDER BY date DESC LIMIT 10").fetchall()
     all_txs = c.execute("SELECT date,account_no,type,amount,note FROM transactions ORDER BY date DESC LIMIT 200").fetchall()
-    logo_exists = os.path.exists(LOGO_FILE)
-    c.close()
-    return render_template_string(TEMPLATE, stats=stats, recent_txs=recent_txs, all_txs=all_txs, logo_exists=logo_exists, upi=UPI_ID,
-                                  created_acc=None, deposit_msg=None, withdraw_msg=None, fd_msg=None, loan_msg=None, atm_msg=None)
+    html = render(index_template, stats=stats, recent_txs=recent_txs, all_txs=all_txs, logo_exists=logo_exists, upi=UPI_ID,
+                  created_acc=None, deposit_msg=None, withdraw_msg=None, fd_msg=None, loan_msg=None, atm_msg=None)
+    fragment_cache.put(key, html)
+    return html
 
 # create account
 @app.route("/create", methods=["POST"])
@@ -476,7 +2446,7 @@ def create():
     name = request.form.get("name","").strip()
     age = request.form.get("age","").strip()
     mobile = request.form.get("mobile","").strip()
-    initial = safe_float(request.form.get("initial","0"))
+    initial = Money.parse(request.form.get("initial","0"))
     pin = request.form.get("pin","").strip()
     if not name or not age or not mobile or initial is None or not pin:
         flash("All fields required", "danger")
@@ -487,13 +2457,11 @@ def create():
         flash("Age must be number", "danger")
         return redirect(url_for("index") + "#create")
     c = get_conn()
-    c.execute("INSERT INTO customers(name,age,mobile,pin,balance,created_at) VALUES(?,?,?,?,?,?)",
-              (name, age_int, mobile, pin, float(initial), now_str()))
-    c.commit()
-    acc = c.execute("SELECT last_insert_rowid()").fetchone()[0]
-    if float(initial) > 0:
-        record_tx(acc, "Deposit", float(initial), note="Initial deposit")
-    c.close()
+    with immediate(c):
+        acc = c.execute("INSERT INTO customers(name,age,mobile,pin,balance,created_at) VALUES(?,?,?,?,?,?)",
+                        (name, age_int, mobile, pin, 0, now_str())).lastrowid
+        if initial > 0:
+            apply_posting(c, acc, "Deposit", initial, note="Initial deposit")
     flash(f"Account created: {acc}", "success")
     return redirect(url_for("index") + "#create")
 
@@ -501,49 +2469,51 @@ def create():
 @app.route("/deposit", methods=["POST"])
 def deposit():
     acc = request.form.get("acc")
-    amt = safe_float(request.form.get("amt"))
+    amt = Money.parse(request.form.get("amt"))
     if not acc or amt is None or amt <= 0:
         flash("Valid account & amount required", "danger")
         return redirect(url_for("index") + "#deposit")
-    c = get_conn()
-    cust = c.execute("SELECT balance,mobile,name FROM customers WHERE account_no=?", (acc,)).fetchone()
-    if not cust:
+    try:
+        acc = int(acc)
+    except ValueError:
+        flash("Account not found", "danger")
+        return redirect(url_for("index") + "#deposit")
+    try:
+        newbal = post_tx(acc, "Deposit", amt)
+    except AccountNotFound:
         flash("Account not found", "danger")
-        c.close()
         return redirect(url_for("index") + "#deposit")
-    newbal = cust["balance"] + float(amt)
-    c.execute("UPDATE customers SET balance=? WHERE account_no=?", (newbal, acc))
-    c.commit(); c.close()
-    record_tx(int(acc), "Deposit", float(amt))
-    flash(f"Deposited ₹{float(amt):.2f}. New balance ₹{newbal:.2f}", "success")
+    flash(f"Deposited ₹{amt}. New balance ₹{newbal}", "success")
     return redirect(url_for("index") + "#deposit")
 
 # withdraw
 @app.route("/withdraw", methods=["POST"])
 def withdraw():
     acc = request.form.get("acc")
-    amt = safe_float(request.form.get("amt"))
+    amt = Money.parse(request.form.get("amt"))
     if not acc or amt is None or amt <= 0:
         flash("Valid account & amount required", "danger")
         return redirect(url_for("index") + "#withdraw")
-    c = get_conn()
-    cust = c.execute("SELECT balance,mobile,name FROM customers WHERE account_no=?", (acc,)).fetchone()
-    if not cust:
+    try:
+        acc = int(acc)
+    except ValueError:
+        flash("Account not found", "danger")
+        return redirect(url_for("index") + "#withdraw")
+    try:
+        newbal = post_tx(acc, "Withdraw", amt)
+    except AccountNotFound:
         flash("Account not found", "danger")
-        c.close(); return redirect(url_for("index") + "#withdraw")
-    if cust["balance"] < float(amt):
-        flash("Insufficient balance", "danger"); c.close(); return redirect(url_for("index") + "#withdraw")
-    newbal = cust["balance"] - float(amt)
-    c.execute("UPDATE customers SET balance=? WHERE account_no=?", (newbal, acc)); c.commit(); c.close()
-    record_tx(int(acc), "Withdraw", float(amt))
-    flash(f"Withdrawn ₹{float(amt):.2f}. New balance ₹{newbal:.2f}", "success")
+        return redirect(url_for("index") + "#withdraw")
+    except InsufficientFunds:
+        flash("Insufficient balance", "danger"); return redirect(url_for("index") + "#withdraw")
+    flash(f"Withdrawn ₹{amt}. New balance ₹{newbal}", "success")
     return redirect(url_for("index") + "#withdraw")
 
 # FD
 @app.route("/fd", methods=["POST"])
 def fd():
     acc = request.form.get("acc")
-    amt = safe_float(request.form.get("amt"))
+    amt = Money.parse(request.form.get("amt"))
     tenure = request.form.get("tenure")
     try:
         tenure_i = int(tenure)
@@ -551,28 +2521,34 @@ def fd():
         flash("Invalid tenure", "danger"); return redirect(url_for("index") + "#fd")
     if not acc or amt is None or amt <= 0 or tenure_i <= 0:
         flash("Valid account, amount and tenure required", "danger"); return redirect(url_for("index") + "#fd")
+    if tenure_i > MAX_TENURE_MONTHS:
+        flash(f"Tenure can be at most {MAX_TENURE_MONTHS} months", "danger"); return redirect(url_for("index") + "#fd")
+    try:
+        acc = int(acc)
+    except ValueError:
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#fd")
+    rate = FD_RATE
+    maturity = Money(round(fd_maturity(amt, rate, tenure_i, FD_COMPOUNDING)))
     c = get_conn()
-    cust = c.execute("SELECT balance,mobile,name FROM customers WHERE account_no=?", (acc,)).fetchone()
-    if not cust:
-        flash("Account not found", "danger"); c.close(); return redirect(url_for("index") + "#fd")
-    if cust["balance"] < float(amt):
-        flash("Insufficient balance", "danger"); c.close(); return redirect(url_for("index") + "#fd")
-    rate = 0.055
-    maturity = float(amt) + float(amt) * rate * (tenure_i / 12.0)
-    c.execute("INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,created_at) VALUES(?,?,?,?,?,?)",
-              (int(acc), float(amt), rate, tenure_i, float(maturity), now_str()))
-    newbal = cust["balance"] - float(amt)
-    c.execute("UPDATE customers SET balance=? WHERE account_no=?", (newbal, acc))
-    c.commit(); c.close()
-    record_tx(int(acc), "FD_Create", float(amt), note=f"FD {tenure_i} mo")
-    flash(f"FD Created. Maturity: ₹{maturity:.2f}", "success")
+    try:
+        with immediate(c):
+            apply_posting(c, acc, "FD_Create", amt, note=f"FD {tenure_i} mo")
+            created = now_str()
+            c.execute("""INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,compounding,created_at,maturity_date)
+                         VALUES(?,?,?,?,?,?,?,date(?, '+' || ? || ' months'))""",
+                      (acc, amt, rate, tenure_i, maturity, FD_COMPOUNDING, created, created, tenure_i))
+    except AccountNotFound:
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#fd")
+    except InsufficientFunds:
+        flash("Insufficient balance", "danger"); return redirect(url_for("index") + "#fd")
+    flash(f"FD Created. Maturity: ₹{maturity}", "success")
     return redirect(url_for("index") + "#fd")
 
 # Loan
 @app.route("/loan", methods=["POST"])
 def loan():
     acc = request.form.get("acc")
-    amt = safe_float(request.form.get("amt"))
+    amt = Money.parse(request.form.get("amt"))
     tenure = request.form.get("tenure")
     try:
         tenure_i = int(tenure)
@@ -580,14 +2556,17 @@ def loan():
         flash("Invalid tenure", "danger"); return redirect(url_for("index") + "#loan")
     if not acc or amt is None or amt <= 0 or tenure_i <= 0:
         flash("Valid account, amount and tenure required", "danger"); return redirect(url_for("index") + "#loan")
+    if tenure_i > MAX_TENURE_MONTHS:
+        flash(f"Tenure can be at most {MAX_TENURE_MONTHS} months", "danger"); return redirect(url_for("index") + "#loan")
     c = get_conn()
-    if not c.execute("SELECT 1 FROM customers WHERE account_no=?", (acc,)).fetchone():
-        flash("Account not found", "danger"); c.close(); return redirect(url_for("index") + "#loan")
-    rate = 0.1
-    c.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(?,?,?,?,?,?)",
-              (int(acc), float(amt), rate, tenure_i, 0, now_str()))
-    c.commit(); c.close()
-    flash("Loan application submitted. Awaiting admin approval.", "info")
+    if not customer(c, acc):
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#loan")
+    rate = LOAN_RATE
+    emi = Money(round(float(loan_emi(amt, rate, tenure_i))))
+    c.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,emi,total_interest,created_at) VALUES(?,?,?,?,?,?,?,?)",
+              (int(acc), amt, rate, tenure_i, 0, emi, emi * tenure_i - amt, now_str()))
+    c.commit()
+    flash(f"Loan application submitted (EMI ₹{emi} x {tenure_i} mo). Awaiting admin approval.", "info")
     return redirect(url_for("index") + "#loan")
 
 # Admin login (modal)
@@ -607,48 +2586,47 @@ def admin_login():
 @app.route("/admin/loans", methods=["GET", "POST"])
 def admin_loans():
     c = get_conn()
+    src = request.form if request.method == "POST" else request.args
+    filters = {k: src[k].strip() for k in ("acc", "min_amount", "max_amount") if src.get(k, "").strip()}
+    acc = int(filters["acc"]) if filters.get("acc", "").isdigit() else None
+    min_amount = Money.parse(filters.get("min_amount", ""))
+    max_amount = Money.parse(filters.get("max_amount", ""))
     if request.method == "POST":
-        lid = request.form.get("loan_id")
-        if lid:
-            loan = c.execute("SELECT account_no,loan_amount FROM loans WHERE loan_id=?", (lid,)).fetchone()
-            if not loan:
-                flash("Loan ID not found", "danger"); c.close(); return redirect(url_for("admin_loans"))
-            acc = loan["account_no"]; amt = loan["loan_amount"]
-            c.execute("UPDATE loans SET approved=1 WHERE loan_id=?", (lid,))
-            cur = c.execute("SELECT balance,mobile,name FROM customers WHERE account_no=?", (acc,)).fetchone()
-            if cur:
-                newbal = cur["balance"] + amt
-                c.execute("UPDATE customers SET balance=? WHERE account_no=?", (newbal, acc))
-                record_tx(acc, "LoanCredit", amt, note=f"LoanID:{lid}")
-                send_sms = f"Dear {cur['name']}, loan of ₹{amt:.2f} approved and credited."
-                print("[SMS]", cur["mobile"], send_sms)
-            c.commit()
-            flash(f"Loan {lid} approved", "success")
-            c.close()
-            return redirect(url_for("admin_loans"))
-    loans = c.execute("SELECT loan_id,account_no,loan_amount,tenure_months,approved,created_at FROM loans ORDER BY created_at DESC").fetchall()
-    c.close()
-    # simple admin page single-file style
-    html = """
-    <h3>Admin - Loans</h3>
-    <p><a href="/">Back to dashboard</a></p>
-    <form method="post">
-      <div>Pending loans list:</div>
-      <pre>{{ loans_text }}</pre>
-      <div class="mb-2"><input name="loan_id" class="form-control" placeholder="Loan ID to approve"></div>
-      <button class="btn btn-primary">Approve</button>
-    </form>
-    """
-    loans_text = "\n".join([f"LoanID:{r['loan_id']} | A/c:{r['account_no']} | ₹{r['loan_amount']:.2f} | Tenure:{r['tenure_months']} mo | Approved:{'Yes' if r['approved'] else 'No'}" for r in loans])
-    return render_template_string(html, loans_text=loans_text)
+        ids = request.form.getlist("loan_id") + re.split(r"[\s,]+", request.form.get("loan_ids", ""))
+        try:
+            ids = [int(i) for i in ids if i]
+        except ValueError:
+            flash("Loan IDs must be numbers", "danger"); return redirect(url_for("admin_loans", **filters))
+        if request.form.get("all"):
+            ids += [r["loan_id"] for r in loan_queue(c, 0, acc, min_amount, max_amount, limit=LOAN_APPROVE_MAX)]
+        if not ids:
+            flash("No loans selected", "danger"); return redirect(url_for("admin_loans", **filters))
+        start = time.perf_counter()
+        approved = approve_loans(c, ids)
+        elapsed = time.perf_counter() - start
+        if not approved:
+            flash("Loan ID not found or already approved", "danger"); return redirect(url_for("admin_loans", **filters))
+        flash(f"Approved {len(approved)} of {len(set(ids))} loans in {elapsed * 1000:.0f} ms", "success")
+        return redirect(url_for("admin_loans", **filters))
+    status = "approved" if request.args.get("status") == "approved" else "pending"
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = decode_cursor(request.args["cursor"])
+        except (ValueError, UnicodeDecodeError):
+            flash("Invalid page cursor", "danger")
+    loans = loan_queue(c, int(status == "approved"), acc, min_amount, max_amount, after)
+    next_cursor = encode_cursor(loans[-1]["created_at"], loans[-1]["loan_id"]) if len(loans) == LOAN_QUEUE_PAGE_SIZE else None
+    pending = c.execute("SELECT COUNT(*) FROM loans WHERE approved=0").fetchone()[0]
+    return render(admin_loans_template, loans=loans, status=status, filters=filters, next_cursor=next_cursor,
+                  pending=pending, approve_max=LOAN_APPROVE_MAX)
 
 # ATM check
 @app.route("/atm_check", methods=["POST"])
 def atm_check():
     acc = request.form.get("acc"); pin = request.form.get("pin")
     c = get_conn()
-    cust = c.execute("SELECT * FROM customers WHERE account_no=?",(acc,)).fetchone()
-    c.close()
+    cust = customer(c, acc)
     if not cust: flash("Account not found", "danger"); return redirect(url_for("index") + "#atm")
     if cust["pin"] != pin: flash("Incorrect PIN", "danger"); return redirect(url_for("index") + "#atm")
     # show simple ATM options page
@@ -668,14 +2646,18 @@ def export():
     if typ == "account":
         return export_account_pdf(int(acc))
     elif typ == "transactions":
-        return export_transactions_pdf(int(acc))
+        try:
+            date_from = parse_day(request.form["from"]) if request.form.get("from") else None
+            date_to = parse_day(request.form["to"]) if request.form.get("to") else None
+        except ValueError:
+            flash("Statement dates must be YYYY-MM-DD", "danger"); return redirect(url_for("index") + "#exports")
+        return export_transactions_pdf(int(acc), date_from, date_to)
     elif typ == "fd":
         return export_fd_pdf(int(acc))
     elif typ == "loans":
         return export_loan_pdf(int(acc))
     elif typ == "all":
-        # create multiple PDFs in-memory and return a zip - to keep simple we'll return account pdf
-        return export_account_pdf(int(acc))
+        return export_all_zip(int(acc))
     else:
         flash("Unknown export type", "danger"); return redirect(url_for("index") + "#exports")
 
@@ -689,38 +2671,88 @@ def generate_qr_pil(upi):
     img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
     return img
 
+# ---------- PDF assets ----------
+# The logo thumbnail, UPI QR code, stylesheet and table styles are identical for every
+# document, so they are built once per process. The logo is keyed on its mtime so a
+# replaced file is picked up; images are cached as PNG bytes because RLImage flowables
+# cannot be shared between documents.
+UPI_PAY_URI = f"upi://pay?pa={UPI_ID}&pn=OM+Bank"
+
+@lru_cache(maxsize=4)
+def _logo_png(path, mtime):
+    pil = Image.open(path)
+    pil.thumbnail((80,80))
+    bio = io.BytesIO()
+    pil.save(bio, "PNG")
+    return bio.getvalue()
+
+def logo_png():
+    if not (PIL_AVAILABLE and os.path.exists(LOGO_FILE)):
+        return None
+    try:
+        return _logo_png(LOGO_FILE, os.path.getmtime(LOGO_FILE))
+    except Exception:
+        return None
+
+@lru_cache(maxsize=8)
+def qr_png(data):
+    img = generate_qr_pil(data)
+    if img is None:
+        return None
+    bio = io.BytesIO(); img.save(bio, "PNG")
+    return bio.getvalue()
+
+@lru_cache(maxsize=1)
+def pdf_styles():
+    return getSampleStyleSheet()
+
+@lru_cache(maxsize=1)
+def pdf_table_styles():
+    pad = [("LEFTPADDING",(0,0),(-1,-1),10), ("RIGHTPADDING",(0,0),(-1,-1),10), ("BOTTOMPADDING",(0,0),(-1,-1),10)]
+    banner = [("BACKGROUND",(0,0),(-1,-1), colors.HexColor(DARK_PRIMARY)), ("TEXTCOLOR",(0,0),(-1,-1), colors.white)]
+    return {
+        "account_header": TableStyle(banner + [("VALIGN",(0,0),(-1,-1),"MIDDLE")] + pad + [("TOPPADDING",(0,0),(-1,-1),10)]),
+        "statement_header": TableStyle(banner + pad + [("TOPPADDING",(0,0),(-1,-1),10)]),
+        "report_header": TableStyle(banner + pad),
+        "account_info": TableStyle([
+            ("BACKGROUND",(0,0),(-1,0), colors.HexColor(PRIMARY)),
+            ("TEXTCOLOR",(0,0),(-1,0), colors.white),
+            ("ALIGN",(0,0),(-1,-1),"LEFT"),
+            ("FONTNAME",(0,0),(-1,0),"Helvetica-Bold"),
+            ("GRID",(0,0),(-1,-1),0.6,colors.HexColor("#888888")),
+            ("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke),
+        ]),
+        "statement_rows": TableStyle([
+            ("BACKGROUND",(0,0),(-1,0), colors.HexColor(PRIMARY)),
+            ("TEXTCOLOR",(0,0),(-1,0), colors.white),
+            ("ALIGN",(0,0),(-1,-1),"LEFT"),
+            ("GRID",(0,0),(-1,-1),0.5,colors.HexColor("#888888")),
+            ("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke),
+        ]),
+        "report_rows": TableStyle([("BACKGROUND",(0,0),(-1,0),colors.HexColor(PRIMARY)),("TEXTCOLOR",(0,0),(-1,0),colors.white),("GRID",(0,0),(-1,-1),0.5,colors.HexColor("#888888")),("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke)]),
+        "valign_top": TableStyle([("VALIGN",(0,0),(-1,-1),"TOP")]),
+    }
+
+def clear_pdf_assets():
+    for f in (_logo_png, qr_png, pdf_styles, pdf_table_styles):
+        f.cache_clear()
+
+@timed_pdf("account")
 def pdf_bytes_account(customer_row):
     """Return bytes of account details PDF"""
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
     elements = []
-    styles = getSampleStyleSheet()
+    styles = pdf_styles(); tstyles = pdf_table_styles()
     # header table with logo (if exists) and title
-    logo_rl = None
-    if os.path.exists(LOGO_FILE) and PIL_AVAILABLE:
-        try:
-            pil = Image.open(LOGO_FILE)
-            pil.thumbnail((80,80))
-            bio = io.BytesIO()
-            pil.save(bio, "PNG")
-            bio.seek(0)
-            logo_rl = RLImage(bio, width=64, height=64)
-        except:
-            logo_rl = None
+    logo = logo_png()
+    logo_rl = RLImage(io.BytesIO(logo), width=64, height=64) if logo else None
     bank_para = Paragraph("<b>OM BANK MANAGEMENT SYSTEM - SBI</b><br/><font size=9>Official Statement</font>", styles["Heading2"])
     if logo_rl:
         header_table = Table([[logo_rl, bank_para]], colWidths=[70, 420])
     else:
         header_table = Table([[bank_para]], colWidths=[490])
-    header_table.setStyle(TableStyle([
-        ("BACKGROUND",(0,0),(-1,-1), colors.HexColor(DARK_PRIMARY)),
-        ("TEXTCOLOR",(0,0),(-1,-1), colors.white),
-        ("VALIGN",(0,0),(-1,-1),"MIDDLE"),
-        ("LEFTPADDING",(0,0),(-1,-1),10),
-        ("RIGHTPADDING",(0,0),(-1,-1),10),
-        ("BOTTOMPADDING",(0,0),(-1,-1),10),
-        ("TOPPADDING",(0,0),(-1,-1),10),
-    ]))
+    header_table.setStyle(tstyles["account_header"])
     elements.append(header_table)
     elements.append(Spacer(1,12))
     # customer details table
@@ -729,27 +2761,19 @@ def pdf_bytes_account(customer_row):
         ["Account No", str(cust["account_no"])],
         ["Name", cust["name"]],
         ["Mobile", cust["mobile"]],
-        ["Balance", f"₹{cust['balance']:.2f}"],
+        ["Balance", f"₹{Money(cust['balance'])}"],
         ["Created At", cust["created_at"] or ""]
     ]
     t = Table([["Field","Value"]] + info, colWidths=[120, 340])
-    t.setStyle(TableStyle([
-        ("BACKGROUND",(0,0),(-1,0), colors.HexColor(PRIMARY)),
-        ("TEXTCOLOR",(0,0),(-1,0), colors.white),
-        ("ALIGN",(0,0),(-1,-1),"LEFT"),
-        ("FONTNAME",(0,0),(-1,0),"Helvetica-Bold"),
-        ("GRID",(0,0),(-1,-1),0.6,colors.HexColor("#888888")),
-        ("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke),
-    ]))
+    t.setStyle(tstyles["account_info"])
     elements.append(t)
     elements.append(Spacer(1,16))
     # QR + signature
-    qr_img = generate_qr_pil(f"upi://pay?pa={UPI_ID}&pn=OM+Bank")
-    if qr_img:
-        bio = io.BytesIO(); qr_img.save(bio, "PNG"); bio.seek(0)
-        rl_qr = RLImage(bio, width=90, height=90)
+    qr = qr_png(UPI_PAY_URI)
+    if qr:
+        rl_qr = RLImage(io.BytesIO(qr), width=90, height=90)
         sig_table = Table([[rl_qr, Paragraph("<b>Authorized Signature</b><br/><br/>__________________________<br/>Manager, SBI Branch", styles["Normal"])]], colWidths=[100, 360])
-        sig_table.setStyle(TableStyle([("VALIGN",(0,0),(-1,-1),"TOP")]))
+        sig_table.setStyle(tstyles["valign_top"])
         elements.append(sig_table)
     else:
         elements.append(Paragraph("<b>Authorized Signature</b>", styles["Normal"]))
@@ -757,136 +2781,394 @@ def pdf_bytes_account(customer_row):
         elements.append(Paragraph("__________________________", styles["Normal"]))
         elements.append(Paragraph("Manager, SBI Branch", styles["Normal"]))
     # build
-    doc.build(elements)
+    render_pdf(doc, elements, "account")
     buf.seek(0)
     return buf.getvalue()
 
 def export_account_pdf(acc):
     c = get_conn()
-    cust = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
-    c.close()
+    cust = customer(c, acc)
     if not cust:
         flash("Account not found for PDF", "danger"); return redirect(url_for("index") + "#exports")
     pdfdata = pdf_bytes_account(cust)
     return send_bytes(pdfdata, f"Account_{acc}.pdf")
 
-def pdf_bytes_transactions(acc, only_recent=None):
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
-    elements = []
-    styles = getSampleStyleSheet()
-    # header
-    bank_para = Paragraph("<b>OM BANK MANAGEMENT SYSTEM - SBI</b><br/><font size=9>Transaction Statement</font>", styles["Heading2"])
-    header_table = Table([[bank_para]], colWidths=[490])
-    header_table.setStyle(TableStyle([
-        ("BACKGROUND",(0,0),(-1,-1), colors.HexColor(DARK_PRIMARY)),
-        ("TEXTCOLOR",(0,0),(-1,-1), colors.white),
-        ("LEFTPADDING",(0,0),(-1,-1),10),
-        ("RIGHTPADDING",(0,0),(-1,-1),10),
-        ("BOTTOMPADDING",(0,0),(-1,-1),10),
-        ("TOPPADDING",(0,0),(-1,-1),10),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1,12))
-    c = get_conn()
-    cust = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
-    rows = c.execute("SELECT date,type,amount,note FROM transactions WHERE account_no=? ORDER BY date DESC", (acc,)).fetchall()
-    c.close()
-    elements.append(Paragraph(f"<b>Account:</b> {cust['account_no']} &nbsp;&nbsp; <b>Name:</b> {cust['name']}", styles["Normal"]))
-    elements.append(Spacer(1,8))
-    # table
-    table_data = [["Date","Type","Amount","Note"]]
-    if only_recent:
-        rows = rows[:only_recent]
-    for r in rows:
-        table_data.append([r["date"], r["type"], f"₹{r['amount']:.2f}", r["note"] or ""])
-    t = Table(table_data, colWidths=[140,110,100,140])
-    t.setStyle(TableStyle([
-        ("BACKGROUND",(0,0),(-1,0), colors.HexColor(PRIMARY)),
-        ("TEXTCOLOR",(0,0),(-1,0), colors.white),
-        ("ALIGN",(0,0),(-1,-1),"LEFT"),
-        ("GRID",(0,0),(-1,-1),0.5,colors.HexColor("#888888")),
-        ("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke),
-    ]))
-    elements.append(t)
-    elements.append(Spacer(1,14))
-    # QR + signature
-    qr_img = generate_qr_pil(f"upi://pay?pa={UPI_ID}&pn=OM+Bank")
-    if qr_img:
-        bio = io.BytesIO(); qr_img.save(bio,"PNG"); bio.seek(0)
-        rl_qr = RLImage(bio, width=90, height=90)
-        sig_table = Table([[rl_qr, Paragraph("<b>Authorized Signature</b><br/><br/>__________________________<br/>Manager, SBI Branch", styles["Normal"])]], colWidths=[100,360])
-        elements.append(sig_table)
+# ---------- Statements ----------
+# Statements are laid out one page-sized Table at a time: rows are fetched from the
+# cursor in page-sized chunks, each chunk becomes its own Table with the column header,
+# and the flowables are generated lazily while ReportLab builds the document. Memory
+# stays flat and layout is linear in pages instead of splitting one giant table.
+STATEMENT_COLUMNS = ["Date", "Type", "Amount", "Balance", "Note"]
+STATEMENT_COL_WIDTHS = [110, 75, 85, 90, 130]
+
+if REPORTLAB_AVAILABLE:
+    class StreamingDocTemplate(SimpleDocTemplate):
+        """SimpleDocTemplate whose build() takes any iterable of flowables. The stock
+        build() lays out a short queue, and handle_flowable(), which it calls once per
+        flowable, tops the queue up from the iterable first, so only a few pages' worth
+        of flowables exist at once."""
+        lookahead = 3  # flowables queued ahead of layout, enough for keepWithNext pairs
+
+        def build(self, flowables, *args, **kwargs):
+            self._stream = iter(flowables)
+            self._queue = list(islice(self._stream, self.lookahead))
+            try:
+                super().build(self._queue, *args, **kwargs)
+            finally:
+                self._stream = self._queue = None
+
+        def handle_flowable(self, flowables):
+            # other lists (the hanging page-begin flowables) pass straight through
+            if flowables is self._queue:
+                flowables.extend(islice(self._stream, max(0, self.lookahead - len(flowables))))
+            super().handle_flowable(flowables)
+
+def statement_balances(c, acc, date_from=None, date_to=None, only_recent=None):
+    """(opening, closing) balance around the statement's postings, from the nearest balance snapshots."""
+    lo, hi = day_bounds(date_from, date_to)
+    if hi:
+        closing = balance_before(c, acc, hi)
     else:
-        elements.append(Paragraph("<b>Authorized Signature</b>", styles["Normal"]))
-    doc.build(elements)
+        closing = Money(c.execute("SELECT balance FROM customers WHERE account_no=?", (acc,)).fetchone()[0])
+    if only_recent:
+        recent = TieredCursor(c, "SELECT type,amount FROM {tx} WHERE account_no=? AND date >= ? AND date < ? ORDER BY date DESC, trans_id DESC",
+                              (acc, lo or "", hi or "9999"), lo, hi, newest_first=True, limit=only_recent)
+        during = sum(TX_SIGN.get(r["type"], 0) * r["amount"] for r in recent)
+        return Money(closing - during), closing
+    return balance_before(c, acc, lo or ""), closing
+
+def statement_rows(c, acc, date_from=None, date_to=None, only_recent=None):
+    """The statement's postings, oldest first, from the hot and archived tiers."""
+    lo, hi = day_bounds(date_from, date_to)
+    sql = "SELECT trans_id,date,type,amount,note FROM {tx} WHERE account_no=? AND date >= ? AND date < ?"
+    params = [acc, lo or "", hi or "9999"]
+    if only_recent:
+        # the N most recent postings in range, still printed oldest first
+        return TieredCursor(c, sql + " ORDER BY date DESC, trans_id DESC", params, lo, hi, newest_first=True, limit=only_recent).fetchall()[::-1]
+    return TieredCursor(c, sql + " ORDER BY date, trans_id", params, lo, hi)
+
+def _rows_per_page(avail_height, style):
+    row_h = Table([STATEMENT_COLUMNS], colWidths=STATEMENT_COL_WIDTHS, style=style).wrap(sum(STATEMENT_COL_WIDTHS), avail_height)[1]
+    return max(1, int(avail_height // row_h) - 1)  # minus the header row
+
+@timed_pdf("transactions")
+def pdf_bytes_transactions(acc, only_recent=None, date_from=None, date_to=None, conn=None):
+    """Return bytes of the transaction statement PDF (optionally for an inclusive day range)."""
+    buf = io.BytesIO()
+    doc = StreamingDocTemplate(buf, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
+    styles = pdf_styles(); tstyles = pdf_table_styles()
+    c = conn or get_conn()
+    try:
+        # balances and postings from one snapshot: a posting committed in between would
+        # make the closing balance disagree with the running balance column
+        with read_transaction(c):
+            cust = customer(c, acc)
+            opening, closing = statement_balances(c, acc, date_from, date_to, only_recent)
+            if date_from or date_to:
+                period = f"{date_from.strftime('%Y-%m-%d') if date_from else 'opening'} to {date_to.strftime('%Y-%m-%d') if date_to else now_str()[:10]}"
+            else:
+                period = "all transactions"
+            # header
+            bank_para = Paragraph("<b>OM BANK MANAGEMENT SYSTEM - SBI</b><br/><font size=9>Transaction Statement</font>", styles["Heading2"])
+            header_table = Table([[bank_para]], colWidths=[490])
+            header_table.setStyle(tstyles["statement_header"])
+            preamble = [
+                header_table, Spacer(1,12),
+                Paragraph(f"<b>Account:</b> {cust['account_no']} &nbsp;&nbsp; <b>Name:</b> {cust['name']} &nbsp;&nbsp; <b>Period:</b> {period}", styles["Normal"]),
+                Spacer(1,6),
+                Paragraph(f"<b>Opening balance:</b> ₹{opening}", styles["Normal"]),
+                Spacer(1,8),
+            ]
+            frame_h = doc.height - 12  # SimpleDocTemplate's frame has 6pt top/bottom padding
+            used = sum(f.wrap(doc.width, frame_h)[1] + f.getSpaceBefore() + f.getSpaceAfter() for f in preamble)
+            per_page = _rows_per_page(frame_h, tstyles["statement_rows"])
+            first_page = _rows_per_page(frame_h - used, tstyles["statement_rows"]) if frame_h - used > 60 else 0
+
+            def pages():
+                yield from preamble
+                postings = iter(statement_rows(c, acc, date_from, date_to, only_recent))
+                bal = opening
+                size = first_page or per_page
+                if not first_page:
+                    yield PageBreak()
+                while True:
+                    rows = list(islice(postings, size))
+                    if not rows:
+                        break
+                    data = [STATEMENT_COLUMNS]
+                    for r in rows:
+                        bal += TX_SIGN.get(r["type"], 0) * r["amount"]
+                        data.append([r["date"], r["type"], f"₹{Money(r['amount'])}", f"₹{Money(bal)}", r["note"] or ""])
+                    yield Table(data, colWidths=STATEMENT_COL_WIDTHS, style=tstyles["statement_rows"], repeatRows=1)
+                    if len(rows) == size:
+                        yield PageBreak()
+                    size = per_page
+                yield Spacer(1,8)
+                yield Paragraph(f"<b>Closing balance:</b> ₹{closing}", styles["Normal"])
+                yield Spacer(1,14)
+                # QR + signature
+                qr = qr_png(UPI_PAY_URI)
+                if qr:
+                    rl_qr = RLImage(io.BytesIO(qr), width=90, height=90)
+                    yield Table([[rl_qr, Paragraph("<b>Authorized Signature</b><br/><br/>__________________________<br/>Manager, SBI Branch", styles["Normal"])]], colWidths=[100,360])
+                else:
+                    yield Paragraph("<b>Authorized Signature</b>", styles["Normal"])
+
+            render_pdf(doc, pages(), "transactions")
+    finally:
+        if conn is None:
+            put_conn(c)
     buf.seek(0)
     return buf.getvalue()
 
-def export_transactions_pdf(acc):
+def export_transactions_pdf(acc, date_from=None, date_to=None):
     c = get_conn()
-    if not c.execute("SELECT 1 FROM customers WHERE account_no=?", (acc,)).fetchone():
-        flash("Account not found", "danger"); c.close(); return redirect(url_for("index") + "#exports")
-    data = pdf_bytes_transactions(acc)
+    if not customer(c, acc):
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#exports")
+    data = pdf_bytes_transactions(acc, date_from=date_from, date_to=date_to)
     return send_bytes(data, f"Transactions_{acc}.pdf")
 
+@timed_pdf("fd")
 def pdf_bytes_fd(acc):
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
-    elements = []; styles = getSampleStyleSheet()
+    elements = []; styles = pdf_styles(); tstyles = pdf_table_styles()
     header_table = Table([[Paragraph("<b>OM BANK MANAGEMENT SYSTEM - SBI</b><br/><font size=9>FD Report</font>", styles["Heading2"])]], colWidths=[490])
-    header_table.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,-1), colors.HexColor(DARK_PRIMARY)),("TEXTCOLOR",(0,0),(-1,-1),colors.white),("LEFTPADDING",(0,0),(-1,-1),10),("RIGHTPADDING",(0,0),(-1,-1),10),("BOTTOMPADDING",(0,0),(-1,-1),10)]))
+    header_table.setStyle(tstyles["report_header"])
     elements.append(header_table); elements.append(Spacer(1,12))
     c = get_conn()
-    cust = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
+    cust = customer(c, acc)
     rows = c.execute("SELECT fd_id,amount,interest_rate,tenure_months,maturity_amount,created_at FROM fds WHERE account_no=? ORDER BY created_at DESC", (acc,)).fetchall()
-    c.close()
+    put_conn(c)
     elements.append(Paragraph(f"<b>Account:</b> {cust['account_no']} &nbsp;&nbsp; <b>Name:</b> {cust['name']}", styles["Normal"]))
     elements.append(Spacer(1,8))
     table_data = [["FD ID","Amount","Interest","Tenure","Maturity","Created"]]
     for r in rows:
-        table_data.append([r["fd_id"], f"₹{r['amount']:.2f}", f"{r['interest_rate']*100:.2f}%", str(r["tenure_months"]), f"₹{r['maturity_amount']:.2f}", r["created_at"]])
+        table_data.append([r["fd_id"], f"₹{Money(r['amount'])}", f"{r['interest_rate']*100:.2f}%", str(r["tenure_months"]), f"₹{Money(r['maturity_amount'])}", r["created_at"]])
     t = Table(table_data, colWidths=[60,80,70,70,110,100])
-    t.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,0),colors.HexColor(PRIMARY)),("TEXTCOLOR",(0,0),(-1,0),colors.white),("GRID",(0,0),(-1,-1),0.5,colors.HexColor("#888888")),("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke)]))
+    t.setStyle(tstyles["report_rows"])
     elements.append(t)
-    doc.build(elements); buf.seek(0)
+    render_pdf(doc, elements, "fd"); buf.seek(0)
     return buf.getvalue()
 
 def export_fd_pdf(acc):
     c = get_conn()
-    if not c.execute("SELECT 1 FROM customers WHERE account_no=?", (acc,)).fetchone():
-        flash("Account not found", "danger"); c.close(); return redirect(url_for("index") + "#exports")
+    if not customer(c, acc):
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#exports")
     data = pdf_bytes_fd(acc)
     return send_bytes(data, f"FDs_{acc}.pdf")
 
+@timed_pdf("loans")
 def pdf_bytes_loans(acc):
     buf = io.BytesIO(); doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40)
-    elements = []; styles = getSampleStyleSheet()
+    elements = []; styles = pdf_styles(); tstyles = pdf_table_styles()
     header_table = Table([[Paragraph("<b>OM BANK MANAGEMENT SYSTEM - SBI</b><br/><font size=9>Loan Report</font>", styles["Heading2"])]], colWidths=[490])
-    header_table.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,-1), colors.HexColor(DARK_PRIMARY)),("TEXTCOLOR",(0,0),(-1,-1),colors.white),("LEFTPADDING",(0,0),(-1,-1),10),("RIGHTPADDING",(0,0),(-1,-1),10),("BOTTOMPADDING",(0,0),(-1,-1),10)]))
+    header_table.setStyle(tstyles["report_header"])
     elements.append(header_table); elements.append(Spacer(1,12))
-    c = get_conn(); cust = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
+    c = get_conn(); cust = customer(c, acc)
     rows = c.execute("SELECT loan_id,loan_amount,interest_rate,tenure_months,approved,created_at FROM loans WHERE account_no=? ORDER BY created_at DESC", (acc,)).fetchall()
-    c.close()
+    put_conn(c)
     elements.append(Paragraph(f"<b>Account:</b> {cust['account_no']} &nbsp;&nbsp; <b>Name:</b> {cust['name']}", styles["Normal"])); elements.append(Spacer(1,8))
     table_data = [["Loan ID","Amount","Interest","Tenure","Approved","Created"]]
     for r in rows:
-        table_data.append([r["loan_id"], f"₹{r['loan_amount']:.2f}", f"{r['interest_rate']*100:.2f}%", r["tenure_months"], "Yes" if r["approved"] else "No", r["created_at"]])
+        table_data.append([r["loan_id"], f"₹{Money(r['loan_amount'])}", f"{r['interest_rate']*100:.2f}%", r["tenure_months"], "Yes" if r["approved"] else "No", r["created_at"]])
     t = Table(table_data, colWidths=[60,80,70,70,60,150])
-    t.setStyle(TableStyle([("BACKGROUND",(0,0),(-1,0),colors.HexColor(PRIMARY)),("TEXTCOLOR",(0,0),(-1,0),colors.white),("GRID",(0,0),(-1,-1),0.5,colors.HexColor("#888888")),("BACKGROUND",(0,1),(-1,-1), colors.whitesmoke)]))
+    t.setStyle(tstyles["report_rows"])
     elements.append(t)
-    doc.build(elements); buf.seek(0)
+    render_pdf(doc, elements, "loans"); buf.seek(0)
     return buf.getvalue()
 
 def export_loan_pdf(acc):
     c = get_conn()
-    if not c.execute("SELECT 1 FROM customers WHERE account_no=?", (acc,)).fetchone():
-        flash("Account not found", "danger"); c.close(); return redirect(url_for("index") + "#exports")
+    if not customer(c, acc):
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#exports")
     data = pdf_bytes_loans(acc)
     return send_bytes(data, f"Loans_{acc}.pdf")
 
 def send_bytes(data_bytes, filename):
-    return send_file(io.BytesIO(data_bytes), mimetype="application/pdf", as_attachment=True, attachment_filename=filename)
+    return send_file(io.BytesIO(data_bytes), mimetype="application/pdf", as_attachment=True, download_name=filename)
+
+# ---------- Export jobs ----------
+# ReportLab layout is CPU-bound, so /export/jobs hands documents to a process pool
+# and the request thread returns a job id immediately. Finished PDFs are kept in
+# memory for EXPORT_JOB_TTL seconds for download.
+EXPORT_FILENAMES = {"account": "Account_{}.pdf", "transactions": "Transactions_{}.pdf", "fd": "FDs_{}.pdf", "loans": "Loans_{}.pdf"}
+
+def build_export_pdf(kind, acc, date_from=None, date_to=None):
+    """Build one export document; runs in a worker process with its own connection."""
+    if kind == "account":
+        c = get_conn()
+        cust = customer(c, acc)
+        put_conn(c)
+        return pdf_bytes_account(cust)
+    if kind == "transactions":
+        return pdf_bytes_transactions(acc, date_from=date_from, date_to=date_to)
+    builder = {"fd": pdf_bytes_fd, "loans": pdf_bytes_loans}[kind]
+    return builder(acc)
+
+class ExportJobs:
+    def __init__(self, workers, ttl):
+        self.workers = workers
+        self.ttl = ttl
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def executor(self):
+        # created on first use; spawn so workers never inherit pooled connections or locks
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, kind, acc, date_from=None, date_to=None):
+        job_id = uuid.uuid4().hex
+        future = self.executor().submit(build_export_pdf, kind, acc, date_from, date_to)
+        job = {"id": job_id, "kind": kind, "account_no": acc, "submitted_at": time.time(),
+               "finished_at": None, "future": future}
+        future.add_done_callback(lambda f: job.update(finished_at=time.time()))
+        with self._lock:
+            self._purge()
+            self._jobs[job_id] = job
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [j["id"] for j in self._jobs.values() if j["finished_at"] and j["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def status(job):
+        f = job["future"]
+        if not f.done():
+            state = "running" if f.running() else "queued"
+        else:
+            state = "failed" if f.exception() else "done"
+        info = {k: job[k] for k in ("id", "kind", "account_no", "submitted_at", "finished_at")}
+        info["status"] = state
+        if state == "failed":
+            info["error"] = repr(f.exception())
+        return info
+
+export_jobs = ExportJobs(EXPORT_WORKERS, EXPORT_JOB_TTL)
+
+class _ZipSink:
+    # write-only stream for zipfile; the response generator drains it after each entry
+    def __init__(self):
+        self._chunks = []
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+    def flush(self):
+        pass
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_export_zip(acc):
+    """Build every export document in parallel on the export pool and stream them
+    into a ZIP in completion order; only finished-but-unsent PDFs are held in memory."""
+    ex = export_jobs.executor()
+    pending = {ex.submit(build_export_pdf, kind, acc): kind for kind in EXPORT_FILENAMES}
+    sink = _ZipSink()
+    # PDFs are already compressed, so entries are stored as-is
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for f in as_completed(list(pending)):
+            kind = pending.pop(f)
+            if f.exception():
+                # the traceback stays in the server log; the customer's zip only says what is missing
+                app.logger.error("%s export for account %s failed", kind, acc, exc_info=f.exception())
+                zf.writestr(f"{kind}_error.txt", f"The {kind} document could not be generated. Please try the export again later.\n")
+            else:
+                zf.writestr(EXPORT_FILENAMES[kind].format(acc), f.result())
+            yield sink.drain()
+    yield sink.drain()
+
+def export_all_zip(acc):
+    c = get_conn()
+    if not customer(c, acc):
+        flash("Account not found", "danger"); return redirect(url_for("index") + "#exports")
+    return Response(stream_export_zip(acc), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename=Export_{acc}.zip"})
+
+# ---------- Batch statements ----------
+# The customers table is cut into shards of STATEMENT_SHARD_SIZE accounts which a
+# process pool works through; each worker reads over its own read-only connection.
+# PDFs are written to a temp name and renamed into place, so after a crash a rerun
+# skips every account whose documents all exist and writes only the missing ones.
+def statement_period(date_from=None, date_to=None):
+    if not (date_from or date_to):
+        return "all"
+    return f"{date_from.strftime('%Y-%m-%d') if date_from else 'start'}_{date_to.strftime('%Y-%m-%d') if date_to else 'now'}"
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def run_statement_shard(db_path, accounts, out_dir, date_from=None, date_to=None, with_account=False, force=False):
+    """Worker: write statements for `accounts`; returns counts and timing for the report."""
+    start = time.perf_counter()
+    c = connect_db(db_path, readonly=True)
+    written = skipped = 0
+    failed = []
+    try:
+        for acc in accounts:
+            # an account is done only once all of its documents exist: a crash between
+            # the two writes leaves a statement without its account PDF
+            outputs = {f"Statement_{acc}.pdf": lambda: pdf_bytes_transactions(acc, date_from=date_from, date_to=date_to, conn=c)}
+            if with_account:
+                outputs[f"Account_{acc}.pdf"] = lambda: pdf_bytes_account(customer(c, acc))
+            missing = [name for name in outputs if force or not os.path.exists(os.path.join(out_dir, name))]
+            if not missing:
+                skipped += 1
+                continue
+            try:
+                for name in missing:
+                    _write_atomic(os.path.join(out_dir, name), outputs[name]())
+                written += 1
+            except Exception as e:
+                failed.append((acc, repr(e)))
+    finally:
+        c.close()
+    return {"pid": os.getpid(), "accounts": len(accounts), "written": written, "skipped": skipped,
+            "failed": failed, "seconds": time.perf_counter() - start}
+
+def batch_statements(out_dir, workers, date_from=None, date_to=None, with_account=False, force=False, progress=None):
+    """Statements for every customer across a process pool; returns the run report."""
+    start = time.perf_counter()
+    out_dir = os.path.join(out_dir, statement_period(date_from, date_to))
+    os.makedirs(out_dir, exist_ok=True)
+    c = connect_db(readonly=True)
+    accounts = [r[0] for r in c.execute("SELECT account_no FROM customers ORDER BY account_no")]
+    c.close()
+    # several shards per worker so a slow shard does not leave the others idle at the end
+    size = max(1, min(STATEMENT_SHARD_SIZE, -(-len(accounts) // (workers * 4))))
+    shards = [accounts[i:i + size] for i in range(0, len(accounts), size)]
+    results = []
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as ex:
+        futures = [ex.submit(run_statement_shard, DB_FILE, shard, out_dir, date_from, date_to, with_account, force) for shard in shards]
+        for f in as_completed(futures):
+            results.append(f.result())
+            if progress:
+                progress(results[-1])
+    elapsed = time.perf_counter() - start
+    per_worker = {}
+    for r in results:
+        w = per_worker.setdefault(r["pid"], {"shards": 0, "written": 0, "seconds": 0.0})
+        w["shards"] += 1; w["written"] += r["written"]; w["seconds"] += r["seconds"]
+    written = sum(r["written"] for r in results)
+    return {"out_dir": out_dir, "accounts": len(accounts), "written": written,
+            "skipped": sum(r["skipped"] for r in results), "failed": [f for r in results for f in r["failed"]],
+            "elapsed_sec": round(elapsed, 2), "statements_per_sec": round(written / elapsed, 2) if elapsed else None,
+            "workers": per_worker}
 
 # route to serve logo image inline
 @app.route("/logo")
@@ -896,8 +3178,348 @@ def logo():
     else:
         return ("",204)
 
-# ---------- Run ----------
-if __name__ == "__main__":
+# cache hit/miss counters
+@app.route("/admin/cache")
+def cache_stats():
+    return jsonify(fragments=fragment_cache.stats(), customers=customer_cache.stats())
+
+# async PDF export: submit -> poll -> download
+@app.route("/export/jobs", methods=["POST"])
+def export_job_submit():
+    data = request.get_json(silent=True) or request.form
+    kind = data.get("type")
+    if kind not in EXPORT_FILENAMES:
+        return jsonify(error=f"type must be one of {sorted(EXPORT_FILENAMES)}"), 400
+    try:
+        acc = int(data.get("acc"))
+    except (TypeError, ValueError):
+        return jsonify(error="acc required"), 400
+    try:
+        date_from = parse_day(data["from"]) if data.get("from") else None
+        date_to = parse_day(data["to"]) if data.get("to") else None
+    except ValueError:
+        return jsonify(error="from/to must be YYYY-MM-DD"), 400
+    if not REPORTLAB_AVAILABLE:
+        return jsonify(error="reportlab library not installed"), 503
+    if not customer(get_conn(), acc):
+        return jsonify(error="account not found"), 404
+    job_id = export_jobs.submit(kind, acc, date_from, date_to)
+    return jsonify(id=job_id, status_url=url_for("export_job_status", job_id=job_id),
+                   download_url=url_for("export_job_download", job_id=job_id)), 202
+
+@app.route("/export/jobs/<job_id>", methods=["GET"])
+def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify(error="unknown or expired job"), 404
+    return jsonify(ExportJobs.status(job))
+
+@app.route("/export/jobs/<job_id>/download", methods=["GET"])
+def export_job_download(job_id):
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify(error="unknown or expired job"), 404
+    status = ExportJobs.status(job)
+    if status["status"] != "done":
+        return jsonify(status), 409
+    return send_bytes(job["future"].result(), EXPORT_FILENAMES[job["kind"]].format(job["account_no"]))
+
+# repayment schedule of one loan
+@app.route("/api/loans/<int:loan_id>/schedule")
+def loan_schedule(loan_id):
+    if not NUMPY_AVAILABLE:
+        return jsonify(error="numpy library not installed"), 503
+    loan = get_conn().execute("SELECT loan_amount,interest_rate,tenure_months FROM loans WHERE loan_id=?", (loan_id,)).fetchone()
+    if not loan:
+        return jsonify(error="loan not found"), 404
+    sched = amortization_schedule(loan["loan_amount"], loan["interest_rate"], loan["tenure_months"])
+    n = loan["tenure_months"]
+    rupees = lambda paise: Money(round(float(paise))).rupees
+    return jsonify(loan_id=loan_id, emi=rupees(sched["emi"][0]), instalments=[
+        {"month": i + 1, "interest": rupees(sched["interest"][0, i]), "principal": rupees(sched["principal"][0, i]),
+         "balance": rupees(sched["balance"][0, i])} for i in range(n)])
+
+# transaction history, newest first: ?limit=N&cursor=<next_cursor of previous page>
+@app.route("/api/transactions")
+@app.route("/api/accounts/<int:acc>/transactions")
+def api_transactions(acc=None):
+    limit = request.args.get("limit", HISTORY_PAGE_SIZE, type=int)
+    if limit < 1 or limit > HISTORY_MAX_PAGE_SIZE:
+        return jsonify(error=f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}"), 400
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = decode_cursor(request.args["cursor"])
+        except (ValueError, UnicodeDecodeError):
+            return jsonify(error="invalid cursor"), 400
+    c = get_conn()
+    if acc is not None and not customer(c, acc):
+        return jsonify(error="account not found"), 404
+    return stream_response(stream_history(c, acc, after, limit), "application/json")
+
+# historical balance: /api/accounts/<acc>/balance?date=YYYY-MM-DD (closing balance of that day)
+@app.route("/api/accounts/<int:acc>/balance")
+def api_balance(acc):
+    c = get_conn()
+    day = request.args.get("date")
+    try:
+        if not day:
+            row = customer(c, acc)
+            if row is None:
+                raise AccountNotFound(acc)
+            return jsonify(account_no=acc, date=None, balance=Money(row["balance"]).rupees)
+        balance = balance_at(c, acc, parse_day(day).strftime("%Y-%m-%d"))
+    except ValueError:
+        return jsonify(error="date must be YYYY-MM-DD"), 400
+    except AccountNotFound:
+        return jsonify(error="account not found"), 404
+    return jsonify(account_no=acc, date=day, balance=balance.rupees)
+
+# notification queue depth and dispatcher throughput
+@app.route("/api/notifications/metrics")
+def api_notification_metrics():
+    return jsonify(queue=outbox_metrics(get_conn()), dispatcher=dispatcher.stats(), sender=NOTIFY_SENDER)
+
+def _outbox_gauges():
+    m = outbox_metrics(get_conn())
+    return {(k,): m[k] for k in ("pending", "due", "failed")}
+
+GAUGES.update({
+    "gms_outbox_messages": ("Outbox messages by state (due = pending and ready to send).", _outbox_gauges, ("state",)),
+    "gms_outbox_oldest_pending_seconds": ("Age of the oldest unsent message.", lambda: {(): outbox_metrics(get_conn())["oldest_pending_sec"]}, ()),
+    "gms_outbox_dispatched": ("Messages handled by this process's dispatcher, by outcome.",
+                              lambda: {(k,): v for k, v in dispatcher.stats().items() if k in ("sent", "retried", "failed")}, ("outcome",)),
+    "gms_fragment_cache": ("Dashboard fragment cache counters.",
+                           lambda: {(k,): v for k, v in fragment_cache.stats().items() if k in ("entries", "hits", "misses", "evictions")}, ("stat",)),
+    "gms_customer_cache": ("Customer row cache counters.",
+                           lambda: {(k,): v for k, v in customer_cache.stats().items() if k in ("entries", "hits", "misses", "evictions")}, ("stat",)),
+    "gms_customer_cache_hit_ratio": ("Customer row cache hits / lookups since start.", lambda: {(): customer_cache.stats()["hit_ratio"] or 0}, ()),
+    "gms_db_pool_connections_open": ("Pooled connections opened.", lambda: {(): pool._opened}, ()),
+})
+
+# Prometheus text exposition of the in-process metrics
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+# streamed table export: /export/<table>?format=csv|ndjson&acc=&from=YYYY-MM-DD&to=YYYY-MM-DD
+@app.route("/export/<table>", methods=["GET"])
+def export_table(table):
+    fmt = request.args.get("format", "csv")
+    if table not in EXPORT_TABLES or fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"table must be one of {sorted(EXPORT_TABLES)}, format one of {sorted(EXPORT_FORMATS)}"), 400
+    try:
+        acc = int(request.args["acc"]) if request.args.get("acc") else None
+        date_from = parse_day(request.args["from"]) if request.args.get("from") else None
+        date_to = parse_day(request.args["to"]) if request.args.get("to") else None
+    except ValueError:
+        return jsonify(error="acc must be a number, from/to must be YYYY-MM-DD"), 400
+    cur = export_rows(get_conn(), table, acc, date_from, date_to)
+    body = stream_csv(cur) if fmt == "csv" else stream_ndjson(cur)
+    return stream_response(body, EXPORT_FORMATS[fmt], headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"})
+
+def admin_token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+        if not (ADMIN_TOKEN and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())):
+            return jsonify(error=f"admin token required in {ADMIN_TOKEN_HEADER}"), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# bulk posting upload: JSON body ({"postings": [...]} or a list) or a CSV file field
+@app.route("/bulk_post", methods=["POST"])
+@admin_token_required
+def bulk_post_route():
+    chunk_size = request.args.get("chunk_size", BULK_CHUNK_SIZE, type=int)
+    if request.is_json:
+        data = request.get_json()
+        rows = data.get("postings", []) if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return jsonify(error="postings must be a list"), 400
+    elif "file" in request.files:
+        rows = read_postings(io.TextIOWrapper(request.files["file"].stream, encoding="utf-8-sig"))
+    else:
+        return jsonify(error="send JSON postings or a CSV file field named 'file'"), 400
+    return jsonify(bulk_post(rows, chunk_size=max(1, chunk_size)))
+
+# ---------- CLI ----------
+def cli_bulk_post(args):
+    fmt = "json" if args.file.endswith(".json") else "csv"
+    with open(args.file, newline="", encoding="utf-8-sig") as f:
+        report = bulk_post(read_postings(f, fmt), chunk_size=args.chunk_size)
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["line", "status", "error"])
+            w.writerows([r["line"], r["status"], r["error"]] for r in report["results"])
+    else:
+        for r in report["results"]:
+            if r["status"] != "ok":
+                print(f"line {r['line']}: {r['error']}")
+    print(f"posted {report['posted']}/{report['total']} rows, {report['failed']} failed, "
+          f"{report['elapsed_sec']}s ({report['rows_per_sec']} rows/s)")
+
+def cli_migrate(args):
+    c = get_conn()
+    applied = migrate(c)
+    print(f"schema version {schema_version(c)}" + (f" (applied {applied})" if applied else " (up to date)"))
+    put_conn(c)
+
+def cli_explain(args):
+    c = get_conn()
+    report = check_query_plans(c)
+    put_conn(c)
+    for name, plan, ok in report:
+        print(f"[{'ok' if ok else 'SCAN'}] {name}: " + " / ".join(plan))
+    if not all(ok for _, _, ok in report):
+        raise SystemExit(1)
+
+def cli_reconcile_stats(args):
+    c = get_conn()
+    with immediate(c):
+        drift = reconcile_stats(c, fix=not args.check)
+    put_conn(c)
+    if not drift:
+        print("bank_stats in sync")
+    for k, (stored, actual) in drift.items():
+        print(f"{k}: stored {stored} actual {actual} drift {actual - stored}" + ("" if args.check else " (fixed)"))
+    if drift and args.check:
+        raise SystemExit(1)
+
+def cli_batch_statements(args):
+    if not REPORTLAB_AVAILABLE:
+        raise SystemExit("reportlab library not installed — install reportlab for PDF export")
+    date_from = parse_day(args.date_from) if args.date_from else None
+    date_to = parse_day(args.date_to) if args.date_to else None
+    def progress(r):
+        print(f"  worker {r['pid']}: {r['written']} written, {r['skipped']} skipped, {len(r['failed'])} failed in {r['seconds']:.1f}s")
+    report = batch_statements(args.out, args.workers, date_from, date_to, args.with_account, args.force, progress)
+    for pid, w in sorted(report["workers"].items()):
+        rate = w["written"] / w["seconds"] if w["seconds"] else 0
+        print(f"worker {pid}: {w['shards']} shards, {w['written']} statements, busy {w['seconds']:.1f}s ({rate:.1f}/s)")
+    for acc, err in report["failed"]:
+        print(f"account {acc} failed: {err}")
+    print(f"{report['written']} statements written, {report['skipped']} already present, {len(report['failed'])} failed "
+          f"of {report['accounts']} accounts in {report['elapsed_sec']}s ({report['statements_per_sec']} statements/s) -> {report['out_dir']}")
+    if report["failed"]:
+        raise SystemExit(1)
+
+def cli_revalue(args):
+    if not NUMPY_AVAILABLE:
+        raise SystemExit("numpy library not installed — install numpy for portfolio revaluation")
+    c = get_conn()
+    start = time.perf_counter()
+    counts = revalue_instruments(c, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    put_conn(c)
+    total = counts["fds"] + counts["loans"]
+    print(f"revalued {counts['fds']} FDs and {counts['loans']} loans in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} instruments/s)")
+
+def cli_accrue(args):
+    day = parse_day(args.date).strftime("%Y-%m-%d") if args.date else None
+    stats = run_accrual(day, chunk_size=args.chunk_size, force=args.force)
+    if stats is None:
+        print(f"accrual for {day or 'today'} already done (use --force to rescan)")
+        return
+    print(f"matured {stats.get('fds_matured', 0)} FDs (paid ₹{Money(stats.get('amount_paid', 0))}), "
+          f"accrued ₹{Money(stats.get('interest_accrued', 0))} on {stats.get('loans_accrued', 0)} loans in {stats['elapsed_sec']}s")
+
+def cli_snapshot(args):
+    day = parse_day(args.date).strftime("%Y-%m-%d") if args.date else (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    stats = snapshot_balances(day, full=True if args.full else None, chunk_size=args.chunk_size, force=args.force,
+                              allow_open_day=args.allow_open_day)
+    if stats is None:
+        print(f"snapshot for {day} already done (use --force to retake)")
+        return
+    print(f"snapshotted {stats.get('accounts', 0)} accounts as of {day}, pruned {stats.get('pruned', 0)} old snapshots in {stats['elapsed_sec']}s")
+
+def cli_archive(args):
+    if args.period:
+        c = get_conn()
+        try:
+            moved = {args.period: archive_month(c, args.period)}
+        finally:
+            put_conn(c)
+    else:
+        moved = archive_closed_months(vacuum=args.vacuum)
+    for period, n in moved.items():
+        print(f"{period}: moved {n} transactions to {os.path.join(ARCHIVE_DIR, f'transactions_{period}.db')}")
+    print(f"archived {len(moved)} months; hot window starts {archive_horizon()}")
+
+def cli_notify(args):
+    if args.prune is not None:
+        print(f"pruned {prune_outbox(args.prune)} sent messages")
+    if args.drain:
+        start = time.perf_counter()
+        n = dispatcher.drain()
+        elapsed = time.perf_counter() - start
+        s = dispatcher.stats()
+        print(f"claimed {n} messages: {s['sent']} sent, {s['retried']} to retry, {s['failed']} failed in {elapsed:.2f}s")
+    c = get_conn()
+    try:
+        m = outbox_metrics(c)
+    finally:
+        put_conn(c)
+    print(f"outbox: {m['pending']} pending ({m['due']} due, oldest {m['oldest_pending_sec']}s), {m['failed']} failed")
+
+def run_server(args):
     # create DB for demo if empty (optional)
     print("Starting OM Bank Flask app. DB:", DB_FILE)
+    # the debug reloader runs this in a watcher process too; only the serving child starts
+    # the threads up front (any other server starts them on its first request)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background()
     app.run(debug=True)
+
+# ---------- Run ----------
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="OM Bank management app (runs the web server by default)")
+    parser.set_defaults(func=run_server)
+    sub = parser.add_subparsers(title="batch commands")
+    p = sub.add_parser("bulk-post", help="post a CSV/JSON file of Deposit/Withdraw rows")
+    p.add_argument("file", help="CSV with account_no,type,amount,note columns, or a .json list")
+    p.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    p.add_argument("--report", help="write the per-row report to this CSV")
+    p.set_defaults(func=cli_bulk_post)
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.set_defaults(func=cli_migrate)
+    p = sub.add_parser("explain", help="check that hot queries use indexes (exit 1 if not)")
+    p.set_defaults(func=cli_explain)
+    p = sub.add_parser("reconcile-stats", help="rebuild dashboard totals from the base tables and report drift")
+    p.add_argument("--check", action="store_true", help="only report drift (exit 1 if any)")
+    p.set_defaults(func=cli_reconcile_stats)
+    p = sub.add_parser("batch-statements", help="write statement PDFs for every customer using a process pool")
+    p.add_argument("--out", default=STATEMENT_DIR, help="output root (a subdirectory per period is created)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--from", dest="date_from", help="period start YYYY-MM-DD")
+    p.add_argument("--to", dest="date_to", help="period end YYYY-MM-DD")
+    p.add_argument("--with-account", action="store_true", help="also write the account details PDF")
+    p.add_argument("--force", action="store_true", help="rewrite statements that already exist")
+    p.set_defaults(func=cli_batch_statements)
+    p = sub.add_parser("revalue", help="recompute FD maturity values and loan EMIs for the whole portfolio (needs numpy)")
+    p.add_argument("--chunk-size", type=int, default=REVALUE_CHUNK_SIZE)
+    p.set_defaults(func=cli_revalue)
+    p = sub.add_parser("accrue", help="end-of-day batch: pay out matured FDs and accrue loan interest")
+    p.add_argument("--date", help="business date YYYY-MM-DD (default today)")
+    p.add_argument("--chunk-size", type=int, default=ACCRUAL_CHUNK_SIZE)
+    p.add_argument("--force", action="store_true", help="rescan even if the date is marked done")
+    p.set_defaults(func=cli_accrue)
+    p = sub.add_parser("snapshot", help="write closing-balance snapshots for a day (default yesterday)")
+    p.add_argument("--date", help="day YYYY-MM-DD")
+    p.add_argument("--full", action="store_true", help="snapshot every account, not just those that posted that day")
+    p.add_argument("--chunk-size", type=int, default=SNAPSHOT_CHUNK_SIZE)
+    p.add_argument("--force", action="store_true", help="retake even if the day is marked done")
+    p.add_argument("--allow-open-day", action="store_true", help="allow today or a future day (postings after the snapshot are missed)")
+    p.set_defaults(func=cli_snapshot)
+    p = sub.add_parser("archive", help="move closed months of transactions out of the main DB into per-month archive files")
+    p.add_argument("--period", help="archive just this month (YYYY-MM)")
+    p.add_argument("--vacuum", action="store_true", help="VACUUM the main DB afterwards to shrink the file")
+    p.set_defaults(func=cli_archive)
+    p = sub.add_parser("notify", help="show the notification outbox; optionally send what is due now")
+    p.add_argument("--drain", action="store_true", help="send every due message through NOTIFY_SENDER")
+    p.add_argument("--prune", type=int, metavar="DAYS", help="delete messages sent more than DAYS ago")
+    p.set_defaults(func=cli_notify)
+    args = parser.parse_args()
+    args.func(args)
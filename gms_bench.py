@@ -0,0 +1,381 @@
+# gms_bench.py - micro-benchmarks and load tests for gms.py
+#   python gms_bench.py render [--rows 200] [--iterations 500]
+#   python gms_bench.py pdf [--rows 50] [--iterations 50]
+#   python gms_bench.py seed [--customers 10000] [--transactions 200000] [--fds 5000] [--loans 5000]
+#   python gms_bench.py routes [--iterations 200] [--out routes.json]
+#   python gms_bench.py load [--concurrency 16] [--duration 30] [--out load.json]
+# seed/routes/load take the same seeding options; results go to JSON for comparing runs.
+import argparse, http.client, json, logging, math, os, platform, random, socket, statistics, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+# never benchmark against the real bank database unless asked to
+os.environ.setdefault("GMS_DB_FILE", os.path.join(tempfile.gettempdir(), "gms_bench.db"))
+# nor with the scheduler and SMS sender running alongside the code being timed
+os.environ.setdefault("GMS_SCHEDULER", "0")
+os.environ.setdefault("GMS_NOTIFY", "0")
+
+import gms
+
+def fake_transactions(n):
+    start = datetime(2024, 1, 1)
+    return [{"date": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"), "account_no": 1000 + i % 97,
+             "type": ("Deposit", "Withdraw", "FD_Create", "LoanCredit")[i % 4], "amount": 10000 + i, "note": f"row {i}"}
+            for i in range(n)]
+
+def timeit(fn, iterations):
+    """Run fn() `iterations` times; returns per-call timings in ms."""
+    samples = []
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+def percentile(sorted_samples, p):
+    # nearest-rank percentile of an already sorted list
+    return sorted_samples[max(0, min(len(sorted_samples) - 1, math.ceil(p / 100 * len(sorted_samples)) - 1))]
+
+def summarize(samples, errors=0, elapsed=None):
+    """Latency summary (ms) of one route; throughput when the wall-clock `elapsed` is given."""
+    samples = sorted(samples)
+    out = {"count": len(samples), "errors": errors}
+    if samples:
+        out.update(mean_ms=round(statistics.mean(samples), 3), p50_ms=round(percentile(samples, 50), 3),
+                   p95_ms=round(percentile(samples, 95), 3), p99_ms=round(percentile(samples, 99), 3), max_ms=round(samples[-1], 3))
+    if elapsed:
+        out["rps"] = round(len(samples) / elapsed, 1)
+    return out
+
+def write_results(path, kind, args, results, **extra):
+    payload = {"benchmark": kind, "started_at": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+               "sqlite": gms.sqlite3.sqlite_version, "cpus": os.cpu_count(), "db": gms.DB_FILE,
+               "options": {k: v for k, v in vars(args).items() if k != "func"}, **extra, "results": results}
+    if path:
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+        print(f"results written to {path}")
+    return payload
+
+def print_table(results):
+    print(f"{'route':22s} {'count':>7s} {'err':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>8s}")
+    for name, r in results.items():
+        print(f"{name:22s} {r['count']:7d} {r['errors']:5d} {r.get('p50_ms', 0):9.3f} {r.get('p95_ms', 0):9.3f} {r.get('p99_ms', 0):9.3f} {r.get('rps', 0):8.1f}")
+
+def report(name, samples):
+    s = summarize(samples)
+    print(f"{name:32s} mean {s['mean_ms']:8.3f} ms   p50 {s['p50_ms']:8.3f} ms   p95 {s['p95_ms']:8.3f} ms")
+
+def bench_render(args):
+    from flask import render_template_string
+    txs = fake_transactions(args.rows)
+    ctx = dict(stats={"customers": 5000, "total_deposits": "123456.78", "fds": 800, "loans": 300},
+               recent_txs=txs[:10], all_txs=txs, logo_exists=False, upi=gms.UPI_ID,
+               created_acc=None, deposit_msg=None, withdraw_msg=None, fd_msg=None, loan_msg=None, atm_msg=None)
+    print(f"dashboard template, {args.rows} transaction rows, {args.iterations} renders")
+    with gms.app.test_request_context("/"):
+        assert render_template_string(gms.TEMPLATE, **ctx) == gms.render(gms.index_template, **ctx)
+        report("render_template_string (before)", timeit(lambda: render_template_string(gms.TEMPLATE, **ctx), args.iterations))
+        report("precompiled template (after)", timeit(lambda: gms.render(gms.index_template, **ctx), args.iterations))
+
+def seed_account(rows):
+    """Create one customer with `rows` postings in the bench DB; returns the account number."""
+    c = gms.get_conn()
+    with gms.immediate(c):
+        acc = c.execute("INSERT INTO customers(name,age,mobile,pin,balance,created_at) VALUES(?,?,?,?,?,?)",
+                        ("Bench Customer", 40, "9000000000", "0000", 0, gms.now_str())).lastrowid
+        c.execute("INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,created_at) VALUES(?,?,?,?,?,?)",
+                  (acc, 100000, 0.055, 12, 105500, gms.now_str()))
+        c.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(?,?,?,?,?,?)",
+                  (acc, 500000, 0.1, 24, 1, gms.now_str()))
+    gms.put_conn(c)
+    gms.bulk_post({"account_no": acc, "type": "Deposit", "amount": 100 + i, "note": f"row {i}"} for i in range(rows))
+    return acc
+
+def bench_pdf(args):
+    if not gms.REPORTLAB_AVAILABLE:
+        raise SystemExit("reportlab is not installed")
+    if gms.PIL_AVAILABLE and not os.path.exists(gms.LOGO_FILE):
+        # exercise the logo path with a generated stand-in
+        from PIL import Image
+        gms.LOGO_FILE = os.path.join(tempfile.gettempdir(), "gms_bench_logo.png")
+        Image.new("RGB", (600, 600), "#0B3D91").save(gms.LOGO_FILE)
+    acc = seed_account(args.rows)
+    c = gms.get_conn()
+    cust = c.execute("SELECT * FROM customers WHERE account_no=?", (acc,)).fetchone()
+    gms.put_conn(c)
+    builders = {"account": lambda: gms.pdf_bytes_account(cust), "transactions": lambda: gms.pdf_bytes_transactions(acc),
+                "fd": lambda: gms.pdf_bytes_fd(acc), "loans": lambda: gms.pdf_bytes_loans(acc)}
+    print(f"PDF exports, {args.rows} transactions, {args.iterations} builds each")
+    for kind, build in builders.items():
+        def cold():
+            gms.clear_pdf_assets()  # what every export paid before the asset cache
+            build()
+        before = timeit(cold, args.iterations)
+        after = timeit(build, args.iterations)
+        print(f"{kind:13s} before {1000 / statistics.mean(before):7.1f} exports/s   after {1000 / statistics.mean(after):7.1f} exports/s")
+
+# ---------- seeding ----------
+def seed_db(customers, transactions, fds, loans, seed=1):
+    """Bulk-load a consistent data set into the bench DB (balances match the postings, a
+    third of the loans pending); returns (first, last) account number seeded."""
+    rnd = random.Random(seed)
+    now = datetime.now()
+    ts = lambda minutes_ago: (now - timedelta(minutes=minutes_ago)).strftime("%Y-%m-%d %H:%M:%S")
+    span = 60 * 24 * 60  # postings spread over the last 60 days, inside the hot window
+    c = gms.get_conn()
+    with gms.immediate(c):
+        first = c.execute("SELECT COALESCE(MAX(account_no),0) FROM customers").fetchone()[0] + 1
+        c.executemany("INSERT INTO customers(account_no,name,age,mobile,pin,balance,created_at) VALUES(?,?,?,?,?,0,?)",
+                      ((first + i, f"Customer {first + i}", rnd.randint(18, 80), f"9{rnd.randint(0, 10**9 - 1):09d}", "1234", ts(span))
+                       for i in range(customers)))
+        last = first + customers - 1
+        balances, rows = {}, []
+        for i in range(transactions):
+            acc = rnd.randint(first, last)
+            amt = rnd.randint(100, 500000)
+            ttype = "Withdraw" if balances.get(acc, 0) >= amt and rnd.random() < 0.4 else "Deposit"
+            balances[acc] = balances.get(acc, 0) + gms.TX_SIGN[ttype] * amt
+            rows.append((acc, ttype, amt, ts(span - span * i // max(1, transactions)), "seed"))
+        c.executemany("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(?,?,?,?,?)", rows)
+        c.executemany("UPDATE customers SET balance=? WHERE account_no=?", ((b, a) for a, b in balances.items()))
+        fd_rows = []
+        for i in range(fds):
+            amt, months = rnd.randint(1000, 100000) * 100, rnd.choice((6, 12, 24, 36))
+            created = ts(rnd.randint(0, span))
+            fd_rows.append((rnd.randint(first, last), amt, gms.FD_RATE, months, round(gms.fd_maturity(amt, gms.FD_RATE, months)), created, created, months))
+        c.executemany("""INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,created_at,maturity_date)
+                         VALUES(?,?,?,?,?,?,date(?, '+' || ? || ' months'))""", fd_rows)
+        loan_rows = []
+        for i in range(loans):
+            amt, months = rnd.randint(1000, 500000) * 100, rnd.choice((12, 24, 60))
+            approved = i % 3 != 0
+            created = ts(rnd.randint(0, span))
+            emi = round(float(gms.loan_emi(amt, gms.LOAN_RATE, months)))
+            loan_rows.append((rnd.randint(first, last), amt, gms.LOAN_RATE, months, int(approved), emi, emi * months - amt,
+                              amt if approved else None, created[:10] if approved else None, created))
+        c.executemany("""INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,emi,total_interest,outstanding,accrued_through,created_at)
+                         VALUES(?,?,?,?,?,?,?,?,?,?)""", loan_rows)
+    gms.put_conn(c)
+    return first, last
+
+def add_seed_args(p):
+    p.add_argument("--customers", type=int, default=10000)
+    p.add_argument("--transactions", type=int, default=200000)
+    p.add_argument("--fds", type=int, default=5000)
+    p.add_argument("--loans", type=int, default=5000)
+    p.add_argument("--seed", type=int, default=1, help="random seed, for reproducible data and request mixes")
+    p.add_argument("--no-seed", action="store_true", help="use the DB as it is instead of seeding it first")
+
+def seeded_accounts(args):
+    if args.no_seed:
+        c = gms.get_conn()
+        first, last = c.execute("SELECT MIN(account_no), MAX(account_no) FROM customers").fetchone()
+        gms.put_conn(c)
+        if first is None:
+            raise SystemExit("no customers in the DB; run without --no-seed")
+        return first, last
+    start = time.perf_counter()
+    first, last = seed_db(args.customers, args.transactions, args.fds, args.loans, args.seed)
+    print(f"seeded {args.customers} customers, {args.transactions} transactions, {args.fds} FDs, {args.loans} loans "
+          f"in {time.perf_counter() - start:.1f}s ({gms.DB_FILE})")
+    return first, last
+
+def bench_seed(args):
+    args.no_seed = False
+    seeded_accounts(args)
+
+# ---------- route mix ----------
+class Workload:
+    """Builds requests for the measured routes against the seeded accounts. Loan approval
+    needs pending loans, so it hands out the pending ids one at a time."""
+    ROUTES = ("index", "deposit", "withdraw", "fd", "loan", "admin_loans", "approve_loan", "export")
+    # relative weight of each route in the load mix
+    MIX = {"index": 30, "deposit": 20, "withdraw": 15, "fd": 5, "loan": 5, "admin_loans": 5, "approve_loan": 5, "export": 5}
+
+    def __init__(self, first, last, seed=1):
+        self.first, self.last = first, last
+        self.rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        c = gms.get_conn()
+        self.pending = [r[0] for r in c.execute("SELECT loan_id FROM loans WHERE approved=0 ORDER BY loan_id")]
+        gms.put_conn(c)
+        self.export_types = ["account", "transactions", "fd", "loans"] if gms.REPORTLAB_AVAILABLE else []
+
+    def request(self, route):
+        """(method, path, form) for one call of `route`, or None if it cannot run now."""
+        with self._lock:
+            acc = str(self.rnd.randint(self.first, self.last))
+            amt = f"{self.rnd.randint(1, 5000)}.{self.rnd.randint(0, 99):02d}"
+            if route == "index":
+                return "GET", "/", None
+            if route in ("deposit", "withdraw"):
+                return "POST", f"/{route}", {"acc": acc, "amt": amt}
+            if route in ("fd", "loan"):
+                return "POST", f"/{route}", {"acc": acc, "amt": amt, "tenure": str(self.rnd.choice((6, 12, 24)))}
+            if route == "admin_loans":
+                return "GET", "/admin/loans", None
+            if route == "approve_loan":
+                return ("POST", "/admin/loans", {"loan_id": str(self.pending.pop())}) if self.pending else None
+            if route == "export":
+                return ("POST", "/export", {"acc": acc, "type": self.rnd.choice(self.export_types)}) if self.export_types else None
+        raise ValueError(route)
+
+    def pick(self):
+        with self._lock:
+            return self.rnd.choices(list(self.MIX), weights=list(self.MIX.values()))[0]
+
+def ok_status(status):
+    return status < 400  # the form routes answer with a redirect
+
+# ---------- in-process (test client) ----------
+def bench_routes(args):
+    first, last = seeded_accounts(args)
+    work = Workload(first, last, args.seed)
+    client = gms.app.test_client()
+    routes = args.routes.split(",") if args.routes else Workload.ROUTES
+    results = {}
+    print(f"test client, {args.iterations} requests per route")
+    for route in routes:
+        samples, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            req = work.request(route)
+            if req is None:
+                break
+            method, path, form = req
+            t = time.perf_counter()
+            resp = client.open(path, method=method, data=form)
+            samples.append((time.perf_counter() - t) * 1000)
+            resp.close()
+            errors += not ok_status(resp.status_code)
+        results[route] = summarize(samples, errors, time.perf_counter() - start)
+    print_table(results)
+    write_results(args.out, "routes", args, results)
+
+# ---------- HTTP load ----------
+def serve(port):
+    # bench server: the app under a threaded WSGI server, without the debug reloader
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    make_server("127.0.0.1", port, gms.app, threaded=True).serve_forever()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port, timeout=30):
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", str(port)], env=dict(os.environ),
+                            stdout=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit("bench server exited during startup")
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("bench server did not start")
+
+def load_worker(host, port, work, deadline, max_requests, counter, samples, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    while time.perf_counter() < deadline:
+        with counter["lock"]:
+            if max_requests and counter["sent"] >= max_requests:
+                break
+            counter["sent"] += 1
+        route = work.pick()
+        req = work.request(route)
+        if req is None:
+            continue
+        method, path, form = req
+        body = urlencode(form) if form else None
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if form else {}
+        t = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            failed = not ok_status(resp.status)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            failed = True
+        samples.setdefault(route, []).append((time.perf_counter() - t) * 1000)
+        errors[route] = errors.get(route, 0) + failed
+    conn.close()
+
+def bench_load(args):
+    first, last = seeded_accounts(args)
+    work = Workload(first, last, args.seed)
+    if args.url:
+        host, _, port = args.url.replace("http://", "").rstrip("/").partition(":")
+        port, proc = int(port or 80), None
+    else:
+        host, port = "127.0.0.1", free_port()
+        proc = start_server(port)
+    print(f"load: {args.concurrency} clients for {args.duration}s" + (f" or {args.requests} requests" if args.requests else "") + f" against {host}:{port}")
+    per_worker = [({}, {}) for _ in range(args.concurrency)]
+    counter = {"lock": threading.Lock(), "sent": 0}
+    try:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        with ThreadPoolExecutor(args.concurrency) as ex:
+            for f in [ex.submit(load_worker, host, port, work, deadline, args.requests, counter, s, e) for s, e in per_worker]:
+                f.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    samples, errors = {}, {}
+    for s, e in per_worker:
+        for route, v in s.items():
+            samples.setdefault(route, []).extend(v)
+        for route, n in e.items():
+            errors[route] = errors.get(route, 0) + n
+    results = {route: summarize(samples[route], errors.get(route, 0), elapsed) for route in Workload.ROUTES if route in samples}
+    results["total"] = summarize([x for v in samples.values() for x in v], sum(errors.values()), elapsed)
+    print_table(results)
+    write_results(args.out, "load", args, results, elapsed_sec=round(elapsed, 3))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="gms.py benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("render", help="dashboard render cost: render_template_string vs precompiled")
+    p.add_argument("--rows", type=int, default=200)
+    p.add_argument("--iterations", type=int, default=500)
+    p.set_defaults(func=bench_render)
+    p = sub.add_parser("pdf", help="PDF exports/sec with and without the cached logo/QR/styles")
+    p.add_argument("--rows", type=int, default=50)
+    p.add_argument("--iterations", type=int, default=50)
+    p.set_defaults(func=bench_pdf)
+    p = sub.add_parser("seed", help="bulk-load customers, transactions, FDs and loans into the bench DB")
+    add_seed_args(p)
+    p.set_defaults(func=bench_seed)
+    p = sub.add_parser("routes", help="per-route latency through Flask's test client")
+    add_seed_args(p)
+    p.add_argument("--iterations", type=int, default=200, help="requests per route")
+    p.add_argument("--routes", help="comma-separated subset of " + ",".join(Workload.ROUTES))
+    p.add_argument("--out", help="write results JSON here")
+    p.set_defaults(func=bench_routes)
+    p = sub.add_parser("load", help="concurrent HTTP load against a local server (started for the run unless --url)")
+    add_seed_args(p)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--duration", type=float, default=30, help="seconds")
+    p.add_argument("--requests", type=int, default=0, help="stop after this many requests (0: run for --duration)")
+    p.add_argument("--url", help="hit an already running server, e.g. http://127.0.0.1:5000")
+    p.add_argument("--out", help="write results JSON here")
+    p.set_defaults(func=bench_load)
+    p = sub.add_parser("serve")  # used by `load` to run the app in its own process
+    p.add_argument("--port", type=int, required=True)
+    p.set_defaults(func=lambda args: serve(args.port))
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
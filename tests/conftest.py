@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# gms.py opens (and migrates) GMS_DB_FILE at import, so point it somewhere disposable first;
+# each test then gets a fresh database through the `db` fixture.
+_session_dir = tempfile.mkdtemp(prefix="gms-tests-")
+os.environ["GMS_DB_FILE"] = os.path.join(_session_dir, "import.db")
+os.environ["GMS_SCHEDULER"] = "0"
+os.environ["GMS_NOTIFY"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gms  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, fully migrated database that gms and its export workers use for one test."""
+    path = str(tmp_path / "bank.db")
+    monkeypatch.setenv("GMS_DB_FILE", path)
+    monkeypatch.setattr(gms, "DB_FILE", path)
+    monkeypatch.setattr(gms, "pool", gms.ConnectionPool(path, 4))
+    monkeypatch.setattr(gms, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(gms, "PROFILE_DIR", str(tmp_path / "profiles"))
+    gms.customer_cache.rows.clear()
+    gms.fragment_cache.clear()
+    gms.init_db()
+    yield path
+    gms.pool.close_all()
+
+
+@pytest.fixture
+def conn(db):
+    c = gms.connect_db(db)
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def client(db):
+    gms.app.config["TESTING"] = True
+    return gms.app.test_client()
+
+
+@pytest.fixture
+def make_account(conn):
+    """make_account(balance_rupees="0", name=...) -> account_no, opened through the ledger."""
+    def make(balance="0", name="Test Customer", mobile="9000000000", pin="1234"):
+        with gms.immediate(conn):
+            acc = conn.execute("INSERT INTO customers(name,age,mobile,pin,balance,created_at) VALUES(?,?,?,?,0,?)",
+                               (name, 30, mobile, pin, gms.now_str())).lastrowid
+            amount = gms.Money.parse(balance)
+            if amount:
+                gms.apply_posting(conn, acc, "Deposit", amount, note="Initial deposit")
+        return acc
+    return make
+
@@ -0,0 +1,52 @@
+import gms
+
+
+def _old_postings(conn, acc, period="2020-01", n=5):
+    with gms.immediate(conn):
+        for i in range(n):
+            conn.execute("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(?,?,?,?,?)",
+                         (acc, "Deposit", 100, f"{period}-{10 + i:02d} 09:00:00", "old"))
+
+
+def test_month_archived_mid_read_is_seen_once(db, conn, make_account):
+    acc = make_account("10")
+    _old_postings(conn, acc)
+    cur = gms.export_rows(conn, "transactions", acc)
+    # another connection archives the month after the cursor has read the catalog
+    other = gms.connect_db(db)
+    assert gms.archive_month(other, "2020-01") == 5
+    other.close()
+    rows = cur.fetchall()
+    assert [r["note"] for r in rows].count("old") == 5
+    assert len(rows) == 6
+    assert not conn.in_transaction
+    # and a fresh cursor now reads the month from the archive
+    assert len(gms.export_rows(conn, "transactions", acc).fetchall()) == 6
+
+
+def test_abandoned_stream_releases_connection(client, conn, make_account, monkeypatch):
+    acc = make_account("10")
+    _old_postings(conn, acc, n=50)
+    gms.archive_month(conn, "2020-01")
+    r = client.get("/api/accounts/%d/transactions?limit=20" % acc, buffered=False)
+    assert next(iter(r.response))  # the stream now holds a read transaction
+    r.close()
+    c = gms.pool.acquire()
+    try:
+        assert not c.in_transaction
+        assert [row[1] for row in c.execute("PRAGMA database_list")] == ["main"]
+        with gms.immediate(c):
+            gms.apply_posting(c, acc, "Deposit", 100)
+    finally:
+        gms.pool.release(c)
+
+
+def test_streamed_export_reads_every_tier(client, conn, make_account):
+    acc = make_account("10")
+    _old_postings(conn, acc, n=7)
+    gms.archive_month(conn, "2020-01")
+    with client.get(f"/export/transactions?format=ndjson&acc={acc}") as r:
+        lines = r.get_data(as_text=True).splitlines()
+    assert len(lines) == 8
+    # the streaming connection went back to the pool only after the body was sent
+    assert all(not c.in_transaction for c in gms.pool._idle.queue)
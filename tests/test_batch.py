@@ -0,0 +1,67 @@
+import logging
+from datetime import datetime
+
+import pytest
+
+import gms
+
+
+def test_catch_up_accrual_dates_maturity_on_business_day(conn, make_account):
+    acc = make_account("0")
+    with gms.immediate(conn):
+        conn.execute("""INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,compounding,created_at,maturity_date)
+                        VALUES(?,?,?,?,?,?,?,?)""", (acc, 100000, 0.07, 12, 107000, "yearly", "2025-01-05 10:00:00", "2026-01-05"))
+    stats = gms.run_accrual("2026-01-10")
+    assert stats["fds_matured"] == 1
+    row = conn.execute("SELECT amount, date FROM transactions WHERE account_no=? AND type='FD_Maturity'", (acc,)).fetchone()
+    assert tuple(row) == (107000, "2026-01-10 00:00:00")
+    assert gms.balance_at(conn, acc, "2026-01-09") == 0
+    assert gms.balance_at(conn, acc, "2026-01-10") == 107000
+
+
+def test_scheduler_logs_failed_job_and_retries(db, caplog):
+    s = gms.DailyScheduler()
+    calls = []
+
+    def job(day):
+        calls.append(day)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    s.add("flaky", "00:00", job)
+    now = datetime(2026, 3, 1, 1, 0)
+    with caplog.at_level(logging.ERROR):
+        s.run_pending(now)
+    assert "flaky for 2026-03-01 failed" in caplog.text
+    s.run_pending(now)
+    s.run_pending(now)
+    assert calls == ["2026-03-01", "2026-03-01"]
+
+
+def test_accrual_refuses_snapshotted_or_archived_days(conn, make_account):
+    acc = make_account("10")
+    with gms.immediate(conn):
+        conn.execute("""INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,compounding,created_at,maturity_date)
+                        VALUES(?,?,?,?,?,?,?,?)""", (acc, 500, 0.07, 12, 600, "yearly", "2025-01-05 10:00:00", "2026-01-05"))
+    conn.execute("UPDATE transactions SET date='2025-12-01 10:00:00' WHERE account_no=?", (acc,))
+    conn.commit()
+    gms.snapshot_balances("2026-01-31", full=True)
+    with pytest.raises(ValueError):
+        gms.run_accrual("2026-01-10")
+    with pytest.raises(ValueError):
+        gms.run_accrual("2026-01-31", force=True)
+    assert conn.execute("SELECT COUNT(*) FROM transactions WHERE type='FD_Maturity'").fetchone()[0] == 0
+    assert gms.balance_at(conn, acc, "2026-02-05") == 1000
+    # after the snapshot the maturity is posted on a later day and every view agrees
+    gms.run_accrual("2026-02-01")
+    assert gms.balance_at(conn, acc, "2026-02-05") == 1600
+    assert conn.execute("SELECT balance FROM customers WHERE account_no=?", (acc,)).fetchone()[0] == 1600
+
+
+def test_accrual_refuses_archived_month(conn, make_account):
+    acc = make_account("10")
+    conn.execute("UPDATE transactions SET date='2020-01-15 10:00:00' WHERE account_no=?", (acc,))
+    conn.commit()
+    gms.archive_month(conn, "2020-01")
+    with pytest.raises(ValueError):
+        gms.run_accrual("2020-01-20")
@@ -0,0 +1,16 @@
+import sqlite3
+
+import gms
+
+
+def test_cached_customer_sees_balance_written_elsewhere(db, conn, client, make_account):
+    acc = make_account("10")
+    assert gms.customer(conn, acc)["balance"] == 1000
+    assert gms.customer(conn, acc)["name"] == "Test Customer"  # now served from the cache
+    # a posting committed by another process (CLI batch, another worker) never evicts anything here
+    other = sqlite3.connect(db)
+    other.execute("UPDATE customers SET balance = balance + 50000 WHERE account_no=?", (acc,))
+    other.commit()
+    other.close()
+    assert gms.customer(conn, acc)["balance"] == 51000
+    assert client.get(f"/api/accounts/{acc}/balance").get_json()["balance"] == 510.0
@@ -0,0 +1,65 @@
+import gms
+
+
+def test_bank_stats_follow_every_write(client, conn, make_account):
+    a = make_account("100")
+    b = make_account("50")
+    assert client.post("/fd", data={"acc": a, "amt": "40", "tenure": "12"}).status_code == 302
+    with gms.immediate(conn):
+        loan = conn.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(?,?,?,?,0,?)",
+                            (b, 2000, 0.1, 12, gms.now_str())).lastrowid
+    gms.approve_loans(conn, [loan])
+    stats = gms.read_stats(conn)
+    assert (stats["customers"], stats["total_balance"], stats["fds"], stats["approved_loans"]) == (2, 6000 + 7000, 1, 1)
+    with gms.immediate(conn):
+        conn.execute("DELETE FROM loans WHERE loan_id=?", (loan,))
+        conn.execute("DELETE FROM customers WHERE account_no=?", (b,))
+    stats = gms.read_stats(conn)
+    assert (stats["customers"], stats["total_balance"], stats["approved_loans"]) == (1, 6000, 0)
+    assert gms.reconcile_stats(conn, fix=False) == {}
+
+
+def test_reconcile_repairs_drifted_totals(conn, make_account):
+    make_account("10")
+    with gms.immediate(conn):
+        conn.execute("UPDATE bank_stats SET customers=7, total_balance=1 WHERE id=1")
+    assert gms.reconcile_stats(conn) == {"customers": (7, 1), "total_balance": (1, 1000)}
+    assert gms.reconcile_stats(conn, fix=False) == {}
+
+
+def test_dashboard_shows_the_maintained_totals(client, make_account):
+    make_account("1234.50")
+    html = client.get("/").get_data(as_text=True)
+    assert "1234.50" in html
+
+
+def test_dashboard_html_is_cached_until_a_write(client, conn, make_account):
+    acc = make_account("10")
+    first = client.get("/").get_data(as_text=True)
+    hits = gms.fragment_cache.hits
+    assert client.get("/").get_data(as_text=True) == first
+    assert gms.fragment_cache.hits == hits + 1
+    # a write from outside the request path still bumps data_version
+    with gms.immediate(conn):
+        gms.apply_posting(conn, acc, "Deposit", 99000)
+    assert "1000.00" in client.get("/").get_data(as_text=True)
+
+
+def test_lru_cache_bounds_entries_weight_and_age(monkeypatch):
+    cache = gms.LRUCache(2, maxweight=10)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.get("a")
+    cache.put("c", "xxxx")  # over both bounds: the least recently used entry goes
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("xxxx", None, "xxxx")
+    cache.put("d", "x" * 10)
+    assert cache.stats()["entries"] == 1 and cache.stats()["weight"] == 10
+
+    now = [100.0]
+    monkeypatch.setattr(gms.time, "monotonic", lambda: now[0])
+    cache = gms.LRUCache(4, ttl=5)
+    cache.put("k", "v")
+    now[0] += 4
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import gms
+
+
+def test_fd_export_streams_in_created_order_without_a_sort(client, conn, make_account):
+    acc = make_account("0")
+    with gms.immediate(conn):
+        for created in ("2024-03-01 10:00:00", "2024-01-01 10:00:00", "2024-02-01 10:00:00"):
+            conn.execute("INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,created_at) VALUES(?,?,?,?,?,?)",
+                         (acc, 100000, 0.055, 12, 105500, created))
+    r = client.get("/export/fds")
+    rows = list(csv.DictReader(io.StringIO(r.get_data(as_text=True))))
+    assert [row["fd_id"] for row in rows] == ["2", "3", "1"]
+    assert rows[0]["amount"] == "1000.0"
+    plan = [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN SELECT * FROM fds ORDER BY created_at, fd_id")]
+    assert not any("TEMP B-TREE" in d for d in plan)
+
+
+def test_export_filters_by_account_and_day(client, make_account):
+    a, b = make_account("10"), make_account("20")
+    r = client.get(f"/export/transactions?format=ndjson&acc={a}&from=2000-01-01")
+    rows = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    assert [(row["account_no"], row["amount"]) for row in rows] == [(a, 10.0)]
+    assert client.get("/export/transactions?to=2000-01-01").get_data(as_text=True).count("\n") == 1
+    assert client.get(f"/export/transactions?acc={b}&from=bad").status_code == 400
+
+
+def test_zip_export_logs_a_failed_document_and_keeps_details_out_of_the_zip(db, monkeypatch, caplog):
+    class Jobs:
+        def executor(self):
+            return pool
+    def build(kind, acc):
+        if kind == "fd":
+            raise RuntimeError("secret path /srv/gms/bank.db")
+        return kind.encode()
+    pool = ThreadPoolExecutor(2)
+    monkeypatch.setattr(gms, "export_jobs", Jobs())
+    monkeypatch.setattr(gms, "build_export_pdf", build)
+    with caplog.at_level(logging.ERROR, logger=gms.app.logger.name):
+        data = b"".join(gms.stream_export_zip(7))
+    pool.shutdown()
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert zf.read(gms.EXPORT_FILENAMES["account"].format(7)) == b"account"
+    note = zf.read("fd_error.txt").decode()
+    assert "could not be generated" in note and "secret" not in note
+    assert "secret path" in caplog.text
@@ -0,0 +1,101 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+
+import gms
+
+pypdf = pytest.importorskip("pypdf")
+pytestmark = pytest.mark.skipif(not gms.REPORTLAB_AVAILABLE, reason="reportlab not installed")
+
+
+def pdf_text(data):
+    return "".join(page.extract_text() for page in pypdf.PdfReader(io.BytesIO(data)).pages)
+
+
+@pytest.fixture
+def export_pool(db, monkeypatch):
+    # one spawn worker, so the second export runs in the process that built the first
+    jobs = gms.ExportJobs(1, 60)
+    monkeypatch.setattr(gms, "export_jobs", jobs)
+    yield jobs
+    if jobs._executor is not None:
+        jobs._executor.shutdown()
+
+
+def test_worker_account_pdf_sees_new_postings(client, make_account, export_pool):
+    acc = make_account("100")
+    job = export_pool.get(export_pool.submit("account", acc))
+    assert "100.00" in pdf_text(job["future"].result(timeout=120))
+    gms.post_tx(acc, "Deposit", gms.Money.parse("1000"))
+    job = export_pool.get(export_pool.submit("account", acc))
+    assert "1100.00" in pdf_text(job["future"].result(timeout=120))
+
+
+def test_worker_zip_export_sees_new_postings(client, make_account, export_pool):
+    acc = make_account("100")
+    name = gms.EXPORT_FILENAMES["account"].format(acc)
+
+    def exported_account():
+        with client.post("/export", data={"acc": acc, "type": "all"}) as r:
+            assert r.status_code == 200
+            return pdf_text(zipfile.ZipFile(io.BytesIO(r.data)).read(name))
+
+    assert "100.00" in exported_account()
+    gms.post_tx(acc, "Deposit", gms.Money.parse("1000"))
+    assert "1100.00" in exported_account()
+
+
+def test_statement_resume_writes_missing_account_pdf(db, make_account, tmp_path):
+    acc = make_account("250")
+    out = str(tmp_path / "statements")
+    os.makedirs(out)
+    first = gms.run_statement_shard(db, [acc], out, with_account=True)
+    assert (first["written"], first["skipped"]) == (1, 0)
+    # crash between the two writes: the statement exists, the account PDF does not
+    os.remove(os.path.join(out, f"Account_{acc}.pdf"))
+    statement_mtime = os.path.getmtime(os.path.join(out, f"Statement_{acc}.pdf"))
+    resumed = gms.run_statement_shard(db, [acc], out, with_account=True)
+    assert (resumed["written"], resumed["skipped"], resumed["failed"]) == (1, 0, [])
+    assert "250.00" in pdf_text(open(os.path.join(out, f"Account_{acc}.pdf"), "rb").read())
+    assert os.path.getmtime(os.path.join(out, f"Statement_{acc}.pdf")) == statement_mtime
+    again = gms.run_statement_shard(db, [acc], out, with_account=True)
+    assert (again["written"], again["skipped"]) == (0, 1)
+
+
+def test_streamed_statement_lays_out_like_simple_doc_template(conn, make_account, monkeypatch):
+    acc = make_account("0")
+    for _ in range(120):
+        gms.post_tx(acc, "Deposit", gms.Money.parse("1"))
+    streamed = gms.pdf_bytes_transactions(acc, conn=conn)
+    text = pdf_text(streamed)
+    assert all(f"{n}.00" in text for n in range(1, 121))
+    assert re.search(r"Closing balance: \S?120\.00", text)
+
+    class ListDocTemplate(gms.SimpleDocTemplate):
+        def build(self, flowables):
+            super().build(list(flowables))
+
+    monkeypatch.setattr(gms, "StreamingDocTemplate", ListDocTemplate)
+    reference = gms.pdf_bytes_transactions(acc, conn=conn)
+    assert len(pypdf.PdfReader(io.BytesIO(streamed)).pages) == len(pypdf.PdfReader(io.BytesIO(reference)).pages) > 1
+    assert pdf_text(reference) == text
+
+
+def test_statement_balances_and_rows_share_one_snapshot(db, conn, make_account, monkeypatch):
+    acc = make_account("10")
+    rows = gms.statement_rows
+
+    def posting_commits_meanwhile(*args, **kwargs):
+        other = gms.connect_db(db)
+        with gms.immediate(other):
+            gms.apply_posting(other, acc, "Deposit", 500)
+        other.close()
+        return rows(*args, **kwargs)
+
+    monkeypatch.setattr(gms, "statement_rows", posting_commits_meanwhile)
+    text = pdf_text(gms.pdf_bytes_transactions(acc, conn=conn))
+    assert re.search(r"Closing balance: \S?10\.00", text)
+    assert "15.00" not in text
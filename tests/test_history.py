@@ -0,0 +1,44 @@
+import gms
+
+
+def add_txs(conn, acc, dates):
+    with gms.immediate(conn):
+        for i, date in enumerate(dates):
+            conn.execute("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(?,?,?,?,?)",
+                         (acc, "Deposit", 100 * (i + 1), date, f"t{i}"))
+
+
+def pages(client, url, limit):
+    seen, cursor = [], None
+    while True:
+        r = client.get(url, query_string={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        body = r.get_json()
+        assert body["count"] == len(body["transactions"]) <= limit
+        seen.append([t["note"] for t in body["transactions"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return seen
+
+
+def test_history_pages_newest_first_with_ties_broken_by_id(client, conn, make_account):
+    acc = make_account("0")
+    # t1..t3 share a timestamp: the keyset must not skip or repeat them at a page edge
+    add_txs(conn, acc, ["2024-01-01 10:00:00", "2024-01-02 10:00:00", "2024-01-02 10:00:00", "2024-01-02 10:00:00", "2024-01-03 10:00:00"])
+    assert pages(client, f"/api/accounts/{acc}/transactions", 2) == [["t4", "t3"], ["t2", "t1"], ["t0"]]
+    first = client.get(f"/api/accounts/{acc}/transactions?limit=1").get_json()["transactions"][0]
+    assert first["amount"] == 5.0 and first["account_no"] == acc
+
+
+def test_bank_wide_history_and_bad_requests(client, conn, make_account):
+    a, b = make_account("0"), make_account("0")
+    add_txs(conn, a, ["2024-01-01 10:00:00"])
+    add_txs(conn, b, ["2024-01-02 10:00:00"])
+    assert client.get("/api/transactions?limit=5").get_json()["count"] == 2
+    assert client.get("/api/transactions?limit=0").status_code == 400
+    assert client.get("/api/transactions?cursor=!!!").status_code == 400
+    assert client.get("/api/accounts/999/transactions").status_code == 404
+
+
+def test_cursor_round_trips():
+    assert gms.decode_cursor(gms.encode_cursor("2024-01-02 10:00:00", 42)) == ("2024-01-02 10:00:00", 42)
@@ -0,0 +1,38 @@
+import pytest
+
+import gms
+
+np = pytest.importorskip("numpy")
+
+
+def test_loan_emi():
+    assert round(float(gms.loan_emi(100000, 0.1, 12)), 2) == 8791.59
+    assert float(gms.loan_emi(120000, 0.0, 12)) == 10000.0
+    emis = gms.loan_emi(np.array([100000.0, 120000.0]), np.array([0.1, 0.0]), np.array([12, 12]))
+    assert np.allclose(emis, [8791.5887, 10000.0])
+
+
+def test_amortization_schedule_repays_principal():
+    sched = gms.amortization_schedule([100000.0, 50000.0, 12000.0], [0.1, 0.12, 0.0], [12, 24, 6])
+    assert np.allclose(sched["principal"].sum(axis=1), [100000.0, 50000.0, 12000.0])
+    assert np.allclose(sched["balance"][:, -1], 0.0)
+    assert np.allclose(sched["principal"] + sched["interest"], np.where(sched["principal"] > 0, sched["emi"][:, None], 0.0))
+    assert round(sched["interest"][0].sum(), 2) == round(8791.5887 * 12 - 100000, 2)
+    assert sched["balance"][2, 6:].tolist() == [0.0] * 18  # months past a loan's tenure are zero
+
+
+def test_fd_maturity():
+    assert gms.fd_maturity(100000, 0.055, 12, "simple") == pytest.approx(105500.0)
+    assert gms.fd_maturity(100000, 0.06, 24, "annual") == pytest.approx(112360.0)
+    assert gms.fd_maturity(100000, 0.12, 12, "monthly") == pytest.approx(112682.503, abs=1e-3)
+
+
+def test_loan_route_rejects_huge_tenure(client, make_account):
+    acc = make_account("0")
+    r = client.post("/loan", data={"acc": acc, "amt": "1000", "tenure": "100000"})
+    assert r.status_code == 302
+    with client.session_transaction() as s:
+        assert s["_flashes"] == [("danger", "Tenure can be at most 600 months")]
+    client.post("/loan", data={"acc": acc, "amt": "100000", "tenure": "12"})
+    with client.session_transaction() as s:
+        assert s["_flashes"][-1][1] == "Loan application submitted (EMI ₹8791.59 x 12 mo). Awaiting admin approval."
@@ -0,0 +1,148 @@
+import io
+import json
+
+import pytest
+
+import gms
+
+
+def balance(c, acc):
+    return c.execute("SELECT balance FROM customers WHERE account_no=?", (acc,)).fetchone()[0]
+
+
+def tx_types(c, acc):
+    return [r[0] for r in c.execute("SELECT type FROM transactions WHERE account_no=? ORDER BY trans_id", (acc,))]
+
+
+def test_money_parse_rounds_half_up_to_the_paisa():
+    assert gms.Money.parse("10.005") == 1001
+    assert gms.Money.parse(" 7 ") == 700
+    assert gms.Money.parse("abc") is None
+    assert gms.Money.parse("nan") is None
+    assert str(gms.Money(-1205)) == "-12.05"
+
+
+def test_money_parse_rejects_amounts_past_the_maximum():
+    assert gms.Money.parse("1000000000000") == gms.Money.MAX
+    assert gms.Money.parse("1000000000000.01") is None
+    assert gms.Money.parse("1e20") is None
+    assert gms.Money.parse("-1e300") is None
+
+
+def test_huge_deposit_is_refused_not_a_500(client, conn, make_account):
+    acc = make_account("1")
+    r = client.post("/deposit", data={"acc": acc, "amt": "1e20"})
+    assert r.status_code == 302
+    with client.session_transaction() as s:
+        assert s["_flashes"] == [("danger", "Valid account & amount required")]
+    assert balance(conn, acc) == 100
+
+
+def test_post_tx_updates_balance_and_ledger_in_one_commit(conn, make_account):
+    acc = make_account("100")
+    assert gms.post_tx(acc, "Deposit", gms.Money.parse("25.50")) == 12550
+    assert gms.post_tx(acc, "Withdraw", 550) == 12000
+    assert balance(conn, acc) == 12000
+    assert tx_types(conn, acc) == ["Deposit", "Deposit", "Withdraw"]
+
+
+def test_overdraw_is_rejected_without_side_effects(conn, make_account):
+    acc = make_account("10")
+    with pytest.raises(gms.InsufficientFunds):
+        gms.post_tx(acc, "Withdraw", 1001)
+    assert balance(conn, acc) == 1000
+    assert tx_types(conn, acc) == ["Deposit"]
+
+
+def test_unknown_account(conn):
+    with pytest.raises(gms.AccountNotFound):
+        gms.post_tx(999, "Deposit", 100)
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
+
+
+def test_failed_transaction_rolls_back_every_posting(conn, make_account):
+    a, b = make_account("50"), make_account("0")
+    with pytest.raises(gms.InsufficientFunds):
+        with gms.immediate(conn):
+            gms.apply_posting(conn, a, "Deposit", 100)
+            gms.apply_posting(conn, b, "Withdraw", 100)
+    assert (balance(conn, a), balance(conn, b)) == (5000, 0)
+
+
+def test_withdraw_route_reports_insufficient_balance(client, conn, make_account):
+    acc = make_account("5")
+    client.post("/withdraw", data={"acc": acc, "amt": "6"})
+    with client.session_transaction() as s:
+        assert s["_flashes"] == [("danger", "Insufficient balance")]
+    assert balance(conn, acc) == 500
+
+
+@pytest.mark.parametrize("route,form", [
+    ("/deposit", {"amt": "5"}),
+    ("/withdraw", {"amt": "5"}),
+    ("/fd", {"amt": "5", "tenure": "12"}),
+])
+def test_non_numeric_account_is_not_found(client, route, form):
+    r = client.post(route, data=dict(form, acc="abc"))
+    assert r.status_code == 302
+    with client.session_transaction() as s:
+        assert s["_flashes"] == [("danger", "Account not found")]
+
+
+def test_bulk_post_reports_per_row_and_posts_in_file_order(conn, make_account):
+    acc = make_account("10")
+    rows = [
+        {"account_no": acc, "type": "Withdraw", "amount": "15"},  # overdraws before the deposit below
+        {"account_no": acc, "type": "Deposit", "amount": "20"},
+        {"account_no": acc, "type": "Withdraw", "amount": "15"},
+        {"account_no": 999, "type": "Deposit", "amount": "1"},
+        {"account_no": acc, "type": "Transfer", "amount": "1"},
+    ]
+    report = gms.bulk_post(gms.read_postings(io.StringIO(json.dumps(rows)), "json"), chunk_size=2)
+    assert (report["total"], report["posted"], report["failed"]) == (5, 2, 3)
+    assert balance(conn, acc) == 1500
+    errors = {r["line"]: r["error"] for r in report["results"] if r["status"] == "failed"}
+    assert errors[1] == "insufficient balance"
+    assert errors[4] == "account not found"
+    # each posted row queues its SMS, with the balance after that row
+    assert [r[0] for r in conn.execute("SELECT body FROM outbox ORDER BY msg_id")] == [
+        f"Dear Test Customer, ₹20.00 deposited to A/c {acc}. Balance ₹30.00.",
+        f"Dear Test Customer, ₹15.00 withdrawn from A/c {acc}. Balance ₹15.00.",
+    ]
+
+
+def test_bulk_post_route_needs_the_admin_token(client, conn, make_account, monkeypatch):
+    acc = make_account("10")
+    rows = [{"account_no": acc, "type": "Deposit", "amount": "5"}]
+    assert client.post("/bulk_post", json=rows).status_code == 403  # no token configured
+    monkeypatch.setattr(gms, "ADMIN_TOKEN", "s3cret")
+    assert client.post("/bulk_post", json=rows).status_code == 403
+    assert client.post("/bulk_post", json=rows, headers={gms.ADMIN_TOKEN_HEADER: "wrong"}).status_code == 403
+    assert balance(conn, acc) == 1000
+    assert client.post("/bulk_post", json=rows, headers={gms.ADMIN_TOKEN_HEADER: "s3cret"}).status_code == 200
+    assert balance(conn, acc) == 1500
+
+
+def test_bulk_post_route_rejects_non_object_rows(client, conn, make_account, monkeypatch):
+    monkeypatch.setattr(gms, "ADMIN_TOKEN", "s3cret")
+    admin = {gms.ADMIN_TOKEN_HEADER: "s3cret"}
+    acc = make_account("10")
+    r = client.post("/bulk_post", json=[1, "x", None, {"account_no": acc, "type": "Deposit", "amount": "5", "note": 7}], headers=admin)
+    assert r.status_code == 200
+    report = r.get_json()
+    assert (report["total"], report["posted"], report["failed"]) == (4, 1, 3)
+    assert all(res["error"].startswith("invalid row") for res in report["results"][:3])
+    assert balance(conn, acc) == 1500
+    assert client.post("/bulk_post", json={"postings": "x"}, headers=admin).status_code == 400
+
+
+def test_loan_approval_credits_each_loan_once(conn, make_account):
+    acc = make_account("0")
+    with gms.immediate(conn):
+        ids = [conn.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(?,?,?,?,0,?)",
+                            (acc, amt, 0.1, 12, gms.now_str())).lastrowid for amt in (10000, 25000)]
+    assert len(gms.approve_loans(conn, ids + ids)) == 2
+    assert gms.approve_loans(conn, ids) == []
+    assert balance(conn, acc) == 35000
+    assert tx_types(conn, acc) == ["LoanCredit", "LoanCredit"]
+    assert gms.read_stats(conn)["approved_loans"] == 2
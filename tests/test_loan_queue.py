@@ -0,0 +1,46 @@
+import gms
+
+
+def apply_for_loans(conn, acc, amounts, created="2024-01-01 10:00:00"):
+    with gms.immediate(conn):
+        return [conn.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(?,?,?,?,0,?)",
+                             (acc, amt, 0.1, 12, created)).lastrowid for amt in amounts]
+
+
+def test_queue_pages_oldest_first_and_filters(conn, make_account):
+    a, b = make_account("0"), make_account("0")
+    ids = apply_for_loans(conn, a, [1000, 5000, 9000]) + apply_for_loans(conn, b, [3000])
+    page = gms.loan_queue(conn, limit=2)
+    assert [r["loan_id"] for r in page] == ids[:2]
+    after = (page[-1]["created_at"], page[-1]["loan_id"])
+    assert [r["loan_id"] for r in gms.loan_queue(conn, after=after, limit=2)] == ids[2:]
+    assert [r["loan_id"] for r in gms.loan_queue(conn, acc=a, min_amount=2000, max_amount=9000)] == ids[1:3]
+    assert gms.loan_queue(conn, approved=1) == []
+
+
+def test_admin_bulk_approval(client, conn, make_account):
+    acc = make_account("0")
+    ids = apply_for_loans(conn, acc, [1000, 2000, 400000])
+    r = client.post("/admin/loans", data={"loan_id": [str(ids[0])], "loan_ids": f"{ids[1]}, 999"})
+    assert r.status_code == 302
+    with client.session_transaction() as s:
+        assert s["_flashes"][-1][1].startswith("Approved 2 of 3 loans")
+    assert [r["loan_id"] for r in gms.loan_queue(conn)] == [ids[2]]
+    # "approve all" takes whatever matches the filters
+    client.post("/admin/loans", data={"all": "1", "max_amount": "3000"})
+    assert [r["loan_id"] for r in gms.loan_queue(conn)] == [ids[2]]
+    client.post("/admin/loans", data={"all": "1", "acc": str(acc)})
+    assert gms.loan_queue(conn) == []
+    assert conn.execute("SELECT balance FROM customers WHERE account_no=?", (acc,)).fetchone()[0] == 403000
+    client.post("/admin/loans", data={"loan_ids": "x"})
+    with client.session_transaction() as s:
+        assert s["_flashes"][-1] == ("danger", "Loan IDs must be numbers")
+
+
+def test_admin_queue_page_links_the_next_page(client, conn, make_account):
+    acc = make_account("0")
+    ids = apply_for_loans(conn, acc, [1000] * (gms.LOAN_QUEUE_PAGE_SIZE + 1))
+    html = client.get("/admin/loans").get_data(as_text=True)
+    assert "Next page" in html
+    cursor = gms.encode_cursor("2024-01-01 10:00:00", ids[-2])
+    assert "Next page" not in client.get(f"/admin/loans?cursor={cursor}").get_data(as_text=True)
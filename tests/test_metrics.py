@@ -0,0 +1,35 @@
+import re
+
+import pytest
+
+import gms
+
+pytestmark = pytest.mark.skipif(not gms.METRICS_ENABLED, reason="metrics disabled")
+
+
+def scrape(client, line):
+    text = client.get("/metrics").get_data(as_text=True)
+    m = re.search("^" + re.escape(line) + r" (\S+)$", text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+
+def test_streamed_response_queries_are_counted(client, make_account):
+    acc = make_account("10")
+    for _ in range(3):
+        gms.post_tx(acc, "Deposit", gms.Money.parse("5"))
+    count = 'gms_http_request_queries_count{endpoint="api_transactions"}'
+    total = 'gms_http_request_queries_sum{endpoint="api_transactions"}'
+    before = scrape(client, count), scrape(client, total)
+    with client.get(f"/api/accounts/{acc}/transactions?limit=2") as r:
+        assert len(r.get_json()["transactions"]) == 2
+    after = scrape(client, count), scrape(client, total)
+    assert after[0] == before[0] + 1
+    # the history query runs inside the streamed body, after the view has returned
+    assert after[1] - before[1] >= 3
+
+
+def test_statement_series_are_capped():
+    c = gms.Counter("test_total", "test", ("statement",), max_series=2)
+    for label in ("a", "b", "c", "d", "a"):
+        c.inc(1, label)
+    assert c._values == {("a",): 2, ("b",): 1, ("other",): 2}
@@ -0,0 +1,80 @@
+import sqlite3
+
+import gms
+
+# the schema init_db() created before the migrations existed: money as REAL rupees
+LEGACY_SCHEMA = """
+CREATE TABLE customers(account_no INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, age INTEGER,
+                       mobile TEXT, pin TEXT, balance REAL DEFAULT 0, created_at TEXT);
+CREATE TABLE transactions(trans_id INTEGER PRIMARY KEY AUTOINCREMENT, account_no INTEGER, type TEXT,
+                          amount REAL, date TEXT, note TEXT);
+CREATE TABLE fds(fd_id INTEGER PRIMARY KEY AUTOINCREMENT, account_no INTEGER, amount REAL, interest_rate REAL,
+                 tenure_months INTEGER, maturity_amount REAL, created_at TEXT);
+CREATE TABLE loans(loan_id INTEGER PRIMARY KEY AUTOINCREMENT, account_no INTEGER, loan_amount REAL,
+                   interest_rate REAL, tenure_months INTEGER, approved INTEGER DEFAULT 0, created_at TEXT);
+"""
+
+
+def test_fresh_database_is_at_the_latest_version(conn):
+    assert gms.schema_version(conn) == gms.MIGRATIONS[-1][0]
+    assert gms.migrate(conn) == []
+
+
+def test_hot_queries_use_indexes(conn):
+    assert [name for name, _, ok in gms.check_query_plans(conn) if not ok] == []
+
+
+def test_legacy_database_is_migrated_to_exact_paise(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    c = sqlite3.connect(path)
+    c.executescript(LEGACY_SCHEMA)
+    c.execute("INSERT INTO customers(name,mobile,balance,created_at) VALUES('A','900',1234.57,'2024-01-01 10:00:00')")
+    c.execute("INSERT INTO customers(name,mobile,balance,created_at) VALUES('B','901',0.1,'2024-01-01 10:00:00')")
+    c.execute("INSERT INTO transactions(account_no,type,amount,date,note) VALUES(1,'Deposit',1234.57,'2024-01-01 10:00:00','')")
+    c.execute("INSERT INTO fds(account_no,amount,interest_rate,tenure_months,maturity_amount,created_at) VALUES(1,1000.0,0.055,12,1055.0,'2024-01-01 10:00:00')")
+    c.execute("INSERT INTO loans(account_no,loan_amount,interest_rate,tenure_months,approved,created_at) VALUES(2,5000.0,0.1,12,1,'2024-01-01 10:00:00')")
+    c.commit()
+    c.close()
+
+    monkeypatch.setattr(gms, "DB_FILE", path)
+    gms.init_db()
+
+    c = gms.connect_db(path)
+    assert gms.schema_version(c) == gms.MIGRATIONS[-1][0]
+    assert [r[0] for r in c.execute("SELECT balance FROM customers ORDER BY account_no")] == [123457, 10]
+    assert c.execute("SELECT amount FROM transactions").fetchone()[0] == 123457
+    assert tuple(c.execute("SELECT amount, maturity_amount, maturity_date FROM fds").fetchone()) == (100000, 105500, "2025-01-01")
+    assert tuple(c.execute("SELECT loan_amount, outstanding, accrued_through FROM loans").fetchone()) == (500000, 500000, "2024-01-01")
+    assert c.execute("SELECT typeof(balance) FROM customers LIMIT 1").fetchone()[0] == "integer"
+    assert gms.reconcile_stats(c, fix=False) == {}
+    # the bank_stats triggers survive the table rebuilds
+    with gms.immediate(c):
+        gms.apply_posting(c, 2, "Deposit", 90)
+    assert gms.read_stats(c)["total_balance"] == 123457 + 100
+    c.close()
+
+
+def test_paise_rebuild_keeps_ids_indexes_and_rounds_float_noise(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    c = sqlite3.connect(path)
+    c.executescript(LEGACY_SCHEMA)
+    for name, balance in (("A", 0.29), ("B", 1234.56), ("C", 19.99)):
+        c.execute("INSERT INTO customers(name,mobile,balance,created_at) VALUES(?,?,?,'2024-01-01 10:00:00')", (name, "900", balance))
+    c.execute("DELETE FROM customers WHERE name='C'")  # AUTOINCREMENT must not hand account 3 out again
+    c.commit()
+    c.close()
+
+    monkeypatch.setattr(gms, "DB_FILE", path)
+    gms.init_db()
+
+    c = gms.connect_db(path)
+    # 0.29 * 100 is 28.999999999999996 as a double; ROUND takes it to the intended paisa
+    assert [r[0] for r in c.execute("SELECT balance FROM customers ORDER BY account_no")] == [29, 123456]
+    assert c.execute("SELECT typeof(balance) FROM customers LIMIT 1").fetchone()[0] == "integer"
+    with gms.immediate(c):
+        acc = c.execute("INSERT INTO customers(name,mobile,balance,created_at) VALUES('D','900',0,?)", (gms.now_str(),)).lastrowid
+    assert acc == 4
+    indexes = {r[0] for r in c.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name IN ('transactions','fds','loans')")}
+    assert {"idx_transactions_account_date", "idx_fds_account_created", "idx_loans_queue"} <= indexes
+    assert [name for name, _, ok in gms.check_query_plans(c) if not ok] == []
+    c.close()
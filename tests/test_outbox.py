@@ -0,0 +1,57 @@
+import logging
+
+import gms
+
+
+def test_posting_queues_sms_and_dispatcher_sends_it(conn, make_account):
+    acc = make_account("0")
+    gms.post_tx(acc, "Deposit", gms.Money.parse("250"))
+    sender = gms.StubSender(echo=False)
+    d = gms.OutboxDispatcher(sender, batch_size=10)
+    assert d.drain() == 1
+    assert [m["body"] for m in sender.sent] == [f"Dear Test Customer, ₹250.00 deposited to A/c {acc}. Balance ₹250.00."]
+    assert tuple(conn.execute("SELECT status, attempts FROM outbox").fetchone()) == ("sent", 1)
+    assert d.drain() == 0
+
+
+def test_failed_send_is_retried_with_backoff(conn, make_account):
+    acc = make_account("0")
+    gms.post_tx(acc, "Deposit", gms.Money.parse("10"))
+    d = gms.OutboxDispatcher(gms.StubSender(echo=False, fail_every=1), max_attempts=3)
+    assert d.drain() == 1
+    row = conn.execute("SELECT status, attempts, last_error, next_attempt_at > ? FROM outbox", (gms.now_str(),)).fetchone()
+    assert tuple(row) == ("pending", 1, "stub: simulated failure", 1)
+
+
+def test_flush_failure_is_logged(db, caplog, monkeypatch):
+    d = gms.OutboxDispatcher(gms.StubSender(echo=False), poll=0)
+
+    def broken():
+        d.stop()
+        raise RuntimeError("db gone")
+
+    monkeypatch.setattr(d, "drain", broken)
+    with caplog.at_level(logging.ERROR):
+        d._loop()
+    assert "outbox: flush failed" in caplog.text
+    assert "db gone" in caplog.text
+
+
+def test_first_request_starts_background_threads(client, monkeypatch):
+    d = gms.OutboxDispatcher(gms.StubSender(echo=False), poll=60)
+    s = gms.DailyScheduler(poll=60)
+    monkeypatch.setattr(gms, "dispatcher", d)
+    monkeypatch.setattr(gms, "scheduler", s)
+    monkeypatch.setattr(gms, "NOTIFY_ENABLED", True)
+    monkeypatch.setattr(gms, "SCHEDULER_ENABLED", True)
+    monkeypatch.setattr(gms, "_background_started", False)
+    try:
+        client.get("/metrics")
+        assert d.stats()["running"]
+        assert s._thread is not None and s._thread.is_alive()
+        thread = d._thread
+        client.get("/metrics")
+        assert d._thread is thread
+    finally:
+        d.stop()
+        s.stop()
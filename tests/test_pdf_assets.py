@@ -0,0 +1,52 @@
+import io
+import os
+
+import pytest
+
+import gms
+
+pytestmark = pytest.mark.skipif(not (gms.PIL_AVAILABLE and gms.REPORTLAB_AVAILABLE), reason="PIL and reportlab needed")
+
+
+@pytest.fixture(autouse=True)
+def fresh_assets():
+    gms.clear_pdf_assets()
+    yield
+    gms.clear_pdf_assets()
+
+
+def write_logo(path, size, mtime):
+    gms.Image.new("RGB", size, "red").save(path, "PNG")
+    os.utime(path, (mtime, mtime))
+
+
+def test_logo_thumbnail_is_built_once_per_file_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "logo.png")
+    monkeypatch.setattr(gms, "LOGO_FILE", path)
+    assert gms.logo_png() is None
+    write_logo(path, (400, 200), 1_700_000_000)
+    first = gms.logo_png()
+    assert gms.Image.open(io.BytesIO(first)).size == (80, 40)
+    assert gms.logo_png() is first
+    assert gms._logo_png.cache_info().misses == 1
+    # a replaced logo has a new mtime and is thumbnailed again
+    write_logo(path, (100, 100), 1_700_000_100)
+    assert gms.Image.open(io.BytesIO(gms.logo_png())).size == (80, 80)
+
+
+def test_qr_code_and_styles_are_shared_across_documents():
+    if gms.QRCODE_AVAILABLE:
+        png = gms.qr_png(gms.UPI_PAY_URI)
+        assert png.startswith(b"\x89PNG") and gms.qr_png(gms.UPI_PAY_URI) is png
+    assert gms.pdf_styles() is gms.pdf_styles()
+    styles = gms.pdf_table_styles()
+    assert gms.pdf_table_styles() is styles
+    gms.clear_pdf_assets()
+    assert gms.pdf_table_styles() is not styles
+
+
+def test_account_pdf_builds_from_cached_assets(make_account, conn):
+    acc = make_account("10")
+    gms.pdf_bytes_account(gms.customer(conn, acc))
+    gms.pdf_bytes_account(gms.customer(conn, acc))
+    assert gms.pdf_styles.cache_info().hits >= 1
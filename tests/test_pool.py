@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+import gms
+
+
+def test_pool_reuses_connections_up_to_its_size(db):
+    pool = gms.ConnectionPool(db, 2, timeout=0.05)
+    a, b = pool.acquire(), pool.acquire()
+    assert a is not b
+    pool.release(b)
+    assert pool.acquire() is b  # LIFO: the warmest connection goes out first
+    pool.release(a); pool.release(b)
+    pool.close_all()
+    assert pool._opened == 0
+
+
+def test_pool_rolls_back_a_released_transaction(db):
+    pool = gms.ConnectionPool(db, 1)
+    c = pool.acquire()
+    c.execute("BEGIN")
+    pool.release(c)
+    assert not pool.acquire().in_transaction
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out(db):
+    pool = gms.ConnectionPool(db, 1, timeout=0.05)
+    c = pool.acquire()
+    with pytest.raises(gms.PoolExhausted):
+        pool.acquire()
+    pool.timeout = 5
+    # a connection released while a caller waits is handed over
+    threading.Timer(0.05, pool.release, (c,)).start()
+    assert pool.acquire() is c
+    pool.release(c)
+    pool.close_all()
+
+
+def test_request_gets_503_when_no_connection_frees_up(client, monkeypatch, make_account):
+    acc = make_account("1")
+    pool = gms.ConnectionPool(gms.DB_FILE, 1, timeout=0.05)
+    monkeypatch.setattr(gms, "pool", pool)
+    held = pool.acquire()
+    r = client.get(f"/api/accounts/{acc}/balance")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    pool.release(held)
+    assert client.get(f"/api/accounts/{acc}/balance").status_code == 200
+    pool.close_all()
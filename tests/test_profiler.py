@@ -0,0 +1,49 @@
+import os
+import threading
+import time
+
+import gms
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_attributes_samples_to_the_running_function():
+    sampler = gms.StackSampler(threading.get_ident(), interval=0.001).start()
+    busy_loop(0.1)
+    sampler.stop()
+    assert sum(sampler.stacks.values()) > 0
+    fn, own, total = sampler.top(1)[0]
+    assert fn.startswith("busy_loop (test_profiler.py:") and own <= total
+    line = sampler.collapsed().splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+
+def test_only_requests_with_the_token_are_profiled(client, monkeypatch):
+    monkeypatch.setattr(gms, "PROFILE_TOKEN", "s3cret")
+    assert "X-GMS-Profile-Id" not in client.get("/").headers
+    assert "X-GMS-Profile-Id" not in client.get("/", headers={gms.PROFILE_HEADER: "wrong"}).headers
+    assert client.get("/", headers={gms.PROFILE_HEADER: "sécret"}).status_code == 200
+    assert not os.path.exists(gms.PROFILE_DIR)
+
+    r = client.get("/", headers={gms.PROFILE_HEADER: "s3cret"})
+    r.close()
+    pid = r.headers["X-GMS-Profile-Id"]
+    assert "-index-" in pid
+    with open(os.path.join(gms.PROFILE_DIR, pid + ".top.txt")) as f:
+        assert f.readline() == "GET /?\n"
+    assert os.path.exists(os.path.join(gms.PROFILE_DIR, pid + ".collapsed"))
+    assert "X-GMS-Profile-Id" not in client.get("/metrics", headers={gms.PROFILE_HEADER: "s3cret"}).headers
+
+
+def test_prune_keeps_the_newest_profiles(db):
+    os.makedirs(gms.PROFILE_DIR)
+    for i in range(5):
+        for ext in (".collapsed", ".top.txt"):
+            open(os.path.join(gms.PROFILE_DIR, f"2024010{i}-000000-x{ext}"), "w").close()
+    gms.prune_profiles(keep=2)
+    assert sorted(os.listdir(gms.PROFILE_DIR)) == [f"2024010{i}-000000-x{ext}" for i in (3, 4) for ext in (".collapsed", ".top.txt")]
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import gms
+
+
+def _day(offset):
+    return (datetime.now() + timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+def test_open_day_is_refused(db):
+    with pytest.raises(ValueError):
+        gms.snapshot_balances(_day(0))
+    with pytest.raises(ValueError):
+        gms.snapshot_balances(_day(1))
+
+
+def test_closed_day_snapshot_matches_ledger(conn, make_account):
+    acc = make_account("1500")
+    yesterday = _day(-1)
+    conn.execute("UPDATE transactions SET date=? WHERE account_no=?", (yesterday + " 10:00:00", acc))
+    conn.commit()
+    stats = gms.snapshot_balances(yesterday)
+    assert stats is not None
+    row = conn.execute("SELECT balance FROM balance_snapshots WHERE account_no=? AND as_of=?", (acc, yesterday)).fetchone()
+    assert row[0] == 150000
+    assert gms.balance_at(conn, acc, yesterday) == 150000
+    assert gms.snapshot_balances(yesterday) is None
+
+
+def test_open_day_allowed_when_forced(conn, make_account):
+    acc = make_account("20")
+    gms.snapshot_balances(_day(0), allow_open_day=True)
+    assert conn.execute("SELECT balance FROM balance_snapshots WHERE account_no=?", (acc,)).fetchone()[0] == 2000